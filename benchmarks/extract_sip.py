@@ -0,0 +1,74 @@
+"""
+Compares the extraction of a zipped SIP made of many small files with
+ZipFile.extractall and with extract_sip, serially and in parallel.
+
+Usage: python benchmarks/extract_sip.py [--files 20000] [--size 4096]
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "oais_platform.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from oais_platform.oais.streaming import extract_sip  # noqa: E402
+
+
+def make_zip(files, size):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as compressed:
+        for i in range(files):
+            # Half random, half repeated content, so that deflate has some work to do
+            content = os.urandom(size // 2) + b"a" * (size - size // 2)
+            compressed.writestr(f"sip/data/content/{i // 1000}/{i}.bin", content)
+    return buffer.getvalue()
+
+
+def measure(name, extract, content):
+    target = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        extract(io.BytesIO(content), target)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(target)
+    print(f"{name:<28}{elapsed:>8.3f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=4096)
+    args = parser.parse_args()
+
+    content = make_zip(args.files, args.size)
+    print(f"{args.files} files of {args.size} bytes, zip of {len(content)} bytes")
+
+    def extractall(source, target):
+        with zipfile.ZipFile(source) as compressed:
+            compressed.extractall(target)
+
+    budget = {"max_bytes": args.files * args.size, "max_entries": args.files}
+    measure("ZipFile.extractall", extractall, content)
+    for workers in [1, 2, 4, 8]:
+        measure(
+            f"extract_sip, {workers} worker(s)",
+            lambda source, target: extract_sip(
+                source, target, workers=workers, **budget
+            ),
+            content,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Local stand-ins for the external services the pipeline talks to, serving the
+subset of their REST APIs used by the platform: Archivematica (and its Storage
+Service), the FTS REST API, an InvenioRDM registry and an upstream Invenio
+source (search, record metadata, files and notifications).
+
+Every service answers after a fixed latency and fails a configurable share of
+the requests with a 503.
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class FakeService(ThreadingHTTPServer):
+    """
+    HTTP server on a free local port dispatching the requests to the methods
+    listed in `routes`, as (HTTP method, path regex, method name)
+    """
+
+    daemon_threads = True
+    routes = []
+
+    def __init__(self, latency=0, failure_rate=0, seed=None):
+        super().__init__(("127.0.0.1", 0), FakeRequestHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+    def handle(self, method, path, query, body):
+        """
+        Returns the status code, body and content type of the response
+        """
+        with self.lock:
+            self.requests += 1
+            failed = self.random.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+        time.sleep(self.latency)
+        if failed:
+            return 503, {"message": "Service unavailable"}, None
+
+        for route_method, pattern, name in self.routes:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                return getattr(self, name)(query, body, *match.groups())
+        return 404, {"message": f"{method} {path} not found"}, None
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def respond(self, method):
+        url = urlsplit(self.path)
+        # Some clients join the endpoint and the path with a double slash
+        path = "/" + url.path.lstrip("/")
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        status, content, content_type = self.server.handle(
+            method, path, parse_qs(url.query), body
+        )
+        if not isinstance(content, bytes):
+            content = json.dumps(content).encode()
+            content_type = "application/json"
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type or "application/octet-stream")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self.respond("GET")
+
+    def do_POST(self):
+        self.respond("POST")
+
+    def do_PUT(self):
+        self.respond("PUT")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PollingService(FakeService):
+    """
+    Service whose jobs only complete after being polled `polls` times
+    """
+
+    def __init__(self, polls=1, **kwargs):
+        super().__init__(**kwargs)
+        self.polls = polls
+        self.jobs = {}
+
+    def create_job(self):
+        job_id = str(uuid.uuid4())
+        with self.lock:
+            self.jobs[job_id] = 0
+        return job_id
+
+    def poll_job(self, job_id):
+        """
+        Returns whether the job is complete, None if it does not exist
+        """
+        with self.lock:
+            if job_id not in self.jobs:
+                return None
+            self.jobs[job_id] += 1
+            return self.jobs[job_id] >= self.polls
+
+
+class FakeArchivematica(PollingService):
+    """
+    Archivematica API and Storage Service, on the same port
+    """
+
+    routes = [
+        ("POST", r"/api/v2beta/package/?", "create_package"),
+        ("GET", r"/api/transfer/status/([^/]+)/?", "transfer_status"),
+        ("GET", r"/api/ingest/status/([^/]+)/?", "ingest_status"),
+        ("GET", r"/api/v2beta/jobs/([^/]+)/?", "jobs"),
+        ("GET", r"/api/v2/file/([^/]+)/?", "package_details"),
+    ]
+
+    def create_package(self, query, body):
+        return 200, {"id": self.create_job()}, None
+
+    def transfer_status(self, query, body, transfer_id):
+        complete = self.poll_job(transfer_id)
+        if complete is None:
+            return 400, {"message": "Cannot fetch unitTransfer"}, None
+        if not complete:
+            return 200, {"status": "PROCESSING", "microservice": "Transfer"}, None
+        # The SIP is named after the transfer
+        return 200, {"status": "COMPLETE", "sip_uuid": transfer_id}, None
+
+    def ingest_status(self, query, body, sip_id):
+        return (
+            200,
+            {
+                "status": "COMPLETE",
+                "microservice": "Remove the processing directory",
+                "uuid": sip_id,
+            },
+            None,
+        )
+
+    def jobs(self, query, body, unit_id):
+        return 200, [], None
+
+    def package_details(self, query, body, package_id):
+        return 200, {"uuid": package_id, "current_path": f"aip/{package_id}.7z"}, None
+
+
+class FakeFTS(PollingService):
+    """
+    FTS REST API, with a proxy delegated for `proxy_lifetime`
+    """
+
+    routes = [
+        ("GET", r"/", "endpoint_info"),
+        ("GET", r"/whoami", "whoami"),
+        ("GET", r"/delegation/([^/]+)", "delegation"),
+        ("POST", r"/jobs", "submit"),
+        ("GET", r"/jobs/([^/]+)", "job_status"),
+    ]
+
+    def __init__(self, proxy_lifetime=timedelta(hours=12), **kwargs):
+        super().__init__(**kwargs)
+        self.proxy_expiry = datetime.now(timezone.utc) + proxy_lifetime
+
+    def endpoint_info(self, query, body):
+        return 200, {"api": {"major": 3, "minor": 12, "patch": 0}}, None
+
+    def whoami(self, query, body):
+        return 200, {"user_dn": "/CN=benchmark", "delegation_id": "benchmark"}, None
+
+    def delegation(self, query, body, delegation_id):
+        termination_time = self.proxy_expiry.strftime("%Y-%m-%dT%H:%M:%S")
+        return 200, {"termination_time": termination_time}, None
+
+    def submit(self, query, body):
+        return 200, {"job_id": self.create_job()}, None
+
+    def job_status(self, query, body, job_id):
+        complete = self.poll_job(job_id)
+        if complete is None:
+            return 404, {"message": f"No job with the id {job_id}"}, None
+        return 200, {"job_state": "FINISHED" if complete else "ACTIVE"}, None
+
+
+class FakeInvenioRDM(FakeService):
+    """
+    InvenioRDM registry the Archives are published to
+    """
+
+    routes = [
+        ("POST", r"/api/records", "create_draft"),
+        ("POST", r"/api/records/([^/]+)/versions", "create_draft"),
+        ("PUT", r"/api/records/([^/]+)/draft", "update_draft"),
+        ("POST", r"/api/records/([^/]+)/draft/actions/publish", "publish"),
+    ]
+
+    def create_draft(self, query, body, record_id=None):
+        return 201, {"id": uuid.uuid4().hex[:10]}, None
+
+    def update_draft(self, query, body, record_id):
+        return 200, {"id": record_id}, None
+
+    def publish(self, query, body, record_id):
+        return 202, {"id": record_id, "parent": {"id": f"parent-{record_id}"}}, None
+
+
+class FakeSource(FakeService):
+    """
+    Upstream Invenio source serving `records` records, each with `files`
+    files of `file_size` bytes, and accepting the notifications of the
+    preserved records
+    """
+
+    routes = [
+        ("GET", r"/api/records", "search"),
+        ("GET", r"/api/records/([^/]+)", "record"),
+        ("GET", r"/api/records/([^/]+)/files", "files"),
+        ("GET", r"/api/records/([^/]+)/files/([^/]+)/content", "content"),
+        ("POST", r"/notify", "notify"),
+    ]
+
+    def __init__(self, records=100, files=1, file_size=1024, **kwargs):
+        super().__init__(**kwargs)
+        self.record_count = records
+        self.file_count = files
+        self.file_size = file_size
+        self.notifications = 0
+
+    def get_content(self, recid, key):
+        seed = f"{recid}/{key}".encode()
+        return (seed * (self.file_size // len(seed) + 1))[: self.file_size]
+
+    def get_record(self, recid):
+        return {
+            "id": recid,
+            "metadata": {
+                "title": f"Record {recid}",
+                "creators": [{"person_or_org": {"name": "Doe, Jane"}}],
+            },
+            "access": {"status": "public"},
+            "files": {"enabled": True, "total_bytes": self.file_count * self.file_size},
+            "links": {
+                "self": f"{self.url}/api/records/{recid}",
+                "self_html": f"{self.url}/records/{recid}",
+            },
+        }
+
+    def search(self, query, body):
+        size = int(query.get("size", ["20"])[0])
+        page = int(query.get("page", ["1"])[0])
+        recids = range((page - 1) * size + 1, min(page * size, self.record_count) + 1)
+        hits = [self.get_record(str(recid)) for recid in recids]
+        return 200, {"hits": {"hits": hits, "total": self.record_count}}, None
+
+    def record(self, query, body, recid):
+        return 200, self.get_record(recid), None
+
+    def files(self, query, body, recid):
+        entries = []
+        for i in range(self.file_count):
+            key = f"file-{i}.bin"
+            content = self.get_content(recid, key)
+            entries.append(
+                {
+                    "key": key,
+                    "size": len(content),
+                    "checksum": f"md5:{hashlib.md5(content).hexdigest()}",
+                    "links": {
+                        "content": f"{self.url}/api/records/{recid}/files/{key}/content"
+                    },
+                }
+            )
+        return 200, {"enabled": True, "entries": entries}, None
+
+    def content(self, query, body, recid, key):
+        return 200, self.get_content(recid, key), None
+
+    def notify(self, query, body):
+        with self.lock:
+            self.notifications += 1
+        return 202, {}, None
@@ -0,0 +1,113 @@
+"""
+Compares listing the Archives visible to a user through the guardian object
+permission tables, as filter_archives used to, and through the ArchiveGrant
+table. Runs against a temporary test database.
+
+Usage: python benchmarks/filter_archives.py [--visible 50000] [--hidden 50000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "oais_platform.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import Group, User  # noqa: E402
+from django.contrib.contenttypes.models import ContentType  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Q  # noqa: E402
+from guardian.models import GroupObjectPermission  # noqa: E402
+from guardian.shortcuts import get_objects_for_user  # noqa: E402
+
+from oais_platform.oais.models import Archive, ArchiveGrant  # noqa: E402
+from oais_platform.oais.permissions import filter_archives  # noqa: E402
+
+
+def populate(visible, hidden):
+    user = User.objects.create_user("user")
+    other = User.objects.create_user("other")
+    group = Group.objects.create(name="group")
+    user.groups.add(group)
+
+    # Restricted Archives only, a third owned by the user, the rest shared with
+    # the user's group, plus Archives of another user the user cannot see
+    archives = Archive.objects.bulk_create(
+        [
+            Archive(
+                recid=str(i),
+                source="test",
+                restricted=True,
+                requester=user if i < visible // 3 else other,
+            )
+            for i in range(visible + hidden)
+        ],
+        batch_size=5000,
+    )
+    permission = ArchiveGrant.get_view_permission()
+    content_type = ContentType.objects.get_for_model(Archive)
+    GroupObjectPermission.objects.bulk_create(
+        [
+            GroupObjectPermission(
+                group=group,
+                permission=permission,
+                content_type=content_type,
+                object_pk=str(archive.id),
+            )
+            for archive in archives[visible // 3 : visible]
+        ],
+        batch_size=5000,
+    )
+    ArchiveGrant.rebuild()
+    return user
+
+
+def guardian_filter(queryset, user):
+    return queryset.filter(
+        Q(approver=user) | Q(requester=user) | Q(restricted=False)
+    ) | get_objects_for_user(user, "oais.view_archive")
+
+
+def measure(name, queryset, repeat=5):
+    timings = {}
+    for label, run in [
+        ("count", lambda: queryset.count()),
+        ("first page", lambda: list(queryset.order_by("-id")[:10])),
+    ]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        timings[label] = (time.perf_counter() - start) / repeat
+    print(
+        f"{name:<16}{timings['count'] * 1000:>10.1f} ms count"
+        f"{timings['first page'] * 1000:>10.1f} ms first page"
+        f"{queryset.count():>8} archives"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--visible", type=int, default=50000)
+    parser.add_argument("--hidden", type=int, default=50000)
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        user = populate(args.visible, args.hidden)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        print(f"{args.visible} visible archives out of {args.visible + args.hidden}")
+        measure("guardian", guardian_filter(Archive.objects.all(), user))
+        measure("ArchiveGrant", filter_archives(Archive.objects.all(), user))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""
+Runs complete Archive pipelines against local stand-ins for Archivematica, FTS,
+InvenioRDM and the upstream source, reporting the latency percentiles of each
+Step, the database queries of each task and the end-to-end throughput. Runs
+against a temporary test database.
+
+The Archives are seeded from the search endpoint of the fake source. The tasks
+run eagerly in this process, or with `--mode worker` in a threaded Celery
+worker started in this process and connected to the configured broker. The
+harness plays the role of Celery beat, running the Archivematica and FTS status
+checks every --poll-interval seconds. In eager mode the retries of a task run
+immediately, in worker mode they wait for their countdown and BagIt Create,
+which is not thread safe, harvests one Archive at a time.
+
+The latency (in seconds) and the share of failed requests are set per service
+(source, am, fts, invenio), e.g. --latency am=0.05 --failure-rate source=0.01
+
+Usage: python benchmarks/pipeline.py [--archives 100] [--mode eager]
+"""
+
+import argparse
+import glob
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "oais_platform.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import bagit_create  # noqa: E402
+import oais_utils  # noqa: E402
+from bagit_create.pipelines.invenio_v3 import InvenioV3Pipeline  # noqa: E402
+from celery.contrib.testing.worker import start_worker  # noqa: E402
+from celery.signals import task_postrun, task_prerun  # noqa: E402
+from django.apps import apps  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Q  # noqa: E402
+from django_celery_beat.models import IntervalSchedule, PeriodicTask  # noqa: E402
+from fake_services import (  # noqa: E402
+    FakeArchivematica,
+    FakeFTS,
+    FakeInvenioRDM,
+    FakeSource,
+)
+
+from oais_platform.celery import app  # noqa: E402
+from oais_platform.oais import tasks  # noqa: E402
+from oais_platform.oais.fts import FTS  # noqa: E402
+from oais_platform.oais.models import (  # noqa: E402
+    ApiKey,
+    Archive,
+    Source,
+    Status,
+    Step,
+    Steps,
+)
+from oais_platform.oais.sources.utils import get_source  # noqa: E402
+
+SERVICES = ["source", "am", "fts", "invenio"]
+
+DEFAULT_STEPS = [
+    "harvest",
+    "validation",
+    "checksum",
+    "archive",
+    "push_to_cta",
+    "invenio_rdm_push",
+    "notify_source",
+]
+
+# Periodic tasks spawned by the pipeline, run by the harness
+POLLED_TASKS = ["check_am_status", "check_fts_job_status"]
+
+
+class QueryCounter:
+    """
+    Database query execution wrapper counting the queries of each Celery task,
+    attributing the queries of the tasks run eagerly from another task to the
+    innermost one
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.queries = Counter()
+        self.calls = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        stack = getattr(self.local, "stack", None)
+        with self.lock:
+            self.queries[stack[-1] if stack else "harness"] += 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        # Connections are per thread, the worker threads open their own
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def task_prerun(self, task, **kwargs):
+        self.install()
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        self.local.stack.append(task.name)
+        with self.lock:
+            self.calls[task.name] += 1
+
+    def task_postrun(self, task, **kwargs):
+        self.local.stack.pop()
+
+
+def parse_service_values(parser, values):
+    result = dict.fromkeys(SERVICES, 0.0)
+    for value in values:
+        service, _, number = value.partition("=")
+        if service not in SERVICES:
+            parser.error(f"Unknown service {service}, choose from {SERVICES}")
+        result[service] = float(number)
+    return result
+
+
+def percentile(values, q):
+    # Nearest-rank percentile of sorted values
+    return values[max(math.ceil(q / 100 * len(values)) - 1, 0)]
+
+
+def patch_services(stack, services, upload_path, eager):
+    """
+    Points the platform at the fake services
+    """
+    stack.enter_context(
+        mock.patch.multiple(
+            tasks,
+            AM_URL=services["am"].url,
+            AM_SS_URL=services["am"].url,
+            INVENIO_SERVER_URL=services["invenio"].url,
+            INVENIO_API_TOKEN="benchmark",
+            BIC_UPLOAD_PATH=upload_path,
+        )
+    )
+
+    # BagIt Create reads the Invenio endpoints from its own configuration
+    init = InvenioV3Pipeline.__init__
+    base_endpoint = f"{services['source'].url}/api/records/"
+
+    def init_pipeline(self, source, token=None):
+        init(self, source, token=token)
+        self.base_endpoint = base_endpoint
+
+    stack.enter_context(mock.patch.object(InvenioV3Pipeline, "__init__", init_pipeline))
+
+    # OAIS utils downloads the SIP schema from GitLab, use the one it ships with
+    schema_path = os.path.join(
+        os.path.dirname(oais_utils.__file__), "schemas", "sip-schema-d1.json"
+    )
+    stack.enter_context(
+        mock.patch.dict(oais_utils.json_schemas_paths, {"v1": schema_path})
+    )
+
+    oais_config = apps.get_app_config("oais")
+    oais_config.fts = FTS(services["fts"].url, None, None)
+    stack.callback(setattr, oais_config, "fts", None)
+
+    app.conf.task_always_eager = eager
+    if eager:
+        # Neither a broker nor Redis is needed, publish the Step events in memory
+        stack.enter_context(mock.patch.object(settings, "STEP_EVENTS_REDIS_URL", None))
+    else:
+        # BagIt Create shares its logger between the jobs, so it is not thread
+        # safe: the threads of the worker harvest one at a time
+        process = bagit_create.main.process
+        lock = threading.Lock()
+
+        def locked_process(*args, **kwargs):
+            with lock:
+                return process(*args, **kwargs)
+
+        stack.enter_context(
+            mock.patch.object(bagit_create.main, "process", locked_process)
+        )
+
+
+def seed(source_url, count, steps):
+    """
+    Creates `count` Archives from the search results of the fake source,
+    each with the given Steps in its pipeline
+    """
+    user = User.objects.create_user("benchmark")
+    # The Sources are created by the migrations
+    source, _ = Source.objects.update_or_create(
+        name="inveniordm",
+        defaults={
+            "api_url": f"{source_url}/api",
+            "classname": "Invenio",
+            "notification_endpoint": f"{source_url}/notify",
+            "notification_enabled": True,
+        },
+    )
+    ApiKey.objects.create(user=user, source=source, key="benchmark")
+    # A deployment has the schedules of the status checks since their first
+    # run, create them before the concurrent pipelines race to
+    IntervalSchedule.objects.create(every=60, period=IntervalSchedule.SECONDS)
+    IntervalSchedule.objects.create(every=1, period=IntervalSchedule.HOURS)
+
+    records = []
+    page = 1
+    while len(records) < count:
+        results = get_source(source.name).search("", page=page, size=100)["results"]
+        records.extend(results)
+        page += 1
+
+    archives = []
+    for record in records[:count]:
+        archive = Archive.objects.create(
+            recid=record["recid"],
+            source=source.name,
+            source_url=record["source_url"],
+            title=record["title"],
+            requester=user,
+            approver=user,
+            restricted=False,
+        )
+        for step in steps:
+            archive.add_step_to_pipeline(step)
+        archives.append(archive.id)
+
+    return archives, ApiKey.get_reference(user.id, source.name)
+
+
+def run_polled_tasks(eager, poll_interval):
+    for periodic_task in PeriodicTask.objects.filter(
+        task__in=POLLED_TASKS, enabled=True
+    ):
+        signature = app.tasks[periodic_task.task].s(*json.loads(periodic_task.args))
+        if eager:
+            signature.apply()
+        else:
+            signature.apply_async(expires=poll_interval)
+
+
+def count_running(archive_ids):
+    return (
+        Archive.objects.filter(id__in=archive_ids)
+        .filter(
+            Q(last_step__status__in=[Status.WAITING, Status.IN_PROGRESS])
+            | (Q(last_step__status=Status.COMPLETED) & ~Q(pipeline_steps=[]))
+        )
+        .count()
+    )
+
+
+def run(archive_ids, credentials, eager, poll_interval, timeout):
+    """
+    Starts the pipelines and waits for them to finish, returning the elapsed
+    time in seconds
+    """
+    start = time.perf_counter()
+    for archive_id in archive_ids:
+        tasks.execute_pipeline(archive_id, credentials=credentials)
+
+    while count_running(archive_ids):
+        if time.perf_counter() - start > timeout:
+            print(f"Timed out with {count_running(archive_ids)} pipelines running")
+            break
+        time.sleep(poll_interval)
+        run_polled_tasks(eager, poll_interval)
+    return time.perf_counter() - start
+
+
+def report_steps(archive_ids):
+    latencies = defaultdict(list)
+    failures = Counter()
+    for name, status, start_date, finish_date in Step.objects.filter(
+        archive_id__in=archive_ids
+    ).values_list("name", "status", "start_date", "finish_date"):
+        if status == Status.COMPLETED and start_date and finish_date:
+            latencies[name].append((finish_date - start_date).total_seconds())
+        elif status == Status.FAILED:
+            failures[name] += 1
+
+    print(
+        f"{'step':<18}{'completed':>10}{'failed':>8}"
+        f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    )
+    for name in sorted(set(latencies) | set(failures)):
+        values = sorted(latencies[name])
+        timings = "".join(
+            f"{percentile(values, q) * 1000:>10.0f}" if values else f"{'-':>10}"
+            for q in (50, 90, 99, 100)
+        )
+        print(f"{Steps(name).label:<18}{len(values):>10}{failures[name]:>8}{timings}")
+
+
+def report_queries(counter):
+    print(f"{'task':<24}{'calls':>8}{'queries':>10}{'per call':>10}")
+    for name, queries in sorted(counter.queries.items()):
+        calls = counter.calls[name]
+        per_call = f"{queries / calls:>10.1f}" if calls else f"{'-':>10}"
+        print(f"{name:<24}{calls:>8}{queries:>10}{per_call}")
+
+
+def report_services(services):
+    print(f"{'service':<24}{'requests':>10}{'failed':>8}")
+    for name, service in services.items():
+        print(f"{name:<24}{service.requests:>10}{service.failures:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--archives", type=int, default=100)
+    parser.add_argument("--mode", choices=["eager", "worker"], default="eager")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--steps", default=",".join(DEFAULT_STEPS))
+    parser.add_argument("--files", type=int, default=1)
+    parser.add_argument("--file-size", type=int, default=1024)
+    parser.add_argument("--latency", action="append", default=[])
+    parser.add_argument("--failure-rate", action="append", default=[])
+    parser.add_argument("--am-polls", type=int, default=2)
+    parser.add_argument("--fts-polls", type=int, default=1)
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    steps = [Steps[name.strip().upper()] for name in args.steps.split(",")]
+    latencies = parse_service_values(parser, args.latency)
+    failure_rates = parse_service_values(parser, args.failure_rate)
+    eager = args.mode == "eager"
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    services = {
+        "source": FakeSource(
+            records=args.archives,
+            files=args.files,
+            file_size=args.file_size,
+            seed=args.seed,
+        ),
+        "am": FakeArchivematica(polls=args.am_polls, seed=args.seed),
+        "fts": FakeFTS(polls=args.fts_polls, seed=args.seed),
+        "invenio": FakeInvenioRDM(seed=args.seed),
+    }
+
+    counter = QueryCounter()
+    task_prerun.connect(counter.task_prerun, weak=False)
+    task_postrun.connect(counter.task_postrun, weak=False)
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        with ExitStack() as stack:
+            for service in services.values():
+                stack.enter_context(service)
+            upload_path = stack.enter_context(tempfile.TemporaryDirectory())
+            patch_services(stack, services, upload_path, eager)
+
+            archive_ids, credentials = seed(
+                services["source"].url, args.archives, steps
+            )
+            # Only the pipelines are slowed down and fail
+            for name, service in services.items():
+                service.requests = service.failures = 0
+                service.latency = latencies[name]
+                service.failure_rate = failure_rates[name]
+
+            if not eager:
+                stack.enter_context(
+                    start_worker(
+                        app,
+                        pool="threads",
+                        concurrency=args.concurrency,
+                        perform_ping_check=False,
+                    )
+                )
+
+            counter.install()
+            counter.queries.clear()
+            elapsed = run(
+                archive_ids, credentials, eager, args.poll_interval, args.timeout
+            )
+
+            completed = Archive.objects.filter(
+                id__in=archive_ids,
+                pipeline_steps=[],
+                last_step__name=steps[-1],
+                last_step__status=Status.COMPLETED,
+            ).count()
+            print(
+                f"{completed}/{len(archive_ids)} pipelines completed in "
+                f"{elapsed:.2f} s, {completed / elapsed:.2f} archives/s ({args.mode})"
+            )
+            print()
+            report_steps(archive_ids)
+            print()
+            report_queries(counter)
+            print()
+            report_services(services)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        # BagIt Create leaves its logs behind
+        for path in glob.glob("/tmp/biclog::*::inveniordm::*"):
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
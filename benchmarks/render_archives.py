@@ -0,0 +1,84 @@
+"""
+Compares rendering a page of serialized Archives with the DRF JSONRenderer and
+with ORJSONRenderer, along with the size of the body gzip and brotli compressed.
+
+Usage: python benchmarks/render_archives.py [--archives 1000] [--repeat 20]
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "oais_platform.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import brotli  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from oais_platform.oais.models import Archive, Resource  # noqa: E402
+from oais_platform.oais.renderers import ORJSONRenderer  # noqa: E402
+from oais_platform.oais.serializers import ArchiveSerializer  # noqa: E402
+
+
+def make_archives(count):
+    # Unsaved instances, nothing is read from the database
+    user = User(id=1, username="requester", first_name="Jane", last_name="Doe")
+    archives = []
+    for i in range(count):
+        archive = Archive(
+            id=i,
+            recid=str(i),
+            source="cds",
+            source_url=f"https://cds.cern.ch/record/{i}",
+            title=f"Données de l'expérience n°{i}",
+            requester=user,
+            approver=user,
+            resource=Resource(id=i, source="cds", recid=str(i)),
+            timestamp=timezone.now(),
+            last_modification_timestamp=timezone.now(),
+            manifest={
+                "audit": [
+                    {"tool": "bagit-create", "action": "harvest", "step": j}
+                    for j in range(5)
+                ]
+            },
+        )
+        archives.append(archive)
+    return ArchiveSerializer(archives, many=True).data
+
+
+def measure(name, renderer, data, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        content = renderer.render(data)
+    elapsed = (time.perf_counter() - start) / repeat
+    print(
+        f"{name:<16}{elapsed * 1000:>8.2f} ms"
+        f"{len(content):>10} B"
+        f"{len(gzip.compress(content, compresslevel=6)):>10} B gzip"
+        f"{len(brotli.compress(content, quality=4)):>10} B br"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--archives", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    data = make_archives(args.archives)
+    print(f"{args.archives} archives, average of {args.repeat} renderings")
+    measure("JSONRenderer", JSONRenderer(), data, args.repeat)
+    measure("ORJSONRenderer", ORJSONRenderer(), data, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Measures the startup time of a Django management command and of a Celery
+worker boot (Django setup and import of the task modules, without connecting
+to the broker), each in a fresh interpreter.
+
+Usage: python benchmarks/startup.py [--repeat 5]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER_BOOT = """
+import django
+django.setup()
+from oais_platform.celery import app
+app.loader.import_default_modules()
+"""
+
+COMMANDS = {
+    "manage.py check": [sys.executable, "manage.py", "check"],
+    "worker boot": [sys.executable, "-c", WORKER_BOOT],
+}
+
+
+def measure(command, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            command,
+            cwd=ROOT,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "oais_platform.settings")
+    for name, command in COMMANDS.items():
+        timings = measure(command, args.repeat)
+        print(
+            f"{name:<18}{statistics.median(timings) * 1000:>10.0f} ms median"
+            f"{min(timings) * 1000:>10.0f} ms min"
+        )
+
+
+if __name__ == "__main__":
+    main()
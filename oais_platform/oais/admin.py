@@ -10,6 +10,7 @@ from oais_platform.oais.models import (
     Profile,
     Resource,
     Source,
+    Statistics,
     Step,
     UploadJob,
 )
@@ -187,3 +188,18 @@ class APIKeyAdmin(NullToNotRequiredMixin, admin.ModelAdmin):
         return None
 
     source_name.short_description = "Source"
+
+
+@admin.register(Statistics)
+class StatisticsAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "scope",
+        "key",
+        "harvested_count",
+        "preserved_count",
+        "pushed_to_tape_count",
+        "pushed_to_registry_count",
+        "last_modification_timestamp",
+    )
+    list_filter = ("scope",)
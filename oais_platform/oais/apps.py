@@ -1,26 +1,38 @@
 import logging
+import threading
 
 from django.apps import AppConfig
 
 from oais_platform.settings import FTS_GRID_CERT, FTS_GRID_CERT_KEY, FTS_INSTANCE
 
-from .fts import FTS
-
 
 class OaisConfig(AppConfig):
     name = "oais_platform.oais"
 
+    _fts = None
+    _fts_lock = threading.Lock()
+
     def ready(self):
         # Set up logging
         logging.basicConfig(level=logging.INFO)
         logging.getLogger("fts3.rest.client").setLevel(logging.DEBUG)
 
-        # Initialize FTS client
-        try:
-            self.fts = FTS(
-                FTS_INSTANCE,
-                FTS_GRID_CERT,
-                FTS_GRID_CERT_KEY,
-            )
-        except Exception as e:
-            logging.warning(f"Couldn't initialize the FTS client: {e}")
+    @property
+    def fts(self):
+        """
+        FTS client, authenticated on first use so that processes never
+        transferring to tape do not wait on the FTS instance at startup.
+        A failed attempt is retried on the next use.
+        """
+        if self._fts is None:
+            with self._fts_lock:
+                if self._fts is None:
+                    # The FTS REST client is slow to import, load it on demand too
+                    from .fts import FTS
+
+                    self._fts = FTS(FTS_INSTANCE, FTS_GRID_CERT, FTS_GRID_CERT_KEY)
+        return self._fts
+
+    @fts.setter
+    def fts(self, client):
+        self._fts = client
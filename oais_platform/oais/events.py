@@ -0,0 +1,191 @@
+import json
+import logging
+import queue
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from oais_platform.oais.exceptions import ServiceUnavailable
+
+# Pub/sub channel carrying the Step transitions
+STEP_EVENTS_CHANNEL = "oais:steps"
+
+
+class MemoryBroker:
+    """
+    In-process stand-in for the Redis pub/sub channel, used when no Redis
+    instance is configured. Events only reach subscribers of the same process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queues = set()
+
+    def publish(self, message):
+        with self.lock:
+            for subscriber in self.queues:
+                subscriber.put_nowait(message)
+
+    def subscribe(self):
+        return MemorySubscription(self)
+
+
+class MemorySubscription:
+    def __init__(self, broker):
+        self.broker = broker
+        self.queue = queue.SimpleQueue()
+        with broker.lock:
+            broker.queues.add(self.queue)
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        with self.broker.lock:
+            self.broker.queues.discard(self.queue)
+
+
+class RedisBroker:
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, message):
+        self.client.publish(STEP_EVENTS_CHANNEL, message)
+
+    def subscribe(self):
+        return RedisSubscription(self.client)
+
+
+class RedisSubscription:
+    def __init__(self, client):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(STEP_EVENTS_CHANNEL)
+
+    def get(self, timeout):
+        message = self.pubsub.get_message(timeout=timeout)
+        if message is None:
+            return None
+        return message["data"].decode()
+
+    def close(self):
+        self.pubsub.close()
+
+
+_brokers = {}
+
+
+def get_broker():
+    """
+    Returns the broker for the configured STEP_EVENTS_REDIS_URL,
+    falling back to the in-memory one if it is not set
+    """
+    url = settings.STEP_EVENTS_REDIS_URL
+    if url not in _brokers:
+        _brokers[url] = RedisBroker(url) if url else MemoryBroker()
+    return _brokers[url]
+
+
+def publish_step_event(step):
+    """
+    Publishes the current status of the given Step once the
+    surrounding transaction (if any) is committed
+    """
+    archive = step.archive
+    message = json.dumps(
+        {
+            "step": step.id,
+            "name": step.name,
+            "status": step.status,
+            "archive": archive.id,
+            "archive_state": archive.state,
+            "requester": archive.requester_id,
+            "approver": archive.approver_id,
+            "restricted": archive.restricted,
+            "timestamp": timezone.now().isoformat(),
+        }
+    )
+
+    def publish():
+        try:
+            get_broker().publish(message)
+        except redis.RedisError as e:
+            # Events are best effort, they must never fail a Step
+            logging.warning(f"Step event for step {step.id} was not published: {e}")
+
+    transaction.on_commit(publish)
+
+
+class StreamSlots:
+    """
+    Counts the event streams open in this process, each of them holding a
+    worker thread for its whole duration
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def acquire(self, limit):
+        with self.lock:
+            if self.count >= limit:
+                return False
+            self.count += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.count -= 1
+
+
+stream_slots = StreamSlots()
+
+
+class StepEventStream:
+    """
+    Iterable over the published Step events accepted by the `accept` callable,
+    formatted as server-sent events. The subscription starts on creation, so no
+    event is lost between the request and the first read, and ends after
+    `duration` seconds, letting the client reconnect. At most `max_streams`
+    streams are open at once in a process.
+    """
+
+    def __init__(self, accept, heartbeat, duration, max_streams):
+        # The slot is released on the counter it was taken from
+        self.slots = stream_slots
+        if not self.slots.acquire(max_streams):
+            raise ServiceUnavailable("Too many open event streams, retry later")
+        self.accept = accept
+        self.heartbeat = heartbeat
+        self.duration = duration
+        self.closed = False
+        try:
+            self.subscription = get_broker().subscribe()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def __iter__(self):
+        deadline = time.monotonic() + self.duration
+        yield f"retry: {self.heartbeat * 1000}\n\n"
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = self.subscription.get(timeout=min(self.heartbeat, remaining))
+            if message is None:
+                # Comment line, keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            event = json.loads(message)
+            if self.accept(event):
+                yield f"event: step\ndata: {message}\n\n"
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.subscription.close()
+            self.slots.release()
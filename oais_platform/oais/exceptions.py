@@ -29,3 +29,11 @@ class InvalidSource(Exception):
 
 class RetryableException(Exception):
     pass
+
+
+class ExtractionError(Exception):
+    pass
+
+
+class DelegationError(Exception):
+    pass
@@ -1,11 +1,27 @@
 import logging
+import threading
+from datetime import datetime, timedelta, timezone
 
 import fts3.rest.client.easy as fts3
+from fts3.rest.client.delegator import Delegator
+
+from oais_platform.oais.exceptions import DelegationError
+from oais_platform.oais.metrics import FTS_PROXY_EXPIRY
+from oais_platform.settings import (
+    FTS_DELEGATION_LIFETIME,
+    FTS_DELEGATION_MIN_LIFETIME,
+    FTS_DELEGATION_RENEWAL_WINDOW,
+)
 
 
 class FTS:
     archive_timeout = 86400
     copy_pin_lifetime = -1
+    delegation_lifetime = timedelta(hours=FTS_DELEGATION_LIFETIME)
+    renewal_window = timedelta(hours=FTS_DELEGATION_RENEWAL_WINDOW)
+    min_lifetime = timedelta(hours=FTS_DELEGATION_MIN_LIFETIME)
+    # Other processes renew the proxy, its expiry is read again after this delay
+    expiry_ttl = timedelta(minutes=5)
 
     def __init__(self, fts_instance, user_cert_path, cert_key_path):
         logging.debug(
@@ -25,8 +41,16 @@ class FTS:
             f'Authenticated on FTS with certificate DN: { fts3.whoami(context)["user_dn"] } '
         )
         self.context = context
+        # Expiry of the proxy delegated to FTS, as last read from FTS, and when
+        self.proxy_expiry = None
+        self.proxy_read = None
+        self.delegation_lock = threading.Lock()
+
+    def whoami(self):
+        return fts3.whoami(self.context)["user_dn"]
 
     def push_to_cta(self, source, dest):
+        self.check_delegation()
         logging.info(f"Starting FTS transfer from {source} to {dest}.")
         transfer = fts3.new_transfer(source, dest)
         job = fts3.new_job(
@@ -45,6 +69,67 @@ class FTS:
     def job_status(self, job_id):
         return fts3.get_job_status(self.context, job_id, list_files=False)
 
+    def get_proxy_lifetime(self, refresh=False):
+        """
+        Returns the remaining lifetime of the delegated proxy, None if there
+        is none. The expiry is read from FTS again when refresh is set, when
+        it was read more than expiry_ttl ago or when the proxy is missing or
+        about to expire, as it may have been renewed by another process.
+        """
+        now = datetime.now(timezone.utc)
+        if (
+            refresh
+            or self.proxy_expiry is None
+            or now - self.proxy_read > self.expiry_ttl
+            or self.proxy_expiry - now < self.min_lifetime
+        ):
+            info = Delegator(self.context).get_info()
+            self.proxy_read = now
+            if info:
+                self.proxy_expiry = datetime.strptime(
+                    info["termination_time"], "%Y-%m-%dT%H:%M:%S"
+                ).replace(tzinfo=timezone.utc)
+            else:
+                self.proxy_expiry = None
+            FTS_PROXY_EXPIRY.set(
+                self.proxy_expiry.timestamp() if self.proxy_expiry else 0
+            )
+        if self.proxy_expiry is None:
+            return None
+        return self.proxy_expiry - datetime.now(timezone.utc)
+
     def delegate(self):
-        logging.info("Delegating certificate")
-        fts3.delegate(self.context, force=True)
+        """
+        Delegates the certificate again if the proxy is missing or expires
+        within the renewal window. Returns whether it was delegated.
+        """
+        with self.delegation_lock:
+            lifetime = self.get_proxy_lifetime()
+            if lifetime is not None and lifetime > self.renewal_window:
+                return False
+            # Another process may have delegated since the expiry was read
+            lifetime = self.get_proxy_lifetime(refresh=True)
+            if lifetime is not None and lifetime > self.renewal_window:
+                return False
+
+            logging.info("Delegating certificate")
+            fts3.delegate(self.context, lifetime=self.delegation_lifetime, force=True)
+            lifetime = self.get_proxy_lifetime(refresh=True)
+            logging.info(f"Delegated proxy valid for {lifetime}")
+            return True
+
+    def check_delegation(self):
+        """
+        Raises DelegationError if the proxy cannot be kept valid for at
+        least min_lifetime, so that no transfer is submitted with
+        credentials about to expire
+        """
+        try:
+            self.delegate()
+        except Exception as e:
+            logging.warning(f"Delegation failed: {e}")
+        lifetime = self.get_proxy_lifetime()
+        if lifetime is None or lifetime < self.min_lifetime:
+            raise DelegationError(
+                f"The proxy delegated to FTS is not valid (lifetime: {lifetime})"
+            )
@@ -0,0 +1,158 @@
+import json
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+SORT_KEYS = {
+    "db_time": lambda endpoint: endpoint["db_time"]["total"],
+    "queries": lambda endpoint: endpoint["queries"]["mean"],
+    "duration": lambda endpoint: endpoint["duration"]["p95"],
+    "requests": lambda endpoint: endpoint["requests"],
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(values):
+    return {
+        "total": sum(values),
+        "mean": sum(values) / len(values),
+        "p95": percentile(values, 0.95),
+        "max": max(values),
+    }
+
+
+def aggregate(profiles, top):
+    """
+    Aggregates the request profiles written by QueryProfilingMiddleware by
+    endpoint
+    """
+    endpoints = defaultdict(list)
+    for profile in profiles:
+        endpoints[(profile["method"], profile["endpoint"])].append(profile)
+
+    report = []
+    for (method, endpoint), requests in endpoints.items():
+        duplicates = Counter()
+        slowest = {}
+        for request in requests:
+            for duplicate in request["duplicates"]:
+                duplicates[duplicate["fingerprint"]] += duplicate["count"]
+            for query in request["slowest"]:
+                if query["duration"] > slowest.get(query["sql"], 0):
+                    slowest[query["sql"]] = query["duration"]
+
+        report.append(
+            {
+                "method": method,
+                "endpoint": endpoint,
+                "requests": len(requests),
+                "queries": summarize([request["queries"] for request in requests]),
+                "db_time": summarize([request["db_time"] for request in requests]),
+                "duration": summarize([request["duration"] for request in requests]),
+                "duplicates": [
+                    {"fingerprint": fingerprint, "per_request": runs / len(requests)}
+                    for fingerprint, runs in duplicates.most_common(top)
+                ],
+                "slowest": [
+                    {"sql": sql, "duration": duration}
+                    for sql, duration in sorted(
+                        slowest.items(), key=lambda query: query[1], reverse=True
+                    )[:top]
+                ],
+            }
+        )
+    return report
+
+
+class Command(BaseCommand):
+    help = "Reports the heaviest endpoints from the SQL query profiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--log",
+            default=settings.QUERY_PROFILING_LOG,
+            help="Query profiles written by QueryProfilingMiddleware",
+        )
+        parser.add_argument(
+            "--days", type=float, help="Only report the profiles of the last days"
+        )
+        parser.add_argument(
+            "--sort",
+            choices=SORT_KEYS.keys(),
+            default="db_time",
+            help="Order of the endpoints, heaviest first (default: total DB time)",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=20, help="Number of endpoints reported"
+        )
+        parser.add_argument("--json", action="store_true", help="Report as JSON")
+        parser.add_argument("--output", help="Write the report to this file")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["days"]:
+            since = timezone.now() - timedelta(days=options["days"])
+
+        profiles = []
+        try:
+            with open(options["log"]) as log:
+                for line in log:
+                    profile = json.loads(line)
+                    if since and datetime.fromisoformat(profile["date"]) < since:
+                        continue
+                    profiles.append(profile)
+        except FileNotFoundError:
+            raise CommandError(f"No query profiles found in {options['log']}")
+
+        report = aggregate(profiles, settings.QUERY_PROFILING_TOP)
+        report.sort(key=SORT_KEYS[options["sort"]], reverse=True)
+        report = report[: options["limit"]]
+
+        if options["json"]:
+            content = json.dumps(report, indent=2)
+        else:
+            content = self.format_report(report, len(profiles))
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(content + "\n")
+        else:
+            self.stdout.write(content)
+
+    def format_report(self, report, count):
+        lines = [f"{count} profiled requests, {len(report)} endpoints reported"]
+        for endpoint in report:
+            queries = endpoint["queries"]
+            db_time = endpoint["db_time"]
+            duration = endpoint["duration"]
+            lines += [
+                "",
+                f"{endpoint['method']} {endpoint['endpoint']}",
+                f"  requests: {endpoint['requests']}",
+                f"  queries: mean {queries['mean']:.1f}, max {queries['max']}",
+                f"  db time: total {db_time['total'] * 1000:.0f}ms, "
+                f"mean {db_time['mean'] * 1000:.1f}ms, "
+                f"p95 {db_time['p95'] * 1000:.1f}ms",
+                f"  duration: mean {duration['mean'] * 1000:.1f}ms, "
+                f"p95 {duration['p95'] * 1000:.1f}ms",
+            ]
+            if endpoint["duplicates"]:
+                lines.append("  duplicated queries (runs per request):")
+                lines += [
+                    f"    {duplicate['per_request']:.1f} {duplicate['fingerprint']}"
+                    for duplicate in endpoint["duplicates"]
+                ]
+            if endpoint["slowest"]:
+                lines.append("  slowest statements:")
+                lines += [
+                    f"    {query['duration'] * 1000:.1f}ms {query['sql']}"
+                    for query in endpoint["slowest"]
+                ]
+        return "\n".join(lines)
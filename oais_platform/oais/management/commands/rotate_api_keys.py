@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from oais_platform.oais.models import ApiKey
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-encrypts the stored API Keys with ENCRYPT_KEY, after which the "
+        "ENCRYPT_KEY_FALLBACKS can be removed"
+    )
+
+    def handle(self, *args, **options):
+        rotated, failed = ApiKey.rotate_all()
+        self.stdout.write(f"{rotated} API Keys re-encrypted")
+        if failed:
+            self.stderr.write(
+                f"{failed} API Keys cannot be decrypted with ENCRYPT_KEY or "
+                "ENCRYPT_KEY_FALLBACKS and were left untouched"
+            )
@@ -0,0 +1,123 @@
+"""
+Prometheus metrics of the pipelines, served by the /metrics endpoint
+
+The Celery workers record the Step metrics in their own processes: for them
+to reach the web processes, set PROMETHEUS_MULTIPROC_DIR to a directory shared
+by both, emptied before they start. The gauges on the state of the pipelines
+are read from the database on each scrape.
+"""
+
+import os
+
+from django.db.models import Count
+from django.utils import timezone
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+STEP_DURATION = Histogram(
+    "oais_step_duration_seconds",
+    "Duration of the Steps, from their start to their final status",
+    ["step", "status"],
+    buckets=(1, 5, 15, 60, 300, 900, 3600, 4 * 3600, 12 * 3600, 24 * 3600),
+)
+STEP_FAILURES = Counter("oais_step_failures_total", "Failed Steps", ["source", "step"])
+TASK_RETRIES = Counter(
+    "oais_task_retries_total", "Retried pipeline tasks", ["source", "task"]
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "oais_upstream_request_duration_seconds",
+    "Duration of the requests to the upstream sources",
+    ["source", "operation"],
+)
+FTS_PROXY_EXPIRY = Gauge(
+    "oais_fts_proxy_expiry_timestamp_seconds",
+    "Expiry of the proxy delegated to FTS, as last read from FTS",
+    multiprocess_mode="mostrecent",
+)
+
+
+def record_step_status(step, status, start_date, source, failed):
+    """
+    Records a Step of the given Source reaching its final status
+    """
+    if start_date:
+        STEP_DURATION.labels(step=step, status=status).observe(
+            (timezone.now() - start_date).total_seconds()
+        )
+    if failed:
+        STEP_FAILURES.labels(source=source, step=step).inc()
+
+
+def record_retry(task, source):
+    TASK_RETRIES.labels(source=source, task=task).inc()
+
+
+def time_upstream_request(source, operation):
+    """
+    Context manager timing a request to the given upstream source
+    """
+    return UPSTREAM_REQUEST_DURATION.labels(source=source, operation=operation).time()
+
+
+class PipelineCollector(Collector):
+    """
+    Gauges on the state of the pipelines, read from the database
+    """
+
+    def collect(self):
+        from django_celery_beat.models import PeriodicTask
+
+        from oais_platform.oais.models import Archive, Status, Step
+
+        polling = dict(
+            PeriodicTask.objects.filter(
+                task__in=["check_am_status", "check_fts_job_status"], enabled=True
+            )
+            .values_list("task")
+            .annotate(count=Count("id"))
+        )
+        yield GaugeMetricFamily(
+            "oais_am_packages_in_flight",
+            "Packages submitted to Archivematica and not processed yet",
+            value=polling.get("check_am_status", 0),
+        )
+        yield GaugeMetricFamily(
+            "oais_fts_jobs_outstanding",
+            "Transfers submitted to FTS and not finished yet",
+            value=polling.get("check_fts_job_status", 0),
+        )
+        yield GaugeMetricFamily(
+            "oais_steps_waiting",
+            "Steps waiting to be run",
+            value=Step.objects.filter(status=Status.WAITING).count(),
+        )
+        yield GaugeMetricFamily(
+            "oais_archives_staged",
+            "Archives staged and waiting for approval",
+            value=Archive.objects.filter(staged=True).count(),
+        )
+
+
+pipeline_registry = CollectorRegistry(auto_describe=False)
+pipeline_registry.register(PipelineCollector())
+
+
+def generate_metrics():
+    """
+    Returns the metrics in the Prometheus text format
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(pipeline_registry)
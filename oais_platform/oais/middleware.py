@@ -0,0 +1,231 @@
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+import brotli
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+
+# Supported encodings, by order of preference
+ENCODINGS = {
+    "br": lambda content: brotli.compress(content, quality=4),
+    "gzip": lambda content: gzip.compress(content, compresslevel=6, mtime=0),
+}
+
+
+def get_accepted_encoding(accept_encoding):
+    """
+    Returns the preferred supported encoding accepted by the client, if any
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        accepted[coding.strip().lower()] = quality
+
+    best = None
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+class CompressionMiddleware:
+    """
+    Compresses the responses of at least COMPRESSION_MIN_SIZE bytes with brotli or
+    gzip, as negotiated with Accept-Encoding. Streaming responses (event streams,
+    downloads) are left untouched.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = get_accepted_encoding(request.headers.get("Accept-Encoding", ""))
+        if encoding is None:
+            return response
+
+        compressed = ENCODINGS[encoding](response.content)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        # The representation changed, a strong ETag no longer applies to it
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
+
+
+FINGERPRINT_PATTERNS = [
+    # String and numeric literals
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    # Lists of placeholders, whatever their length
+    (re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+]
+
+# Serializes the writes of the profiles by the threads of a process
+profiling_log_lock = threading.Lock()
+
+
+def get_fingerprint(sql):
+    """
+    Returns the SQL statement without its literals and with its lists of
+    parameters collapsed, so that the same query run for different objects
+    shares the same fingerprint
+    """
+    for pattern, replacement in FINGERPRINT_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class QueryProfile:
+    """
+    Database execute wrapper recording the SQL statements run and their duration
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def db_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def get_slowest(self, count):
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:count]
+
+    def get_duplicates(self):
+        """
+        Returns the fingerprints of the queries run more than once, with the
+        number of times they were run, most run first
+        """
+        fingerprints = Counter(get_fingerprint(sql) for sql, _ in self.queries)
+        return [
+            (fingerprint, runs)
+            for fingerprint, runs in fingerprints.most_common()
+            if runs > 1
+        ]
+
+
+class QueryProfilingMiddleware:
+    """
+    Records the SQL queries run by a QUERY_PROFILING_SAMPLE_RATE share of the
+    requests (their count, total duration, slowest statements and duplicated
+    queries) in QUERY_PROFILING_LOG, aggregated by the query_report command.
+    In DEBUG mode, the profiled responses also report them in X-DB-* headers,
+    except the streaming ones, whose queries run after the headers are sent.
+    """
+
+    def __init__(self, get_response):
+        if settings.QUERY_PROFILING_SAMPLE_RATE <= 0:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.QUERY_PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = QueryProfile()
+        start = time.perf_counter()
+        with connection.execute_wrapper(profile):
+            response = self.get_response(request)
+
+        if response.streaming and not response.is_async:
+            # Streamed bodies run their queries while they are sent, the
+            # profile is recorded once they are consumed
+            response.streaming_content = self.profile_stream(
+                response.streaming_content, request, response, profile, start
+            )
+            return response
+
+        duplicates = self.record_profile(request, response, profile, start)
+        if settings.DEBUG and not response.streaming:
+            response["X-DB-Query-Count"] = str(len(profile.queries))
+            response["X-DB-Time"] = f"{profile.db_time * 1000:.1f}ms"
+            response["X-DB-Duplicate-Queries"] = str(
+                sum(runs - 1 for _, runs in duplicates)
+            )
+        return response
+
+    def profile_stream(self, content, request, response, profile, start):
+        try:
+            while True:
+                with connection.execute_wrapper(profile):
+                    chunk = next(content, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            self.record_profile(request, response, profile, start)
+
+    def record_profile(self, request, response, profile, start):
+        """
+        Writes the profile of the request, asynchronous streams being only
+        profiled until their response is returned
+        """
+        duration = time.perf_counter() - start
+        top = settings.QUERY_PROFILING_TOP
+        duplicates = profile.get_duplicates()
+        match = request.resolver_match
+        self.write_profile(
+            {
+                "date": timezone.now().isoformat(),
+                "method": request.method,
+                "endpoint": match.view_name if match else request.path,
+                "path": request.path,
+                "status": response.status_code,
+                "streaming": response.streaming,
+                "duration": duration,
+                "queries": len(profile.queries),
+                "db_time": profile.db_time,
+                "slowest": [
+                    {"sql": sql, "duration": query_duration}
+                    for sql, query_duration in profile.get_slowest(top)
+                ],
+                "duplicates": [
+                    {"fingerprint": fingerprint, "count": runs}
+                    for fingerprint, runs in duplicates[:top]
+                ],
+            }
+        )
+        return duplicates
+
+    def write_profile(self, profile):
+        line = json.dumps(profile) + "\n"
+        with profiling_log_lock:
+            with open(settings.QUERY_PROFILING_LOG, "a") as log:
+                log.write(line)
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-10-19 06:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oais', '0020_alter_archive_options_alter_profile_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Statistics',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('scope', models.IntegerField(choices=[(1, 'TOTAL'), (2, 'SOURCE'), (3, 'DAY')])),
+                ('key', models.CharField(blank=True, default='', max_length=50)),
+                ('harvested_count', models.IntegerField(default=0)),
+                ('preserved_count', models.IntegerField(default=0)),
+                ('pushed_to_tape_count', models.IntegerField(default=0)),
+                ('pushed_to_registry_count', models.IntegerField(default=0)),
+                ('last_modification_timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'statistics',
+                'ordering': ['scope', 'key'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='statistics',
+            constraint=models.UniqueConstraint(fields=('scope', 'key'), name='statistics_scope_key_unique'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.6 on 2026-10-19 06:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("oais", "0021_statistics"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UploadJobChunk",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("offset", models.BigIntegerField()),
+                ("size", models.BigIntegerField()),
+                ("checksum", models.CharField(max_length=150)),
+                ("timestamp", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "upload_job",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chunks",
+                        to="oais.uploadjob",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["offset"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="uploadjobchunk",
+            constraint=models.UniqueConstraint(
+                fields=("upload_job", "offset"), name="upload_job_chunk_offset_unique"
+            ),
+        ),
+    ]
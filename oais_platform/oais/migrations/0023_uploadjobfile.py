@@ -0,0 +1,102 @@
+# Generated by Django 5.0.6 on 2026-10-19 07:01
+
+import hashlib
+import json
+import os
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def files_to_ledger(apps, schema_editor):
+    UploadJob = apps.get_model("oais", "UploadJob")
+    UploadJobFile = apps.get_model("oais", "UploadJobFile")
+
+    ledger = []
+    for upload_job in UploadJob.objects.all():
+        files = upload_job.files_json
+        if isinstance(files, str):
+            files = json.loads(files)
+        for local_path, path in (files or {}).items():
+            # Files already removed from the temporary directory are dropped
+            if not os.path.isfile(local_path):
+                continue
+            with open(local_path, "rb") as f:
+                checksum = hashlib.file_digest(f, "sha256").hexdigest()
+            ledger.append(
+                UploadJobFile(
+                    upload_job=upload_job,
+                    path=path,
+                    size=os.path.getsize(local_path),
+                    checksum=checksum,
+                )
+            )
+    UploadJobFile.objects.bulk_create(ledger, ignore_conflicts=True)
+
+
+def ledger_to_files(apps, schema_editor):
+    UploadJob = apps.get_model("oais", "UploadJob")
+
+    for upload_job in UploadJob.objects.prefetch_related("files"):
+        upload_job.files_json = json.dumps(
+            {
+                os.path.join(upload_job.tmp_dir, file.path): file.path
+                for file in upload_job.files.all()
+            }
+        )
+        upload_job.save(update_fields=["files_json"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("oais", "0022_uploadjobchunk"),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name="uploadjob",
+            old_name="files",
+            new_name="files_json",
+        ),
+        migrations.CreateModel(
+            name="UploadJobFile",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("path", models.CharField(max_length=1000)),
+                ("size", models.BigIntegerField()),
+                ("checksum", models.CharField(max_length=64)),
+                ("timestamp", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "upload_job",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="files",
+                        to="oais.uploadjob",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["path"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="uploadjobfile",
+            constraint=models.UniqueConstraint(
+                fields=("upload_job", "path"), name="upload_job_file_path_unique"
+            ),
+        ),
+        migrations.RunPython(files_to_ledger, ledger_to_files),
+        # Lets the column be added back to the existing rows on rollback,
+        # before ledger_to_files fills it in (as a JSON encoded string)
+        migrations.AlterField(
+            model_name="uploadjob",
+            name="files_json",
+            field=models.JSONField(default="{}"),
+        ),
+        migrations.RemoveField(
+            model_name="uploadjob",
+            name="files_json",
+        ),
+    ]
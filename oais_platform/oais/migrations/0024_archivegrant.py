@@ -0,0 +1,103 @@
+# Generated by Django 5.0.6 on 2026-10-19 07:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+REQUESTER, APPROVER, USER_PERMISSION, GROUP_PERMISSION = 1, 2, 3, 4
+
+
+def build_grants(apps, schema_editor):
+    Archive = apps.get_model("oais", "Archive")
+    ArchiveGrant = apps.get_model("oais", "ArchiveGrant")
+    Permission = apps.get_model("auth", "Permission")
+    UserObjectPermission = apps.get_model("guardian", "UserObjectPermission")
+    GroupObjectPermission = apps.get_model("guardian", "GroupObjectPermission")
+
+    grants = set()
+    for archive_id, requester_id, approver_id in Archive.objects.values_list(
+        "id", "requester_id", "approver_id"
+    ).iterator():
+        grants.add((archive_id, requester_id, REQUESTER))
+        grants.add((archive_id, approver_id, APPROVER))
+
+    # The permission does not exist yet on a new database
+    permission = Permission.objects.filter(
+        content_type__app_label="oais",
+        content_type__model="archive",
+        codename="view_archive",
+    ).first()
+    if permission is not None:
+        for model, user_field, reason in [
+            (UserObjectPermission, "user_id", USER_PERMISSION),
+            (GroupObjectPermission, "group__user", GROUP_PERMISSION),
+        ]:
+            for object_pk, user_id in (
+                model.objects.filter(permission=permission)
+                .values_list("object_pk", user_field)
+                .iterator()
+            ):
+                grants.add((int(object_pk), user_id, reason))
+
+    ArchiveGrant.objects.bulk_create(
+        [
+            ArchiveGrant(archive_id=archive_id, user_id=user_id, reason=reason)
+            for archive_id, user_id, reason in grants
+            if user_id is not None
+        ],
+        batch_size=5000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("oais", "0023_uploadjobfile"),
+        ("guardian", "0002_generic_permissions_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchiveGrant",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "reason",
+                    models.IntegerField(
+                        choices=[
+                            (1, "REQUESTER"),
+                            (2, "APPROVER"),
+                            (3, "USER_PERMISSION"),
+                            (4, "GROUP_PERMISSION"),
+                        ]
+                    ),
+                ),
+                (
+                    "archive",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="grants",
+                        to="oais.archive",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archive_grants",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="archivegrant",
+            constraint=models.UniqueConstraint(
+                fields=("user", "archive", "reason"),
+                name="archivegrant_user_archive_reason_unique",
+            ),
+        ),
+        migrations.RunPython(build_grants, migrations.RunPython.noop),
+    ]
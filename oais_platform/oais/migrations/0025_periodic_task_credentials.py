@@ -0,0 +1,101 @@
+# Generated by Django 5.0.6 on 2026-10-19 09:12
+
+import json
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from django.conf import settings
+from django.db import migrations
+
+# Task name: (index of the API key, index of the Archive, index of the User,
+# index of the source name) in the arguments of the periodic task
+TASK_ARGS = {
+    "check_am_status": (3, 2, None, None),
+    "check_fts_job_status": (3, 0, None, None),
+    "batch_harvest": (5, None, 1, 2),
+}
+
+
+def get_user_keys(ApiKey, user_ids, source_name):
+    """
+    Returns the decrypted API Keys of the given Users for the source
+    """
+    keys = {}
+    # Built from the settings, as the models may change after this migration
+    fallbacks = getattr(settings, "ENCRYPT_KEY_FALLBACKS", [])
+    fernet = MultiFernet([Fernet(key) for key in (settings.ENCRYPT_KEY, *fallbacks)])
+    for user_id, ciphertext in ApiKey.objects.filter(
+        user_id__in=user_ids, source__name=source_name
+    ).values_list("user_id", "_key"):
+        try:
+            keys[user_id] = fernet.decrypt(ciphertext.encode()).decode()
+        except InvalidToken:
+            pass
+    return keys
+
+
+def get_reference(apps, args, key_index, archive_index, user_index, source_index):
+    """
+    Finds the User owning the API Key passed in the arguments of a task:
+    the batch harvests pass the User, the Archive tasks use the key of either
+    the requester or the approver. Keys that cannot be matched are dropped.
+    """
+    Archive = apps.get_model("oais", "Archive")
+    ApiKey = apps.get_model("oais", "ApiKey")
+
+    if archive_index is not None:
+        archive = Archive.objects.filter(pk=args[archive_index]).first()
+        if archive is None:
+            return None
+        user_ids = [archive.requester_id, archive.approver_id]
+        source_name = archive.source
+    else:
+        user_ids = [args[user_index]]
+        source_name = args[source_index]
+
+    keys = get_user_keys(ApiKey, user_ids, source_name)
+    for user_id in user_ids:
+        if user_id is not None and keys.get(user_id) == args[key_index]:
+            return {"user": user_id, "source": source_name}
+    return None
+
+
+def replace_api_keys(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+
+    for task in PeriodicTask.objects.filter(task__in=TASK_ARGS):
+        key_index, *indexes = TASK_ARGS[task.task]
+        args = json.loads(task.args)
+        if len(args) <= key_index or not isinstance(args[key_index], str):
+            continue
+        args[key_index] = get_reference(apps, args, key_index, *indexes)
+        task.args = json.dumps(args)
+        task.save(update_fields=["args"])
+
+
+def restore_api_keys(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    ApiKey = apps.get_model("oais", "ApiKey")
+
+    for task in PeriodicTask.objects.filter(task__in=TASK_ARGS):
+        key_index = TASK_ARGS[task.task][0]
+        args = json.loads(task.args)
+        if len(args) <= key_index or not isinstance(args[key_index], dict):
+            continue
+        reference = args[key_index]
+        args[key_index] = get_user_keys(
+            ApiKey, [reference["user"]], reference["source"]
+        ).get(reference["user"])
+        task.args = json.dumps(args)
+        task.save(update_fields=["args"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("oais", "0024_archivegrant"),
+        ("django_celery_beat", "0018_improve_crontab_helptext"),
+    ]
+
+    operations = [
+        migrations.RunPython(replace_api_keys, restore_api_keys),
+    ]
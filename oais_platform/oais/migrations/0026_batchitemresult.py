@@ -0,0 +1,58 @@
+# Generated by Django 5.0.6 on 2026-10-19 08:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("oais", "0025_periodic_task_credentials"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BatchItemResult",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("item", models.CharField(max_length=1024)),
+                (
+                    "status",
+                    models.IntegerField(choices=[(1, "SUCCEEDED"), (2, "FAILED")]),
+                ),
+                (
+                    "error_class",
+                    models.CharField(default=None, max_length=255, null=True),
+                ),
+                ("message", models.TextField(default=None, null=True)),
+                ("timestamp", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "archive",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="batch_results",
+                        to="oais.archive",
+                    ),
+                ),
+                (
+                    "collection",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="batch_results",
+                        to="oais.collection",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["collection", "status"],
+                        name="oais_batchi_collect_0b43cc_idx",
+                    )
+                ],
+            },
+        ),
+    ]
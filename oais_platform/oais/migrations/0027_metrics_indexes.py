@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-19 08:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("oais", "0026_batchitemresult"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="archive",
+            index=models.Index(
+                condition=models.Q(("staged", True)),
+                fields=["staged"],
+                name="archive_staged_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="step",
+            index=models.Index(
+                condition=models.Q(("status", 7)),
+                fields=["status"],
+                name="step_waiting_idx",
+            ),
+        ),
+    ]
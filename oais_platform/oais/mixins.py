@@ -1,15 +1,137 @@
+import functools
+import hashlib
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from rest_framework.response import Response
 
 
+def only_selected_fields(queryset, serializer, required_fields=()):
+    """
+    Restricts the queryset to the columns read by the fields selected in the
+    serializer, so that large columns left out of the response are not fetched.
+    `required_fields` are always fetched, e.g. those checked for permissions.
+    """
+    serializer = getattr(serializer, "child", serializer)
+    if not hasattr(serializer, "get_model_fields"):
+        return queryset
+    names = serializer.get_model_fields()
+    if names is None:
+        return queryset
+    # Fields followed by select_related cannot be deferred
+    if isinstance(queryset.query.select_related, dict):
+        names |= set(queryset.query.select_related)
+    return queryset.only(*names, *required_fields)
+
+
 class PaginationMixin:
     def make_paginated_response(self, queryset, serializer_class, extra_context=None):
-        page = self.paginate_queryset(queryset)
         context = {"request": self.request}
         if extra_context:
             context |= extra_context
+        queryset = only_selected_fields(queryset, serializer_class(context=context))
+
+        page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = serializer_class(page, context=context, many=True)
             return self.get_paginated_response(serializer.data)
 
         serializer = serializer_class(queryset, context=context, many=True)
         return Response(serializer.data)
+
+
+class SparseFieldsMixin:
+    """
+    Restricts the queryset of the list and retrieve actions to the columns
+    needed by the fields selected with the `fields` and `exclude` parameters
+    """
+
+    # Fields read by the permission checks on the retrieved object
+    required_fields = []
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in ["list", "retrieve"]:
+            queryset = only_selected_fields(
+                queryset, self.get_serializer(), self.required_fields
+            )
+        return queryset
+
+
+def conditional_get(view):
+    """
+    Decorates a list or detail action of a viewset defining `modification_field`
+    so that it answers If-None-Match and If-Modified-Since with a 304 when
+    nothing changed. The validators of a list come from a single aggregate
+    over the objects of the response (latest modification, count and a
+    signature of their ids, as visibility changes leave the objects
+    unmodified), those of a detail from the object, once its permissions are
+    checked. Both are computed before anything is serialized.
+    """
+
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        if (self.lookup_url_kwarg or self.lookup_field) in kwargs:
+            # Raises before revealing anything about an object not allowed
+            instance = self.get_object()
+            stats = {
+                "last_modified": getattr(instance, self.modification_field),
+                "count": 1,
+            }
+        else:
+            queryset = self.filter_queryset(self.get_queryset())
+            stats = queryset.order_by().aggregate(
+                last_modified=Max(self.modification_field),
+                count=Count("pk"),
+                max_id=Max("pk"),
+                id_sum=Sum("pk"),
+            )
+        if stats["last_modified"] is None:
+            # Empty results or missing object, nothing worth validating
+            return view(self, request, *args, **kwargs)
+
+        # Responses differ by query parameters, format and user visibility
+        key = "|".join(
+            [
+                request.get_full_path(),
+                request.accepted_media_type,
+                str(request.user.pk),
+                stats["last_modified"].isoformat(),
+                str(stats["count"]),
+                str(stats.get("max_id")),
+                str(stats.get("id_sum")),
+            ]
+        )
+        etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+        last_modified = int(stats["last_modified"].timestamp())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = view(self, request, *args, **kwargs)
+        if response.status_code in [200, 304]:
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    return wrapper
+
+
+class ConditionalGetMixin:
+    """
+    Answers conditional GET requests on the list and retrieve actions,
+    see `conditional_get`
+    """
+
+    modification_field = None
+
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
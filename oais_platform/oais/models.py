@@ -1,17 +1,29 @@
 import json
 import logging
-
-from cryptography.fernet import Fernet
-from django.contrib.auth.models import User
+import os
+import shutil
+import time
+from collections import defaultdict
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.contenttypes.models import ContentType
 from django.contrib.postgres.fields import ArrayField
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models, transaction
-from django.db.models.signals import post_save
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Exists, F, Func, Min, OuterRef, Q, Subquery
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
+from guardian.models import GroupObjectPermission, UserObjectPermission
 
+from oais_platform.oais.events import publish_step_event
+from oais_platform.oais.metrics import record_step_status
 from oais_platform.oais.sources.abstract_source import AbstractSource
-from oais_platform.settings import ENCRYPT_KEY, INVENIO_SERVER_URL
+from oais_platform.settings import INVENIO_SERVER_URL
 
 from . import pipeline
 
@@ -124,6 +136,12 @@ class Archive(models.Model):
             ("view_archive_all", "Can view all archives"),
             ("can_edit_all", "Can edit all archives"),
         )
+        # Counted by the metrics on each scrape
+        indexes = [
+            models.Index(
+                fields=["staged"], condition=Q(staged=True), name="archive_staged_idx"
+            )
+        ]
 
     def set_last_completed_step(self, step_id):
         """
@@ -166,6 +184,16 @@ class Archive(models.Model):
         self.title = title
         self.save()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_owners = instance._get_owners()
+        return instance
+
+    def _get_owners(self):
+        # Deferred owners are left out, they cannot have changed
+        return self.__dict__.get("requester_id"), self.__dict__.get("approver_id")
+
     def save(self, *args, **kwargs):
         # If the object is being created right now:
         if not self.pk:
@@ -183,10 +211,32 @@ class Archive(models.Model):
             # The resource now exists, so I attach it to the archive
             self.resource = resource
 
+        previous_state = self.state
         self.set_state()
         self.last_modification_timestamp = timezone.now()
-        # Normal logic of the save method
-        super(Archive, self).save(*args, **kwargs)
+
+        with transaction.atomic():
+            # The in-memory state may be stale, check the stored one before counting
+            if self.pk and self.state != previous_state:
+                previous_state = (
+                    Archive.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("state", flat=True)
+                    .first()
+                )
+            # Normal logic of the save method
+            super(Archive, self).save(*args, **kwargs)
+            if self.state != previous_state:
+                Statistics.update_archive_state(self.source, previous_state, self.state)
+            # Keep the grants of the requester and approver in sync
+            owners = self._get_owners()
+            loaded_owners = getattr(self, "_loaded_owners", (None, None))
+            for reason, user_id, loaded_user_id in zip(
+                [GrantReason.REQUESTER, GrantReason.APPROVER], owners, loaded_owners
+            ):
+                if user_id != loaded_user_id:
+                    ArchiveGrant.set_grants([self.pk], reason, user_id)
+        self._loaded_owners = owners
 
     def delete(self, *args, **kwargs):
         # delete all steps related to this archive
@@ -280,32 +330,20 @@ class Archive(models.Model):
             return locked_archive._get_next_steps(step_name)
 
     def _get_next_steps(self, step_name):
-        next_steps = pipeline.get_next_steps(step_name).copy()  # shallow
-
-        if (
-            not self.title
-            or self.title == ""
-            or self.title == f"{self.source} - {self.recid}"
-        ) and self.state != ArchiveState.NONE:
-            next_steps.append(Steps.EXTRACT_TITLE)
-
-        if self.state == ArchiveState.AIP or Steps.ARCHIVE in list(
-            Step.objects.filter(id__in=self.pipeline_steps).values_list(
-                "name", flat=True
-            )
-        ):
-            if Steps.PUSH_TO_CTA not in next_steps:
-                next_steps.append(Steps.PUSH_TO_CTA)
+        archived = (
+            self.state == ArchiveState.AIP
+            or Step.objects.filter(
+                id__in=self.pipeline_steps, name=Steps.ARCHIVE
+            ).exists()
+        )
 
+        can_notify = False
+        if archived:
             try:
                 source = Source.objects.get(name=self.source)
-                if (
-                    source
-                    and source.notification_enabled
-                    and source.notification_endpoint
-                    and Steps.NOTIFY_SOURCE not in next_steps
-                ):
-                    next_steps.append(Steps.NOTIFY_SOURCE)
+                can_notify = bool(
+                    source.notification_enabled and source.notification_endpoint
+                )
             except Source.DoesNotExist:
                 logging.warning(f"Source with name {self.source} does not exists.")
             except Source.MultipleObjectsReturned:
@@ -313,6 +351,107 @@ class Archive(models.Model):
                     f"Source with name {self.source} returned multiple objects."
                 )
 
+        return Archive._resolve_next_steps(
+            step_name,
+            self.state,
+            Archive._needs_title(self.title, self.source, self.recid),
+            archived,
+            can_notify,
+        )
+
+    @classmethod
+    def get_next_steps_in_bulk(cls, archive_ids):
+        """
+        Read-only version of get_next_steps for many Archives at once:
+        everything is resolved with a single query and no row is locked.
+        Returns a dict mapping each Archive id to its state, last_step_status,
+        pipeline_steps and next_steps
+        """
+        pipeline_tail_name = Step.objects.filter(
+            pk=Cast(
+                KeyTextTransform("-1", OuterRef("pipeline_steps")),
+                models.IntegerField(),
+            )
+        ).values("name")[:1]
+        archive_in_pipeline = Step.objects.filter(
+            archive=OuterRef("pk"),
+            name=Steps.ARCHIVE,
+            archive__pipeline_steps__contains=Func(
+                F("id"), function="to_jsonb", output_field=models.JSONField()
+            ),
+        )
+        can_notify = (
+            Source.objects.filter(name=OuterRef("source"), notification_enabled=True)
+            .exclude(notification_endpoint=None)
+            .exclude(notification_endpoint="")
+        )
+
+        archives = cls.objects.filter(pk__in=archive_ids).values(
+            "id",
+            "state",
+            "title",
+            "source",
+            "recid",
+            "pipeline_steps",
+            last_step_name=F("last_step__name"),
+            last_step_status=F("last_step__status"),
+            pipeline_tail_name=Subquery(pipeline_tail_name),
+            archive_in_pipeline=Exists(archive_in_pipeline),
+            can_notify=Exists(can_notify),
+        )
+
+        result = {}
+        for archive in archives:
+            if archive["pipeline_steps"]:
+                step_name = archive["pipeline_tail_name"]
+            else:
+                step_name = archive["last_step_name"]
+
+            if step_name is None:
+                next_steps = []
+            else:
+                next_steps = cls._resolve_next_steps(
+                    step_name,
+                    archive["state"],
+                    cls._needs_title(
+                        archive["title"], archive["source"], archive["recid"]
+                    ),
+                    archive["state"] == ArchiveState.AIP
+                    or archive["archive_in_pipeline"],
+                    archive["can_notify"],
+                )
+
+            result[archive["id"]] = {
+                "state": archive["state"],
+                "last_step_status": archive["last_step_status"],
+                "pipeline_steps": archive["pipeline_steps"],
+                "next_steps": next_steps,
+            }
+        return result
+
+    @staticmethod
+    def _needs_title(title, source, recid):
+        return not title or title == "" or title == f"{source} - {recid}"
+
+    @staticmethod
+    def _resolve_next_steps(step_name, state, needs_title, archived, can_notify):
+        """
+        Possible next Steps after step_name, where archived tells if the Archive
+        is an AIP (or is going to be) and can_notify if its Source accepts
+        notifications
+        """
+        next_steps = pipeline.get_next_steps(step_name).copy()  # shallow
+
+        if needs_title and state != ArchiveState.NONE:
+            next_steps.append(Steps.EXTRACT_TITLE)
+
+        if archived:
+            if Steps.PUSH_TO_CTA not in next_steps:
+                next_steps.append(Steps.PUSH_TO_CTA)
+
+            if can_notify and Steps.NOTIFY_SOURCE not in next_steps:
+                next_steps.append(Steps.NOTIFY_SOURCE)
+
         return next_steps
 
 
@@ -341,9 +480,37 @@ class Step(models.Model):
     )
     output_data = models.TextField(null=True, default=None)
 
+    class Meta:
+        # Counted by the metrics on each scrape
+        indexes = [
+            models.Index(
+                fields=["status"],
+                condition=Q(status=Status.WAITING),
+                name="step_waiting_idx",
+            )
+        ]
+
     def set_status(self, status):
+        previous_status = self.status
         self.status = status
         self.save()
+        publish_step_event(self)
+        if status != previous_status and status in (Status.COMPLETED, Status.FAILED):
+            record_step_status(
+                Steps(self.name).name.lower(),
+                Status(status).name.lower(),
+                self.start_date,
+                self.get_source(),
+                status == Status.FAILED,
+            )
+
+    def get_source(self):
+        """
+        Returns the source of the Archive, without loading it if not done yet
+        """
+        if Step.archive.is_cached(self):
+            return self.archive.source
+        return Archive.objects.values_list("source", flat=True).get(pk=self.archive_id)
 
     def set_task(self, task_id):
         self.celery_task_id = task_id
@@ -366,7 +533,20 @@ class Step(models.Model):
         self.save()
 
     def save(self, *args, **kwargs):
-        super(Step, self).save(*args, **kwargs)
+        with transaction.atomic():
+            # Only the first completed push of an Archive is counted
+            first_push = (
+                self.name in Statistics.PUSH_COUNTERS
+                and self.status == Status.COMPLETED
+                and not Step.objects.filter(
+                    archive_id=self.archive_id, name=self.name, status=Status.COMPLETED
+                ).exists()
+            )
+            super(Step, self).save(*args, **kwargs)
+            if first_push:
+                Statistics.update_counters(
+                    self.archive.source, **{Statistics.PUSH_COUNTERS[self.name]: 1}
+                )
         self.archive.save()
 
 
@@ -411,6 +591,22 @@ class Resource(models.Model):
         ]
 
 
+def get_archive_ids(archives):
+    """
+    Returns the set of ids of the given Archives, which can be Archives, ids
+    or dicts with an id
+    """
+    ids = set()
+    for archive in archives:
+        if isinstance(archive, Archive):
+            ids.add(archive.pk)
+        elif isinstance(archive, dict):
+            ids.add(int(archive["id"]))
+        else:
+            ids.add(int(archive))
+    return ids
+
+
 class Collection(models.Model):
     """
     A collection of multiple archives
@@ -449,11 +645,406 @@ class Collection(models.Model):
 
     def add_archive(self, archive):
         self.archives.add(archive)
-        self.save()
+        self.set_modification_timestamp()
 
     def remove_archive(self, archive):
         self.archives.remove(archive)
-        self.save()
+        self.set_modification_timestamp()
+
+    @staticmethod
+    def with_archives_count(queryset):
+        """
+        Annotates the Collections with their number of Archives, counted by
+        a subquery evaluated only for the rows returned
+        """
+        count = (
+            Collection.archives.through.objects.filter(collection_id=OuterRef("pk"))
+            .order_by()
+            .values("collection_id")
+            .annotate(count=Count("*"))
+            .values("count")
+        )
+        return queryset.annotate(archives_count=Coalesce(Subquery(count), 0))
+
+    def add_archives(self, archives):
+        """
+        Adds the given Archives (see get_archive_ids) with a single insert in
+        the through table, then updates the modification timestamp
+        """
+        through = Collection.archives.through
+        through.objects.bulk_create(
+            [
+                through(collection_id=self.id, archive_id=archive_id)
+                for archive_id in get_archive_ids(archives)
+            ],
+            ignore_conflicts=True,
+        )
+        self.set_modification_timestamp()
+
+    def remove_archives(self, archives):
+        """
+        Removes the given Archives (see get_archive_ids) with a single delete
+        in the through table, then updates the modification timestamp
+        """
+        Collection.archives.through.objects.filter(
+            collection_id=self.id, archive_id__in=get_archive_ids(archives)
+        ).delete()
+        self.set_modification_timestamp()
+
+
+class BatchItemStatus(models.IntegerChoices):
+    SUCCEEDED = 1, "SUCCEEDED"
+    FAILED = 2, "FAILED"
+
+
+class BatchItemResult(models.Model):
+    """
+    Outcome of a single item (a path or a record id) of a batch operation
+    whose Archives are grouped under a Collection
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    collection = models.ForeignKey(
+        Collection, on_delete=models.CASCADE, related_name="batch_results"
+    )
+    item = models.CharField(max_length=1024)
+    status = models.IntegerField(choices=BatchItemStatus.choices)
+    error_class = models.CharField(max_length=255, null=True, default=None)
+    message = models.TextField(null=True, default=None)
+    archive = models.ForeignKey(
+        Archive, on_delete=models.SET_NULL, null=True, related_name="batch_results"
+    )
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["collection", "status"])]
+
+    @classmethod
+    def succeeded(cls, collection, item, archive):
+        return cls(
+            collection=collection,
+            item=item,
+            status=BatchItemStatus.SUCCEEDED,
+            archive=archive,
+        )
+
+    @classmethod
+    def failed(cls, collection, item, message, error_class=None, archive=None):
+        return cls(
+            collection=collection,
+            item=item,
+            status=BatchItemStatus.FAILED,
+            error_class=error_class,
+            message=message,
+            archive=archive,
+        )
+
+    @classmethod
+    def get_error_summary(cls, collection_id):
+        """
+        Returns the failures of the Collection grouped by error class and
+        message, the most frequent first
+        """
+        return (
+            cls.objects.filter(
+                collection_id=collection_id, status=BatchItemStatus.FAILED
+            )
+            .values("error_class", "message")
+            .annotate(count=Count("id"), first_item=Min("item"))
+            .order_by("-count", "message")
+        )
+
+
+class GrantReason(models.IntegerChoices):
+    REQUESTER = 1, "REQUESTER"
+    APPROVER = 2, "APPROVER"
+    USER_PERMISSION = 3, "USER_PERMISSION"
+    GROUP_PERMISSION = 4, "GROUP_PERMISSION"
+
+
+class ArchiveGrant(models.Model):
+    """
+    Materialized visibility of the Archives: one row for each User allowed
+    to view an Archive as its requester, its approver or through a guardian
+    view_archive permission, given to the User or to one of its groups.
+    Kept in sync by Archive.save and the permission and group signals, so
+    that visibility is a lookup on the (user, archive) index.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    archive = models.ForeignKey(
+        Archive, on_delete=models.CASCADE, related_name="grants"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="archive_grants"
+    )
+    reason = models.IntegerField(choices=GrantReason.choices)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "archive", "reason"],
+                name="archivegrant_user_archive_reason_unique",
+            )
+        ]
+
+    @staticmethod
+    def get_view_permission():
+        return Permission.objects.get(
+            content_type=ContentType.objects.get_for_model(Archive),
+            codename="view_archive",
+        )
+
+    @classmethod
+    def set_grants(cls, archive_ids, reason, user_id):
+        """
+        Replaces the grants of the given Archives for `reason` (requester
+        or approver) with one for the given User. Meant to run in the
+        transaction changing the Archives.
+        """
+        cls.objects.filter(archive_id__in=archive_ids, reason=reason).delete()
+        if user_id is not None:
+            cls.objects.bulk_create(
+                [
+                    cls(archive_id=archive_id, user_id=user_id, reason=reason)
+                    for archive_id in archive_ids
+                ],
+                ignore_conflicts=True,
+            )
+
+    @classmethod
+    def rebuild(cls, archive_ids=None, user_ids=None):
+        """
+        Recomputes the grants of the given Archives and/or Users,
+        or all of them if none is given
+        """
+        grants = set()
+
+        owners = Archive.objects.all()
+        if archive_ids is not None:
+            owners = owners.filter(id__in=archive_ids)
+        if user_ids is not None:
+            owners = owners.filter(Q(requester__in=user_ids) | Q(approver__in=user_ids))
+        for archive_id, requester_id, approver_id in owners.values_list(
+            "id", "requester_id", "approver_id"
+        ).iterator():
+            grants.add((archive_id, requester_id, GrantReason.REQUESTER))
+            grants.add((archive_id, approver_id, GrantReason.APPROVER))
+
+        permission = cls.get_view_permission()
+        for model, user_field, reason in [
+            (UserObjectPermission, "user_id", GrantReason.USER_PERMISSION),
+            (GroupObjectPermission, "group__user", GrantReason.GROUP_PERMISSION),
+        ]:
+            granted = model.objects.filter(permission=permission)
+            if archive_ids is not None:
+                granted = granted.filter(object_pk__in=[str(id) for id in archive_ids])
+            if user_ids is not None:
+                granted = granted.filter(**{f"{user_field}__in": user_ids})
+            for object_pk, user_id in granted.values_list(
+                "object_pk", user_field
+            ).iterator():
+                grants.add((int(object_pk), user_id, reason))
+
+        stale = cls.objects.all()
+        if archive_ids is not None:
+            stale = stale.filter(archive_id__in=archive_ids)
+        if user_ids is not None:
+            stale = stale.filter(user_id__in=user_ids)
+
+        with transaction.atomic():
+            stale.delete()
+            cls.objects.bulk_create(
+                [
+                    cls(archive_id=archive_id, user_id=user_id, reason=reason)
+                    for archive_id, user_id, reason in grants
+                    if user_id is not None and (user_ids is None or user_id in user_ids)
+                ],
+                batch_size=5000,
+                ignore_conflicts=True,
+            )
+
+
+@receiver([post_save, post_delete], sender=UserObjectPermission)
+@receiver([post_save, post_delete], sender=GroupObjectPermission)
+def update_archive_grants(sender, instance, **kwargs):
+    # Only view_archive permissions on Archives give visibility
+    if instance.permission.codename == "view_archive" and (
+        instance.content_type.model_class() is Archive
+    ):
+        ArchiveGrant.rebuild(archive_ids=[int(instance.object_pk)])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def update_group_archive_grants(sender, instance, action, reverse, **kwargs):
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    if isinstance(instance, Group):
+        # The members changed, refresh the Archives the group can view
+        archive_ids = GroupObjectPermission.objects.filter(
+            group=instance, permission=ArchiveGrant.get_view_permission()
+        ).values_list("object_pk", flat=True)
+        ArchiveGrant.rebuild(archive_ids=[int(pk) for pk in archive_ids])
+    else:
+        ArchiveGrant.rebuild(user_ids=[instance.pk])
+
+
+class StatisticsScope(models.IntegerChoices):
+    TOTAL = 1, "TOTAL"
+    SOURCE = 2, "SOURCE"
+    DAY = 3, "DAY"
+
+
+class Statistics(models.Model):
+    """
+    Precomputed counters of the archival process, updated when Archives
+    change state and when pushes to tape or to the registry complete.
+    The TOTAL row holds the platform totals, SOURCE rows the totals of each
+    source and DAY rows the events that happened on each day.
+    """
+
+    id = models.AutoField(primary_key=True)
+    scope = models.IntegerField(choices=StatisticsScope.choices)
+    # Source name for SOURCE rows, ISO date for DAY rows, empty for the TOTAL row
+    key = models.CharField(max_length=50, default="", blank=True)
+    harvested_count = models.IntegerField(default=0)
+    preserved_count = models.IntegerField(default=0)
+    pushed_to_tape_count = models.IntegerField(default=0)
+    pushed_to_registry_count = models.IntegerField(default=0)
+    last_modification_timestamp = models.DateTimeField(default=timezone.now)
+
+    COUNTERS = [
+        "harvested_count",
+        "preserved_count",
+        "pushed_to_tape_count",
+        "pushed_to_registry_count",
+    ]
+    PUSH_COUNTERS = {
+        Steps.PUSH_TO_CTA: "pushed_to_tape_count",
+        Steps.INVENIO_RDM_PUSH: "pushed_to_registry_count",
+    }
+
+    class Meta:
+        ordering = ["scope", "key"]
+        verbose_name_plural = "statistics"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["scope", "key"], name="statistics_scope_key_unique"
+            )
+        ]
+
+    @classmethod
+    def update_archive_state(cls, source, previous_state, state):
+        """
+        Update the harvested/preserved counters of an Archive going
+        from previous_state to state
+        """
+        harvested = [ArchiveState.SIP, ArchiveState.AIP]
+        cls.update_counters(
+            source,
+            harvested_count=(state in harvested) - (previous_state in harvested),
+            preserved_count=(state == ArchiveState.AIP)
+            - (previous_state == ArchiveState.AIP),
+        )
+
+    @classmethod
+    def update_counters(cls, source, **deltas):
+        """
+        Add the given deltas to the TOTAL and SOURCE counters and
+        the positive ones (new events) to the counters of the current day.
+        Nothing is done until the counters are initialized by reconcile()
+        """
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        day_deltas = {name: delta for name, delta in deltas.items() if delta > 0}
+
+        with transaction.atomic():
+            if not cls._add(StatisticsScope.TOTAL, "", deltas, create=False):
+                return
+            cls._add(StatisticsScope.SOURCE, source, deltas)
+            if day_deltas:
+                cls._add(
+                    StatisticsScope.DAY, timezone.localdate().isoformat(), day_deltas
+                )
+
+    @classmethod
+    def _add(cls, scope, key, deltas, create=True):
+        updates = {name: F(name) + delta for name, delta in deltas.items()}
+        updates["last_modification_timestamp"] = timezone.now()
+        if cls.objects.filter(scope=scope, key=key).update(**updates):
+            return True
+        if not create:
+            return False
+        try:
+            with transaction.atomic():
+                cls.objects.create(scope=scope, key=key, **deltas)
+        except IntegrityError:
+            # The row was created in the meantime by another transaction
+            cls.objects.filter(scope=scope, key=key).update(**updates)
+        return True
+
+    @classmethod
+    def reconcile(cls):
+        """
+        Recompute all the counters from the Archives and Steps, fixing any drift
+        of the incremental updates. Each event is dated with the first
+        completion of the Step that caused it.
+        """
+        events = {
+            "harvested_count": (
+                [Steps.CHECKSUM, Steps.ARCHIVE],
+                {"archive__state__in": [ArchiveState.SIP, ArchiveState.AIP]},
+            ),
+            "preserved_count": (
+                [Steps.ARCHIVE],
+                {"archive__state": ArchiveState.AIP},
+            ),
+        }
+        for step_name, counter in cls.PUSH_COUNTERS.items():
+            events[counter] = ([step_name], {})
+
+        rows = defaultdict(lambda: dict.fromkeys(cls.COUNTERS, 0))
+        rows[(StatisticsScope.TOTAL, "")]
+        for counter, (step_names, archive_filter) in events.items():
+            first_completions = (
+                Step.objects.filter(
+                    name__in=step_names, status=Status.COMPLETED, **archive_filter
+                )
+                .values("archive", "archive__source")
+                .annotate(first=Min(Coalesce("finish_date", "create_date")))
+                .order_by()
+            )
+            for completion in first_completions:
+                day = timezone.localdate(completion["first"]).isoformat()
+                rows[(StatisticsScope.TOTAL, "")][counter] += 1
+                rows[(StatisticsScope.SOURCE, completion["archive__source"])][
+                    counter
+                ] += 1
+                rows[(StatisticsScope.DAY, day)][counter] += 1
+
+        now = timezone.now()
+        with transaction.atomic():
+            # Lock the rows in the same order as update_counters() to avoid deadlocks
+            list(cls.objects.select_for_update().order_by("scope", "key"))
+            cls.objects.update(
+                last_modification_timestamp=now, **dict.fromkeys(cls.COUNTERS, 0)
+            )
+            cls.objects.bulk_create(
+                [
+                    cls(
+                        scope=scope,
+                        key=key,
+                        last_modification_timestamp=now,
+                        **counters,
+                    )
+                    for (scope, key), counters in rows.items()
+                ],
+                update_conflicts=True,
+                unique_fields=["scope", "key"],
+                update_fields=cls.COUNTERS + ["last_modification_timestamp"],
+            )
 
 
 class UploadJob(models.Model):
@@ -468,24 +1059,94 @@ class UploadJob(models.Model):
     timestamp = models.DateTimeField(default=timezone.now)
     tmp_dir = models.CharField(max_length=1000)
     sip_dir = models.CharField(max_length=1000)
-    files = models.JSONField()
 
     class Meta:
         ordering = ["-id"]
 
-    def get_files(self):
-        return json.loads(self.files)
-
-    def add_file(self, local_path, sip_path):
-        files = json.loads(self.files)
-        files[local_path] = sip_path
-        self.files = json.dumps(files)
-        self.save(update_fields=["files"])
+    def add_files(self, files):
+        """
+        Records the given UploadJobFiles in a single query,
+        replacing the ones already uploaded with the same path
+        """
+        for file in files:
+            file.upload_job = self
+        UploadJobFile.objects.bulk_create(
+            files,
+            update_conflicts=True,
+            unique_fields=["upload_job", "path"],
+            update_fields=["size", "checksum", "timestamp"],
+        )
 
     def set_sip_dir(self, sip_dir):
         self.sip_dir = sip_dir
         self.save(update_fields=["sip_dir"])
 
+    def delete_chunks(self):
+        """
+        Deletes the chunks of a zipped SIP uploaded to this UploadJob
+        """
+        self.chunks.all().delete()
+        shutil.rmtree(UploadJobChunk.get_dir(self.tmp_dir), ignore_errors=True)
+
+
+class UploadJobFile(models.Model):
+    """
+    A file uploaded to an UploadJob, stored under its tmp_dir at `path`
+    """
+
+    id = models.AutoField(primary_key=True)
+    upload_job = models.ForeignKey(
+        UploadJob, on_delete=models.CASCADE, related_name="files"
+    )
+    # Path relative to the UploadJob tmp_dir, kept in the SIP
+    path = models.CharField(max_length=1000)
+    size = models.BigIntegerField()
+    # SHA-256 hex digest
+    checksum = models.CharField(max_length=64)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["path"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["upload_job", "path"], name="upload_job_file_path_unique"
+            )
+        ]
+
+
+class UploadJobChunk(models.Model):
+    """
+    A chunk of a zipped SIP uploaded to an UploadJob, covering
+    `size` bytes of the zip from `offset`
+    """
+
+    id = models.AutoField(primary_key=True)
+    upload_job = models.ForeignKey(
+        UploadJob, on_delete=models.CASCADE, related_name="chunks"
+    )
+    offset = models.BigIntegerField()
+    size = models.BigIntegerField()
+    # Algorithm and base64 digest, as in the Upload-Checksum header
+    checksum = models.CharField(max_length=150)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["offset"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["upload_job", "offset"], name="upload_job_chunk_offset_unique"
+            )
+        ]
+
+    @staticmethod
+    def get_dir(tmp_dir):
+        # Next to the UploadJob tmp_dir, whose whole content goes in the SIP
+        return os.path.normpath(tmp_dir) + ".chunks"
+
+    @classmethod
+    def get_path(cls, tmp_dir, offset):
+        return os.path.join(cls.get_dir(tmp_dir), f"{offset:020d}")
+
 
 def get_source_classnames():
     return [(cls.__name__, cls.__name__) for cls in AbstractSource.__subclasses__()]
@@ -510,6 +1171,24 @@ class Source(models.Model):
         ordering = ("id",)
 
 
+_fernets = {}
+
+
+def get_fernet():
+    """
+    Returns the MultiFernet encrypting with ENCRYPT_KEY, which also decrypts
+    with the ENCRYPT_KEY_FALLBACKS so that the key can be rotated
+    """
+    keys = (settings.ENCRYPT_KEY, *settings.ENCRYPT_KEY_FALLBACKS)
+    if keys not in _fernets:
+        _fernets[keys] = MultiFernet([Fernet(key) for key in keys])
+    return _fernets[keys]
+
+
+# Decrypted API Keys by user id, along with their expiry time
+_api_key_cache = {}
+
+
 class ApiKey(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, null=False, related_name="api_key"
@@ -525,12 +1204,10 @@ class ApiKey(models.Model):
         ]
 
     def encrypt(self, text):
-        f = Fernet(ENCRYPT_KEY)
-        return f.encrypt(text.encode()).decode()
+        return get_fernet().encrypt(text.encode()).decode()
 
     def decrypt(self, ciphertext) -> str:
-        f = Fernet(ENCRYPT_KEY)
-        return f.decrypt(ciphertext.encode()).decode()
+        return get_fernet().decrypt(ciphertext.encode()).decode()
 
     def get_key(self):
         return self.decrypt(self._key)
@@ -539,3 +1216,86 @@ class ApiKey(models.Model):
         self._key = self.encrypt(val)
 
     key = property(get_key, set_key)
+
+    @classmethod
+    def rotate_all(cls, batch_size=1000):
+        """
+        Re-encrypts the stored API Keys with ENCRYPT_KEY, so that the
+        ENCRYPT_KEY_FALLBACKS can be removed. Returns the number of keys
+        re-encrypted and of keys none of the keys can decrypt, left untouched.
+        """
+        fernet = get_fernet()
+        rotated, failed = 0, 0
+        api_keys = []
+        for api_key in cls.objects.only("_key").iterator(chunk_size=batch_size):
+            try:
+                api_key._key = fernet.rotate(api_key._key.encode()).decode()
+            except InvalidToken:
+                logging.warning(f"API Key {api_key.id} cannot be decrypted")
+                failed += 1
+                continue
+            api_keys.append(api_key)
+            if len(api_keys) == batch_size:
+                rotated += cls.objects.bulk_update(api_keys, ["_key"])
+                api_keys = []
+        rotated += cls.objects.bulk_update(api_keys, ["_key"])
+        return rotated, failed
+
+    @classmethod
+    def get_user_keys(cls, user_id):
+        """
+        Returns the decrypted API Keys of the User by source name, loaded in a
+        single query and cached in the process for API_KEY_CACHE_TTL seconds
+        """
+        now = time.monotonic()
+        cached = _api_key_cache.get(user_id)
+        if cached is not None and cached[0] > now:
+            return dict(cached[1])
+
+        fernet = get_fernet()
+        keys = {}
+        for source_name, ciphertext in cls.objects.filter(user_id=user_id).values_list(
+            "source__name", "_key"
+        ):
+            try:
+                keys[source_name] = fernet.decrypt(ciphertext.encode()).decode()
+            except InvalidToken:
+                logging.warning(
+                    f"API Key of user {user_id} for {source_name} cannot be decrypted"
+                )
+        _api_key_cache[user_id] = (now + settings.API_KEY_CACHE_TTL, keys)
+        return dict(keys)
+
+    @classmethod
+    def get_user_key(cls, user_id, source_name):
+        """
+        Returns the decrypted API Key of the User for the given source, if any
+        """
+        return cls.get_user_keys(user_id).get(source_name)
+
+    @staticmethod
+    def get_reference(user_id, source_name):
+        """
+        Returns a reference to the API Key of the User for the given source,
+        passed to Celery tasks in place of the key itself
+        """
+        if user_id is None:
+            return None
+        return {"user": user_id, "source": source_name}
+
+    @classmethod
+    def resolve(cls, credentials):
+        """
+        Returns the API Key referenced by `credentials`. A plain string is an
+        API Key passed by a task queued before references were used.
+        """
+        if not credentials:
+            return None
+        if isinstance(credentials, str):
+            return credentials
+        return cls.get_user_key(credentials["user"], credentials["source"])
+
+
+@receiver([post_save, post_delete], sender=ApiKey)
+def invalidate_api_keys(sender, instance, **kwargs):
+    _api_key_cache.pop(instance.user_id, None)
@@ -1,8 +1,10 @@
-from django.db.models import Q
-from guardian.shortcuts import get_objects_for_user, get_perms
+import hmac
+
+from django.conf import settings
+from django.db.models import Count, Q, QuerySet
 from rest_framework import permissions
 
-from oais_platform.oais.models import Archive
+from oais_platform.oais.models import Archive, ArchiveGrant, get_archive_ids
 
 
 class UserPermission(permissions.BasePermission):
@@ -26,12 +28,12 @@ class ArchivePermission(permissions.BasePermission):
         if user.is_superuser:
             return True
         if view.action in ["archives_unstage"]:
-            if self._can_view_archive_list(user, request.data["archives"]):
+            if can_view_archives(user, request.data["archives"]):
                 return self._can_approve_archive(user)
             else:
                 return False
         elif view.action in ["archive_action_intersection"]:
-            return self._can_view_archive_list(user, request.data["archives"])
+            return can_view_archives(user, request.data["archives"])
         elif view.action == "list" and request.GET.get("access", "all") == "public":
             return True
         else:
@@ -53,27 +55,13 @@ class ArchivePermission(permissions.BasePermission):
             return self._can_view_archive(request.user, obj)
 
     def _can_view_archive(self, user, archive):
-        if user.is_superuser or user.has_perm("oais.view_archive_all"):
-            return True
-        elif "oais.view_arhive" in get_perms(user, archive):
+        # Public and owned Archives need no lookup
+        if not archive.restricted or user.id in [
+            archive.requester_id,
+            archive.approver_id,
+        ]:
             return True
-        elif (
-            archive.requester == user
-            or archive.approver == user
-            or not archive.restricted
-        ):
-            return True
-        return False
-
-    def _can_view_archive_list(self, user, archives):
-        for archive in archives:
-            if type(archive) is int:
-                archive = Archive.objects.get(id=archive)
-            elif type(archive) is dict:
-                archive = Archive.objects.get(id=archive["id"])
-            if not self._can_view_archive(user, archive):
-                return False
-        return True
+        return can_view_archives(user, [archive])
 
     def _can_edit_archive(self, user, archive):
         if not self._can_view_archive(user, archive):
@@ -102,18 +90,14 @@ class ArchivePermission(permissions.BasePermission):
 
 
 class StepPermission(permissions.BasePermission):
-    archive_perms = ArchivePermission()
-
     def has_permission(self, request, view):
         return request.user.is_authenticated
 
     def has_object_permission(self, request, view, obj):
-        return self.archive_perms._can_view_archive(request.user, obj.archive)
+        return can_view_archives(request.user, [obj.archive_id])
 
 
 class TagPermission(permissions.BasePermission):
-    archive_perms = ArchivePermission()
-
     def has_permission(self, request, view):
         return request.user.is_authenticated
 
@@ -125,15 +109,11 @@ class TagPermission(permissions.BasePermission):
             if not user.id == obj.creator.id:
                 return False
             if request.data["archives"]:
-                return self.archive_perms._can_view_archive_list(
-                    user, request.data["archives"]
-                )
+                return can_view_archives(user, request.data["archives"])
             return True
         if view.action in ["edit_tag", "delete_tag"]:
             return user.id == obj.creator.id
-        return self.archive_perms._can_view_archive_list(
-            request.user, obj.archives.all()
-        )
+        return can_view_archives(request.user, obj.archives.all())
 
 
 class SuperUserPermission(permissions.BasePermission):
@@ -144,20 +124,75 @@ class SuperUserPermission(permissions.BasePermission):
         return request.user.is_superuser
 
 
+class MetricsPermission(permissions.BasePermission):
+    """
+    Lets the scrapers presenting the METRICS_TOKEN as a bearer token and the
+    superusers read the metrics
+    """
+
+    def has_permission(self, request, view):
+        if request.user.is_superuser:
+            return True
+        if not settings.METRICS_TOKEN:
+            return False
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(
+            token.encode(), settings.METRICS_TOKEN.encode()
+        )
+
+
+def can_view_all_archives(user):
+    """
+    Whether the user can view every Archive, including through
+    a global view_archive permission
+    """
+    return (
+        user.is_superuser
+        or user.has_perm("oais.view_archive_all")
+        or user.has_perm("oais.view_archive")
+    )
+
+
+def get_visible_filter(user):
+    """
+    Returns the condition on Archives visible to a user who cannot view them all.
+    Owners and guardian permissions are materialized as ArchiveGrants.
+    """
+    return Q(restricted=False) | Q(
+        pk__in=ArchiveGrant.objects.filter(user=user).values("archive_id")
+    )
+
+
+def can_view_archives(user, archives):
+    """
+    Whether the user can view all the given Archives, in a single query.
+    They can be given as a queryset or as a list of Archives, of ids or of
+    dicts with an id. Missing Archives cannot be viewed.
+    """
+    if can_view_all_archives(user):
+        return True
+
+    if isinstance(archives, QuerySet):
+        queryset = archives
+    else:
+        ids = get_archive_ids(archives)
+        if not ids:
+            return True
+        queryset = Archive.objects.filter(pk__in=ids)
+
+    counts = queryset.order_by().aggregate(
+        total=Count("pk"), visible=Count("pk", filter=get_visible_filter(user))
+    )
+    expected = counts["total"] if isinstance(archives, QuerySet) else len(ids)
+    return counts["visible"] == expected
+
+
 def filter_archives(queryset, user=None, visibility="all"):
     match visibility:
         case "all":
-            if user.is_superuser or user.has_perm("oais.view_archive_all"):
+            if can_view_all_archives(user):
                 return queryset
-            permission_granted_queryset = get_objects_for_user(
-                user, "oais.view_archive"
-            )
-            return (
-                queryset.filter(
-                    Q(approver=user) | Q(requester=user) | Q(restricted=False)
-                )
-                | permission_granted_queryset
-            )
+            return queryset.filter(get_visible_filter(user))
         case "owned":
             return queryset.filter(Q(approver=user) | Q(requester=user))
         case "public":
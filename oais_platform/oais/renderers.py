@@ -0,0 +1,70 @@
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Renders JSON with orjson, falling back to the DRF encoder for the types
+    orjson does not know (e.g. lazy strings) and to JSONRenderer when an
+    indented output is requested (e.g. by the browsable API)
+    """
+
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type or "", renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        rendered = orjson.dumps(
+            data,
+            default=self.encoder.default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z,
+        )
+        # Escaped by JSONRenderer as they end lines in JavaScript
+        return rendered.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+class ORJSONParser(JSONParser):
+    """
+    Parses JSON request bodies with orjson
+    """
+
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Allows negotiating text/event-stream, the streams themselves are
+    returned as StreamingHttpResponse and only errors are rendered here
+    """
+
+    media_type = "text/event-stream"
+    format = "event-stream"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return ORJSONRenderer().render(data)
+
+
+class PrometheusRenderer(BaseRenderer):
+    """
+    Allows negotiating the Prometheus text format, the metrics themselves are
+    returned as HttpResponse and only errors are rendered here
+    """
+
+    media_type = "text/plain"
+    format = "prometheus"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return ORJSONRenderer().render(data)
@@ -1,19 +1,68 @@
 from django.contrib.auth.models import Group, User
+from django.core.exceptions import FieldDoesNotExist
 from opensearch_dsl import utils
 from rest_framework import serializers
 
+from oais_platform.oais.exceptions import BadRequest
 from oais_platform.oais.models import (
     ApiKey,
     Archive,
+    BatchItemResult,
     Collection,
     Profile,
     Resource,
     Source,
+    Statistics,
     Step,
     UploadJob,
 )
 
 
+class SparseFieldsSerializerMixin:
+    """
+    Serializes only the fields selected with the `fields` or `exclude` query
+    parameters (comma separated names) of the request given in the context.
+    Nested serializers are not given the request and always render in full.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None:
+            return
+
+        selected = set(self.fields)
+        for param in ["fields", "exclude"]:
+            value = request.query_params.get(param)
+            if value is None:
+                continue
+            names = {name.strip() for name in value.split(",") if name.strip()}
+            if unknown := names - set(self.fields):
+                raise BadRequest(f"Unknown fields: {', '.join(sorted(unknown))}")
+            selected = selected & names if param == "fields" else selected - names
+
+        for name in set(self.fields) - selected:
+            self.fields.pop(name)
+
+    def get_model_fields(self):
+        """
+        Returns the names of the model fields read by the selected fields,
+        or None if it cannot be told (e.g. a field computed from the object)
+        """
+        opts = self.Meta.model._meta
+        names = {opts.pk.name}
+        for field in self.fields.values():
+            if field.source == "*":
+                return None
+            try:
+                model_field = opts.get_field(field.source.split(".")[0])
+            except FieldDoesNotExist:
+                return None
+            if model_field.concrete and not model_field.many_to_many:
+                names.add(model_field.name)
+        return names
+
+
 class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
@@ -49,7 +98,7 @@ class APIKeySerializer(serializers.ModelSerializer):
         fields = ["source", "key"]
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     is_superuser = serializers.SerializerMethodField()
     permissions = serializers.SerializerMethodField()
 
@@ -83,7 +132,7 @@ class UserMinimalSerializer(serializers.ModelSerializer):
         ]
 
 
-class StepSerializer(serializers.ModelSerializer):
+class StepSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     archive = serializers.IntegerField(source="archive.id")
 
     class Meta:
@@ -115,7 +164,7 @@ class LastStepSerializer(serializers.ModelSerializer):
         ]
 
 
-class ArchiveSerializer(serializers.ModelSerializer):
+class ArchiveSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     approver = UserMinimalSerializer()
     requester = UserMinimalSerializer()
     resource = ResourceSerializer()
@@ -183,8 +232,37 @@ class ArchiveMinimalSerializer(serializers.ModelSerializer):
         ]
 
 
-class CollectionSerializer(serializers.ModelSerializer):
-    archives_count = serializers.IntegerField(source="archives.count", read_only=True)
+class ArchiveDuplicateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Archive
+        fields = [
+            "id",
+            "recid",
+            "source",
+            "timestamp",
+            "state",
+            "last_completed_step",
+        ]
+
+
+class RelatedCountField(serializers.IntegerField):
+    """
+    Number of objects of the relation given as source, read from the
+    annotation named after the field when the queryset has one
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        if hasattr(instance, self.field_name):
+            return getattr(instance, self.field_name)
+        return getattr(instance, self.source).count()
+
+
+class CollectionSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    archives_count = RelatedCountField(source="archives")
     creator = UserMinimalSerializer()
 
     class Meta:
@@ -209,7 +287,42 @@ class CollectionNameSerializer(serializers.ModelSerializer):
         ]
 
 
-class UploadJobSerializer(serializers.ModelSerializer):
+class BatchItemResultSerializer(
+    SparseFieldsSerializerMixin, serializers.ModelSerializer
+):
+    class Meta:
+        model = BatchItemResult
+        fields = [
+            "id",
+            "item",
+            "status",
+            "error_class",
+            "message",
+            "archive",
+            "timestamp",
+        ]
+
+
+class BatchErrorSummarySerializer(serializers.Serializer):
+    error_class = serializers.CharField()
+    message = serializers.CharField()
+    count = serializers.IntegerField()
+    first_item = serializers.CharField()
+
+
+class StatisticsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Statistics
+        fields = Statistics.COUNTERS
+
+
+class StatisticsBreakdownSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Statistics
+        fields = ["key"] + Statistics.COUNTERS
+
+
+class UploadJobSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     creator = UserMinimalSerializer()
 
     class Meta:
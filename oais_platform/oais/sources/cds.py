@@ -6,6 +6,7 @@ import pymarc
 import requests
 
 from oais_platform.oais.exceptions import ServiceUnavailable
+from oais_platform.oais.metrics import time_upstream_request
 from oais_platform.oais.sources.abstract_source import AbstractSource
 
 
@@ -25,16 +26,17 @@ class CDS(AbstractSource):
         try:
             # The "sc" parameter (split by collection) is used to provide
             # search results consistent with the ones from the CDS website
-            req = requests.get(
-                self.baseURL + "/search",
-                params={
-                    "p": query,
-                    "of": "xm",
-                    "rg": size,
-                    "jrec": int(size) * (int(page) - 1) + 1,
-                },
-                cookies=self.cookies,
-            )
+            with time_upstream_request(self.source, "search"):
+                req = requests.get(
+                    self.baseURL + "/search",
+                    params={
+                        "p": query,
+                        "of": "xm",
+                        "rg": size,
+                        "jrec": int(size) * (int(page) - 1) + 1,
+                    },
+                    cookies=self.cookies,
+                )
         except Exception:
             raise ServiceUnavailable("Cannot perform search")
 
@@ -63,9 +65,12 @@ class CDS(AbstractSource):
         try:
             # The "sc" parameter (split by collection) is used to provide
             # search results consistent with the ones from the CDS website
-            req = requests.get(
-                self.get_record_url(recid), params={"of": "xm"}, cookies=self.cookies
-            )
+            with time_upstream_request(self.source, "search_by_id"):
+                req = requests.get(
+                    self.get_record_url(recid),
+                    params={"of": "xm"},
+                    cookies=self.cookies,
+                )
         except Exception:
             raise ServiceUnavailable("Cannot perform search")
 
@@ -5,6 +5,7 @@ from operator import itemgetter
 import requests
 
 from oais_platform.oais.exceptions import ServiceUnavailable
+from oais_platform.oais.metrics import time_upstream_request
 from oais_platform.oais.sources.abstract_source import AbstractSource
 
 
@@ -19,11 +20,12 @@ class CodiMD(AbstractSource):
 
     def get_records(self):
         try:
-            req = requests.get(
-                "https://codimd.web.cern.ch/history",
-                stream=True,
-                cookies={"connect.sid": self.session_id},
-            )
+            with time_upstream_request(self.source, "search"):
+                req = requests.get(
+                    "https://codimd.web.cern.ch/history",
+                    stream=True,
+                    cookies={"connect.sid": self.session_id},
+                )
         except Exception:
             raise ServiceUnavailable("Cannot perform search")
 
@@ -5,6 +5,7 @@ import os
 import requests
 
 from oais_platform.oais.exceptions import ConfigFileUnavailable, ServiceUnavailable
+from oais_platform.oais.metrics import time_upstream_request
 from oais_platform.oais.sources.abstract_source import AbstractSource
 
 
@@ -63,16 +64,17 @@ class Indico(AbstractSource):
         # Makes the api calls to get the results
         for api_page in range(number_of_api_calls):
             try:
-                req = requests.get(
-                    self.baseURL
-                    + "/search/api/search?q="
-                    + query
-                    + "&type=contribution"
-                    + "&type=subcontribution"
-                    + "&type=event"
-                    + f"&page={api_page + actual_page}",
-                    headers=self.headers,
-                )
+                with time_upstream_request(self.source, "search"):
+                    req = requests.get(
+                        self.baseURL
+                        + "/search/api/search?q="
+                        + query
+                        + "&type=contribution"
+                        + "&type=subcontribution"
+                        + "&type=event"
+                        + f"&page={api_page + actual_page}",
+                        headers=self.headers,
+                    )
             except Exception:
                 raise ServiceUnavailable("Cannot perform search")
             data = json.loads(req.text)
@@ -102,7 +104,8 @@ class Indico(AbstractSource):
         result = []
 
         try:
-            req = requests.get(self.get_record_by_id(recid), headers=self.headers)
+            with time_upstream_request(self.source, "search_by_id"):
+                req = requests.get(self.get_record_by_id(recid), headers=self.headers)
 
         except Exception:
             raise ServiceUnavailable("Cannot perform searching", recid)
@@ -10,6 +10,7 @@ from oais_platform.oais.exceptions import (
     RetryableException,
     ServiceUnavailable,
 )
+from oais_platform.oais.metrics import time_upstream_request
 from oais_platform.oais.models import Status, Steps
 from oais_platform.oais.sources.abstract_source import AbstractSource
 
@@ -57,10 +58,11 @@ class Invenio(AbstractSource):
 
     def search(self, query, page=1, size=20):
         try:
-            req = requests.get(
-                f"{self.baseURL}/records?q={query}&size={str(size)}&page={str(page)}",
-                headers=self.headers,
-            )
+            with time_upstream_request(self.source, "search"):
+                req = requests.get(
+                    f"{self.baseURL}/records?q={query}&size={str(size)}&page={str(page)}",
+                    headers=self.headers,
+                )
         except Exception:
             raise ServiceUnavailable("Cannot perform search")
 
@@ -88,7 +90,8 @@ class Invenio(AbstractSource):
         result = []
 
         try:
-            req = requests.get(self.get_record_url(recid), headers=self.headers)
+            with time_upstream_request(self.source, "search_by_id"):
+                req = requests.get(self.get_record_url(recid), headers=self.headers)
         except Exception:
             raise ServiceUnavailable("Cannot perform search")
 
@@ -177,12 +180,13 @@ class Invenio(AbstractSource):
         if registry_link:
             payload["uri"] = registry_link
 
-        req = requests.post(
-            notification_endpoint,
-            headers=headers,
-            data=json.dumps(payload),
-            verify=False,
-        )
+        with time_upstream_request(self.source, "notify"):
+            req = requests.post(
+                notification_endpoint,
+                headers=headers,
+                data=json.dumps(payload),
+                verify=False,
+            )
 
         if req.status_code == 202:
             return 0
@@ -0,0 +1,393 @@
+import errno
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+from oais_platform.oais.exceptions import ExtractionError
+
+# Size of the blocks read from disk while streaming
+CHUNK_SIZE = 1024 * 1024
+
+# Single byte range, e.g. "bytes=0-499", "bytes=500-" or "bytes=-500"
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class _Sink:
+    """
+    Unseekable file object collecting what ZipFile writes, so that it can be
+    handed out chunk by chunk. Being unseekable makes ZipFile write the CRC and
+    sizes in data descriptors after each entry instead of seeking back.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+class ZipStream:
+    """
+    Iterable producing a zip archive of the given directory on the fly,
+    without writing anything to disk. Entries are stored as they are unless
+    `compression` is ZIP_DEFLATED; the length of a stored archive is known
+    in advance, see `size`.
+    """
+
+    def __init__(self, root, compression=zipfile.ZIP_STORED):
+        self.root = root
+        self.compression = compression
+        self.entries = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in dirnames + sorted(filenames):
+                path = os.path.join(dirpath, name)
+                zinfo = zipfile.ZipInfo.from_file(
+                    path, os.path.relpath(path, root), strict_timestamps=False
+                )
+                if zinfo.is_dir():
+                    zinfo.CRC = 0
+                else:
+                    zinfo.compress_type = compression
+                self.entries.append((path, zinfo))
+
+    def __iter__(self):
+        sink = _Sink()
+        with zipfile.ZipFile(sink, "w", self.compression) as archive:
+            for path, zinfo in self.entries:
+                if zinfo.is_dir():
+                    archive.mkdir(zinfo)
+                    continue
+                with open(path, "rb") as f, archive.open(zinfo, "w") as entry:
+                    while chunk := f.read(CHUNK_SIZE):
+                        entry.write(chunk)
+                        yield sink.pop()
+                yield sink.pop()
+        yield sink.pop()
+
+    def size(self):
+        """
+        Returns the exact length of the archive if entries are stored, following
+        the layout written by zipfile, or None if they are compressed
+        """
+        if self.compression != zipfile.ZIP_STORED:
+            return None
+
+        offset = central_dir = 0
+        for _, zinfo in self.entries:
+            name_length = len(zinfo.filename.encode("utf-8"))
+            file_size = zinfo.file_size
+
+            # Central directory record, with a ZIP64 extra field when needed
+            zip64_fields = 2 if file_size > zipfile.ZIP64_LIMIT else 0
+            zip64_fields += 1 if offset > zipfile.ZIP64_LIMIT else 0
+            central_dir += 46 + name_length
+            central_dir += 4 + 8 * zip64_fields if zip64_fields else 0
+
+            # Local header, data and (for files) data descriptor
+            offset += 30 + name_length
+            if not zinfo.is_dir():
+                zip64 = file_size * 1.05 > zipfile.ZIP64_LIMIT
+                offset += file_size + (20 + 24 if zip64 else 16)
+
+        end_record = 22
+        if (
+            len(self.entries) > zipfile.ZIP_FILECOUNT_LIMIT
+            or offset > zipfile.ZIP64_LIMIT
+            or central_dir > zipfile.ZIP64_LIMIT
+        ):
+            # ZIP64 end of central directory record and locator
+            end_record += 56 + 20
+        return offset + central_dir + end_record
+
+
+def serve_file(request, path, content_type, filename):
+    """
+    Returns a response sending the file at `path` as an attachment. Files under
+    X_ACCEL_ROOT are handed off to nginx through X-Accel-Redirect, the others
+    are served by Django, honouring single Range and If-Range requests so that
+    interrupted downloads can be resumed.
+    """
+    disposition = f'attachment; filename="{filename}"'
+    path = os.path.realpath(path)
+
+    if settings.X_ACCEL_ROOT:
+        root = os.path.realpath(settings.X_ACCEL_ROOT)
+        if os.path.commonpath([root, path]) == root:
+            response = HttpResponse(content_type=content_type)
+            response["X-Accel-Redirect"] = quote(
+                settings.X_ACCEL_LOCATION + os.path.relpath(path, root)
+            )
+            response["Content-Disposition"] = disposition
+            return response
+
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    last_modified = http_date(stat.st_mtime)
+
+    byte_range = _parse_range(request, size, etag, stat.st_mtime)
+    if byte_range is None:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    elif byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(path, start, end), status=206, content_type=content_type
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = last_modified
+    response["Content-Disposition"] = disposition
+    return response
+
+
+def _parse_range(request, size, etag, mtime):
+    """
+    Returns the (start, end) byte positions requested, None if the whole file
+    should be sent or False if the range cannot be satisfied
+    """
+    header = request.headers.get("Range")
+    if not header:
+        return None
+
+    # A range only applies to the version of the file the client already has
+    if_range = request.headers.get("If-Range")
+    if if_range:
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            if if_range != etag:
+                return None
+        elif parse_http_date_safe(if_range) != int(mtime):
+            return None
+
+    match = RANGE_RE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        # Multiple or malformed ranges, which may be ignored
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # Suffix range, the last bytes of the file
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def _read_range(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0 and (chunk := f.read(min(CHUNK_SIZE, remaining))):
+            remaining -= len(chunk)
+            yield chunk
+
+
+class ChunkedFile:
+    """
+    Read-only, seekable file object over consecutive chunk files, so that an
+    upload received in chunks can be read without reassembling it on disk.
+    `chunks` is a list of (path, size) ordered by offset.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = []
+        offset = 0
+        for path, size in chunks:
+            self.chunks.append((offset, size, path))
+            offset += size
+        self.size = offset
+        self.position = 0
+        self.current = None
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            # As real files do, zipfile expects an OSError for small archives
+            raise OSError(errno.EINVAL, "Negative seek position")
+        self.position = offset
+        return self.position
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else self.position + size
+        data = bytearray()
+        while self.position < min(end, self.size):
+            start, length, path = self._chunk_at(self.position)
+            self.current.seek(self.position - start)
+            block = self.current.read(min(end, start + length) - self.position)
+            if not block:
+                raise OSError(f"Chunk {path} is shorter than expected")
+            data += block
+            self.position += len(block)
+        return bytes(data)
+
+    def _chunk_at(self, position):
+        # Chunks are few compared to reads, a linear scan is enough
+        for chunk in self.chunks:
+            start, length, path = chunk
+            if start <= position < start + length:
+                if self.current is None or self.current.name != path:
+                    self.close()
+                    self.current = open(path, "rb")
+                return chunk
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def extract_sip(source, base_path, max_bytes=None, max_entries=None, workers=None):
+    """
+    Extracts the zipped SIP read from the `source` file object under base_path
+    and returns its location. The zip must contain a single top folder and fit
+    the SIP_EXTRACT_MAX_BYTES and SIP_EXTRACT_MAX_ENTRIES budgets. Entries are
+    extracted in parallel to a staging folder, renamed into place when complete.
+    """
+    if max_bytes is None:
+        max_bytes = settings.SIP_EXTRACT_MAX_BYTES
+    if max_entries is None:
+        max_entries = settings.SIP_EXTRACT_MAX_ENTRIES
+    if workers is None:
+        workers = settings.SIP_EXTRACT_WORKERS
+
+    with zipfile.ZipFile(source, "r") as compressed:
+        entries = compressed.infolist()
+        if len(entries) > max_entries:
+            raise ExtractionError(f"The zip has more than {max_entries} entries")
+        if sum(info.file_size for info in entries) > max_bytes:
+            raise ExtractionError(f"The zip expands to more than {max_bytes} bytes")
+        top = _get_top_folder(entries)
+
+        target = os.path.join(base_path, top)
+        if os.path.exists(target):
+            raise ExtractionError(f"{top} already exists")
+
+        staging = tempfile.mkdtemp(prefix=".extract-", dir=base_path)
+        try:
+            # Create the folders first, so that the workers only write files
+            files = []
+            folders = set()
+            for info in entries:
+                path = os.path.join(staging, info.filename)
+                folder = path if info.is_dir() else os.path.dirname(path)
+                if folder not in folders:
+                    os.makedirs(folder, exist_ok=True)
+                    folders.add(folder)
+                if not info.is_dir():
+                    files.append(info)
+
+            # Each worker takes a share of the entries, as one task per entry
+            # costs more than extracting a small file. ZipFile serializes the
+            # reads of the source, decompression and writes run in parallel.
+            if workers > 1 and len(files) > 1:
+                with ThreadPoolExecutor(workers) as executor:
+                    for _ in executor.map(
+                        lambda share: _extract_entries(compressed, share, staging),
+                        [files[i::workers] for i in range(workers)],
+                    ):
+                        pass
+            else:
+                _extract_entries(compressed, files, staging)
+
+            try:
+                os.rename(os.path.join(staging, top), target)
+            except OSError:
+                raise ExtractionError(f"{top} already exists")
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    return target
+
+
+def _get_top_folder(entries):
+    """
+    Returns the folder containing all the entries, refusing
+    absolute paths and paths leaving it
+    """
+    tops = set()
+    for info in entries:
+        name = info.filename
+        parts = name.rstrip("/").split("/")
+        if name.startswith("/") or "\\" in name or ".." in parts or "" in parts:
+            raise ExtractionError(f"Invalid path {name}")
+        if len(parts) == 1 and not info.is_dir():
+            raise ExtractionError("The SIP must be a single folder")
+        tops.add(parts[0])
+    if len(tops) != 1:
+        raise ExtractionError("The SIP must be a single folder")
+    return tops.pop()
+
+
+def _extract_entries(compressed, entries, staging):
+    for info in entries:
+        written = 0
+        # ZipExtFile stops at the declared size, which the budget was checked
+        # on, and checks the CRC of what it read
+        try:
+            with compressed.open(info) as entry, open(
+                os.path.join(staging, info.filename), "wb"
+            ) as destination:
+                # ZipExtFile is slower on large reads, use the size shutil copies with
+                while chunk := entry.read(shutil.COPY_BUFSIZE):
+                    written += len(chunk)
+                    destination.write(chunk)
+        except (zipfile.BadZipFile, zlib.error, EOFError):
+            raise ExtractionError(f"{info.filename} is corrupted")
+        if written != info.file_size:
+            raise ExtractionError(f"{info.filename} is smaller than declared")
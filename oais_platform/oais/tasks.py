@@ -9,7 +9,7 @@ from urllib.parse import urljoin
 import bagit_create
 import requests
 from amclient import AMClient
-from celery import shared_task, states
+from celery import group, shared_task, states
 from celery.utils.log import get_task_logger
 from django.apps import apps
 from django.contrib.auth.models import User
@@ -18,13 +18,20 @@ from django.utils import timezone
 from django_celery_beat.models import IntervalSchedule, PeriodicTask
 from oais_utils.validate import get_manifest, validate_sip
 
+from oais_platform.oais.events import publish_step_event
 from oais_platform.oais.exceptions import RetryableException
+from oais_platform.oais.metrics import record_retry, time_upstream_request
 from oais_platform.oais.models import (
     ApiKey,
     Archive,
+    ArchiveGrant,
     ArchiveState,
+    BatchItemResult,
+    BatchItemStatus,
     Collection,
+    GrantReason,
     Source,
+    Statistics,
     Status,
     Step,
     Steps,
@@ -46,6 +53,7 @@ from oais_platform.settings import (
     AUTOMATIC_HARVEST_BATCH_SIZE,
     AUTOMATIC_HARVEST_MAX_FILE_SIZE,
     BASE_URL,
+    BATCH_FLUSH_SIZE,
     BIC_UPLOAD_PATH,
     CTA_BASE_PATH,
     FILES_URL,
@@ -123,10 +131,10 @@ def finalize(self, status, retval, task_id, args, kwargs, einfo):
                 archive.set_last_completed_step(step_id)
 
             # Execute the remainig steps in the pipeline
-            api_key = None
+            credentials = None
             if len(args) >= 4:
-                api_key = args[3]
-            execute_pipeline(archive_id, api_key=api_key)
+                credentials = args[3]
+            execute_pipeline(archive_id, credentials=credentials)
         else:
             # Set the Step as failed and save the return value as the output data
             step.set_status(Status.FAILED)
@@ -144,22 +152,24 @@ def create_step(step_name, archive, input_step_id=None, input_data=None):
     archive: target Archive
     input_step_id: (optional) step to set as "input" for the new one
     """
-    return Step.objects.create(
+    step = Step.objects.create(
         archive=archive,
         name=step_name,
         input_step_id=input_step_id,
         input_data=input_data,
         status=Status.WAITING,
     )
+    publish_step_event(step)
+    return step
 
 
-def run_step(step, archive_id, api_key=None):
+def run_step(step, archive_id, credentials=None):
     """
     Execute the given Step by spawning a Celery tasks for it
 
     step: target Step
     archive_id: ID of target Archive
-    api_key: API key
+    credentials: reference to the API key, see ApiKey.get_reference
     """
 
     # Set input_data generated by the previous step
@@ -178,26 +188,26 @@ def run_step(step, archive_id, api_key=None):
         archive.set_last_step(step.id)
 
     if step.name == Steps.HARVEST:
-        process.delay(step.archive.id, step.id, step.input_data, api_key)
+        process.delay(step.archive.id, step.id, step.input_data, credentials)
     elif step.name == Steps.VALIDATION:
-        validate.delay(step.archive.id, step.id, step.input_data, api_key)
+        validate.delay(step.archive.id, step.id, step.input_data, credentials)
     elif step.name == Steps.CHECKSUM:
-        checksum.delay(step.archive.id, step.id, step.input_data, api_key)
+        checksum.delay(step.archive.id, step.id, step.input_data, credentials)
     elif step.name == Steps.ARCHIVE:
-        archivematica.delay(step.archive.id, step.id, step.input_data, api_key)
+        archivematica.delay(step.archive.id, step.id, step.input_data, credentials)
     elif step.name == Steps.INVENIO_RDM_PUSH:
-        invenio.delay(step.archive.id, step.id, step.input_data, api_key)
+        invenio.delay(step.archive.id, step.id, step.input_data, credentials)
     elif step.name == Steps.PUSH_TO_CTA:
-        push_to_cta.delay(step.archive.id, step.id, step.input_data, api_key)
+        push_to_cta.delay(step.archive.id, step.id, step.input_data, credentials)
     elif step.name == Steps.EXTRACT_TITLE:
-        extract_title.delay(archive.id, step.id, step.input_data, api_key)
+        extract_title.delay(archive.id, step.id, step.input_data, credentials)
     elif step.name == Steps.NOTIFY_SOURCE:
-        notify_source.delay(archive_id, step.id, step.input_data, api_key)
+        notify_source.delay(archive_id, step.id, step.input_data, credentials)
 
     return step
 
 
-def execute_pipeline(archive_id, api_key=None, force_continue=False):
+def execute_pipeline(archive_id, credentials=None, force_continue=False):
 
     with transaction.atomic():
         archive = Archive.objects.select_for_update().get(pk=archive_id)
@@ -234,7 +244,82 @@ def execute_pipeline(archive_id, api_key=None, force_continue=False):
             return None
 
     if step.status == Status.WAITING:
-        return run_step(step, archive.id, api_key)
+        return run_step(step, archive.id, credentials)
+
+
+def unstage_archives(archive_ids, approver, job_tag):
+    """
+    Unstage the given Archives in bulk, grouping them under the job Tag and
+    starting their Harvest step. The database is updated with set operations
+    and the Harvest tasks, referencing the API keys of the approver, are
+    dispatched as a group once the transaction is committed.
+
+    archive_ids: IDs of the Archives to unstage
+    approver: User approving the Archives
+    job_tag: internal Collection grouping the Archives
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        archives = list(
+            Archive.objects.select_for_update()
+            .filter(pk__in=archive_ids)
+            .only("id", "source")
+        )
+
+        steps = Step.objects.bulk_create(
+            [
+                Step(
+                    archive_id=archive.id,
+                    name=Steps.HARVEST,
+                    status=Status.NOT_RUN,
+                    start_date=now,
+                )
+                for archive in archives
+            ]
+        )
+
+        for archive, step in zip(archives, steps):
+            archive.staged = False
+            archive.approver = approver
+            archive.last_step_id = step.id
+            archive.last_modification_timestamp = now
+        Archive.objects.bulk_update(
+            archives,
+            ["staged", "approver", "last_step", "last_modification_timestamp"],
+        )
+        # bulk_update skips Archive.save, update the approver grants here
+        ArchiveGrant.set_grants(
+            [archive.id for archive in archives], GrantReason.APPROVER, approver.id
+        )
+
+        job_tag.add_archives(archives)
+
+        harvests = group(
+            [
+                process.s(
+                    archive.id,
+                    step.id,
+                    None,
+                    ApiKey.get_reference(approver.id, archive.source),
+                )
+                for archive, step in zip(archives, steps)
+            ]
+        )
+        transaction.on_commit(harvests.apply_async)
+
+    return archives
+
+
+@shared_task(name="unstage_archives_task", bind=True, ignore_result=True)
+def unstage_archives_task(self, archive_ids, approver_id, job_tag_id):
+    """
+    Background version of unstage_archives, used for large selections
+    """
+    approver = User.objects.get(pk=approver_id)
+    job_tag = Collection.objects.get(pk=job_tag_id)
+    archives = unstage_archives(archive_ids, approver, job_tag)
+    logger.info(f"Unstaged {len(archives)} Archives in job Tag {job_tag_id}")
 
 
 def create_path_artifact(name, path, localpath):
@@ -268,7 +353,7 @@ def create_path_artifact(name, path, localpath):
     max_retries=1,
     retry_kwargs={"countdown": 3600},
 )
-def push_to_cta(self, archive_id, step_id, input_data=None, api_key=None):
+def push_to_cta(self, archive_id, step_id, input_data=None, credentials=None):
     """
     Push the AIP of the given Archive to CTA, preparing the FTS Job,
     locations etc, then saving the details of the operation as the output
@@ -307,6 +392,7 @@ def push_to_cta(self, archive_id, step_id, input_data=None, api_key=None):
             return 1
 
         logger.warning(f"Retrying pushing archive {archive_id} to CTA: {e}")
+        record_retry(self.name, archive.source)
         raise e
 
     logger.info(submitted_job)
@@ -326,7 +412,7 @@ def push_to_cta(self, archive_id, step_id, input_data=None, api_key=None):
         interval=schedule,
         name=f"FTS job status for step: {step.id}",
         task="check_fts_job_status",
-        args=json.dumps([archive.id, step.id, submitted_job, api_key]),
+        args=json.dumps([archive.id, step.id, submitted_job, credentials]),
         expire_seconds=3600.0,
     )
 
@@ -336,7 +422,7 @@ def push_to_cta(self, archive_id, step_id, input_data=None, api_key=None):
 
 
 @shared_task(name="check_fts_job_status", bind=True, ignore_result=True)
-def check_fts_job_status(self, archive_id, step_id, job_id, api_key=None):
+def check_fts_job_status(self, archive_id, step_id, job_id, credentials=None):
     """
     Check the status of a FTS job.
     If finished, set the corresponding step as completed and remove the
@@ -358,7 +444,9 @@ def check_fts_job_status(self, archive_id, step_id, job_id, api_key=None):
     logger.info(f"FTS job status for Step {step_id} returned: {status['job_state']}.")
 
     if status["job_state"] == "FINISHED":
-        _handle_completed_fts_job(self, task_name, step, archive_id, job_id, api_key)
+        _handle_completed_fts_job(
+            self, task_name, step, archive_id, job_id, credentials
+        )
     elif status["job_state"] == "FAILED":
         result = {"FTS status": status}
         input_data = json.loads(step.input_data)
@@ -372,8 +460,9 @@ def check_fts_job_status(self, archive_id, step_id, job_id, api_key=None):
                 f"Retrying pushing archive {archive_id} to CTA (attempt {result['retry_count'] + 1})"
             )
             result["retrying"] = True
+            record_retry("push_to_cta", step.archive.source)
             create_retry_step.apply_async(
-                args=(archive_id, True, Steps.PUSH_TO_CTA, api_key),
+                args=(archive_id, True, Steps.PUSH_TO_CTA, credentials),
                 eta=timezone.now() + timedelta(hours=1),
             )
         else:
@@ -386,7 +475,9 @@ def check_fts_job_status(self, archive_id, step_id, job_id, api_key=None):
 
 
 @shared_task(name="create_retry_step", bind=True, ignore_result=True)
-def create_retry_step(self, archive_id, execute=False, step_name=None, api_key=None):
+def create_retry_step(
+    self, archive_id, execute=False, step_name=None, credentials=None
+):
     archive = Archive.objects.get(pk=archive_id)
     last_step = Step.objects.get(pk=archive.last_step.id)
     if last_step and last_step.status != Status.FAILED:
@@ -412,12 +503,14 @@ def create_retry_step(self, archive_id, execute=False, step_name=None, api_key=N
     archive.save()
 
     if execute:
-        execute_pipeline(archive.id, api_key=api_key, force_continue=True)
+        execute_pipeline(archive.id, credentials=credentials, force_continue=True)
 
     return {"errormsg": None}
 
 
-def _handle_completed_fts_job(self, task_name, step, archive_id, job_id, api_key=None):
+def _handle_completed_fts_job(
+    self, task_name, step, archive_id, job_id, credentials=None
+):
     try:
         periodic_task = PeriodicTask.objects.get(name=task_name)
     except Exception as e:
@@ -442,7 +535,7 @@ def _handle_completed_fts_job(self, task_name, step, archive_id, job_id, api_key
         status=states.SUCCESS,
         retval=status,
         task_id=None,
-        args=[archive_id, step.id, None, api_key],
+        args=[archive_id, step.id, None, credentials],
         kwargs=None,
         einfo=None,
     )
@@ -453,14 +546,25 @@ def fts_delegate(self):
     try:
         fts = apps.get_app_config("oais").fts
         fts.delegate()
+        logger.info(f"FTS proxy lifetime: {fts.get_proxy_lifetime()}")
     except Exception as e:
         logger.warning(e)
 
 
+@shared_task(name="reconcile_statistics", bind=True, ignore_result=True)
+def reconcile_statistics(self):
+    """
+    Recompute the precomputed statistics, fixing the drift of the
+    incremental counters
+    """
+    logger.info("Reconciling statistics")
+    Statistics.reconcile()
+
+
 @shared_task(
     name="processInvenio", bind=True, ignore_result=True, after_return=finalize
 )
-def invenio(self, archive_id, step_id, input_data=None, api_key=None):
+def invenio(self, archive_id, step_id, input_data=None, credentials=None):
     """
     Publish an Archive on the configured InvenioRDM instance
     If the Archive was already published, create a new version of the Record.
@@ -592,7 +696,7 @@ def invenio(self, archive_id, step_id, input_data=None, api_key=None):
 @shared_task(
     name="process", bind=True, ignore_result=True, after_return=finalize, max_retries=5
 )
-def process(self, archive_id, step_id, input_data=None, api_key=None):
+def process(self, archive_id, step_id, input_data=None, credentials=None):
     """
     Run BagIt-Create to harvest data from upstream, preparing a
     Submission Package (SIP)
@@ -606,19 +710,21 @@ def process(self, archive_id, step_id, input_data=None, api_key=None):
     step = Step.objects.get(pk=step_id)
     step.set_status(Status.IN_PROGRESS)
 
+    api_key = ApiKey.resolve(credentials)
     if not api_key:
         logger.info(
             f"The given source({archive.source}) might requires an API key which was not provided."
         )
 
     try:
-        bagit_result = bagit_create.main.process(
-            recid=archive.recid,
-            source=archive.source,
-            loglevel=2,
-            target=BIC_UPLOAD_PATH,
-            token=api_key,
-        )
+        with time_upstream_request(archive.source, "harvest"):
+            bagit_result = bagit_create.main.process(
+                recid=archive.recid,
+                source=archive.source,
+                loglevel=2,
+                target=BIC_UPLOAD_PATH,
+                token=api_key,
+            )
     except Exception as e:
         return {"status": 1, "errormsg": str(e)}
 
@@ -648,6 +754,7 @@ def process(self, archive_id, step_id, input_data=None, api_key=None):
             if self.request.retries >= self.max_retries:
                 return {"status": 1, "errormsg": "Max retries exceeded."}
             else:
+                record_retry(self.name, archive.source)
                 raise self.retry(exc=Exception(error_msg), countdown=2 * 60)
         else:
             return {"status": 1, "errormsg": error_msg}
@@ -670,7 +777,7 @@ def process(self, archive_id, step_id, input_data=None, api_key=None):
 
 
 @shared_task(name="validate", bind=True, ignore_result=True, after_return=finalize)
-def validate(self, archive_id, step_id, input_data=None, api_key=None):
+def validate(self, archive_id, step_id, input_data=None, credentials=None):
     """
     Validate the a folder against the CERN SIP specification,
     using the OAIS utils package
@@ -708,7 +815,7 @@ def validate(self, archive_id, step_id, input_data=None, api_key=None):
 
 
 @shared_task(name="checksum", bind=True, ignore_result=True, after_return=finalize)
-def checksum(self, archive_id, step_id, input_data=None, api_key=None):
+def checksum(self, archive_id, step_id, input_data=None, credentials=None):
     archive = Archive.objects.get(pk=archive_id)
     path_to_sip = archive.path_to_sip
 
@@ -750,7 +857,7 @@ def checksum(self, archive_id, step_id, input_data=None, api_key=None):
     ignore_result=True,
     max_retries=10,
 )
-def archivematica(self, archive_id, step_id, input_data=None, api_key=None):
+def archivematica(self, archive_id, step_id, input_data=None, credentials=None):
     """
     Submit the SIP of the passed Archive to Archivematica
     preparing the call to the Archivematica API
@@ -776,6 +883,7 @@ def archivematica(self, archive_id, step_id, input_data=None, api_key=None):
                     "message": f"Archivematics is busy, retrying in {10 * (self.request.retries + 1)} minutes."
                 }
             )
+            record_retry(self.name, current_step.archive.source)
             raise self.retry(
                 countdown=60 * 10 * (self.request.retries + 1),
                 exc=Exception("Archivematica concurrency limit reached."),
@@ -843,7 +951,7 @@ def archivematica(self, archive_id, step_id, input_data=None, api_key=None):
                 interval=schedule,
                 name=f"Archivematica status for step: {current_step.id}",
                 task="check_am_status",
-                args=json.dumps([package, current_step.id, archive_id.id, api_key]),
+                args=json.dumps([package, current_step.id, archive_id.id, credentials]),
                 expire_seconds=55.0,
             )
     except requests.HTTPError as e:
@@ -894,7 +1002,7 @@ def archivematica(self, archive_id, step_id, input_data=None, api_key=None):
     bind=True,
     ignore_result=True,
 )
-def check_am_status(self, message, step_id, archive_id, api_key=None):
+def check_am_status(self, message, step_id, archive_id, credentials=None):
     """
     Check the status of an Archivematica job by polling its API.
     The related Step is updated with the information returned from Archivematica
@@ -979,7 +1087,7 @@ def check_am_status(self, message, step_id, archive_id, api_key=None):
     if status == "COMPLETE" and microservice == "Remove the processing directory":
         try:
             _handle_completed_am_package(
-                self, task_name, am, step, am_status, archive_id, api_key
+                self, task_name, am, step, am_status, archive_id, credentials
             )
         except Exception as e:
             logger.warning(
@@ -1015,7 +1123,7 @@ def _get_am_client():
 
 
 def _handle_completed_am_package(
-    self, task_name, am, step, am_status, archive_id, api_key
+    self, task_name, am, step, am_status, archive_id, credentials
 ):
     """
     Archivematica returns the uuid of the package, with this the storage service can be queried to get the AIP location.
@@ -1042,7 +1150,7 @@ def _handle_completed_am_package(
             status=states.SUCCESS,
             retval={"status": 0},
             task_id=None,
-            args=[archive_id, step.id, None, api_key],
+            args=[archive_id, step.id, None, credentials],
             kwargs=None,
             einfo=None,
         )
@@ -1243,7 +1351,7 @@ def announce_sip(announce_path, user, return_archive=False):
 
 
 @shared_task(name="announce", bind=True, ignore_result=True, after_return=finalize)
-def copy_sip(self, archive_id, step_id, input_data, api_key=None):
+def copy_sip(self, archive_id, step_id, input_data, credentials=None):
     """
     Given a path, copy it into the platform SIP storage
     If successful, save the final path in the passed Archive
@@ -1304,40 +1412,58 @@ def batch_announce_task(self, announce_path, tag_id, user_id):
     # Run the "announce" procedure for every subfolder(validate, create an Archive, copy)
     user = User.objects.get(pk=user_id)
     tag = Collection.objects.get(pk=tag_id)
+    tag.set_description("Batch Announce processing...")
+    archives = []
+    results = []
 
     for f in os.scandir(announce_path):
         try:
             if f.is_dir() and f.path != announce_path:
                 announce_response = announce_sip(f.path, user, True)
                 if announce_response["status"] == 0:
-                    tag.add_archive(announce_response["archive"])
+                    archives.append(announce_response["archive"])
+                    results.append(
+                        BatchItemResult.succeeded(
+                            tag, f.path, announce_response["archive"]
+                        )
+                    )
                 else:
-                    _add_error_to_tag_description(
-                        tag, f.path, announce_response["errormsg"]
+                    results.append(
+                        BatchItemResult.failed(
+                            tag, f.path, announce_response["errormsg"]
+                        )
                     )
         except Exception as e:
-            _add_error_to_tag_description(tag, f.path, f"Exception {str(e)}")
+            results.append(
+                BatchItemResult.failed(tag, f.path, str(e), type(e).__name__)
+            )
+        if len(results) >= BATCH_FLUSH_SIZE:
+            _flush_batch(tag, archives, results)
+            archives, results = [], []
 
-    tag.set_description(tag.description.replace("Batch Announce processing...", ""))
-    if len(tag.description) == 0:
+    _flush_batch(tag, archives, results)
+    failed = BatchItemResult.objects.filter(
+        collection=tag, status=BatchItemStatus.FAILED
+    ).count()
+    if failed:
+        errors = "error" if failed == 1 else "errors"
+        tag.set_description(f"Batch Announce completed with {failed} {errors}")
+    else:
         tag.set_description("Batch Announce completed successfully")
 
 
-def _add_error_to_tag_description(tag, path, errormsg):
-    start_ind = tag.description.find(errormsg)
-    if start_ind != -1:
-        end_ind = start_ind + len(errormsg) + 1
-        tag.set_description(
-            tag.description[:end_ind] + path + "," + tag.description[end_ind:]
-        )
-    else:
-        if tag.description.find("ERRORS:") == -1:
-            tag.set_description(tag.description + " ERRORS:")
-        tag.set_description(tag.description + f" {errormsg}:{path}.")
+def _flush_batch(tag, archives, results):
+    """
+    Adds the Archives created by a batch to its Tag and records the results
+    of its items, done in chunks so that they are kept if the batch is
+    interrupted
+    """
+    BatchItemResult.objects.bulk_create(results)
+    tag.add_archives(archives)
 
 
 @shared_task(name="extract_title", bind=True, ignore_result=True, after_return=finalize)
-def extract_title(self, archive_id, step_id, input_data=None, api_key=None):
+def extract_title(self, archive_id, step_id, input_data=None, credentials=None):
     # For archives without title try to extract it from the metadata
     archive = Archive.objects.get(pk=archive_id)
     step = Step.objects.get(pk=step_id)
@@ -1376,7 +1502,7 @@ def extract_title(self, archive_id, step_id, input_data=None, api_key=None):
     after_return=finalize,
     max_retries=5,
 )
-def notify_source(self, archive_id, step_id, input_data=None, api_key=None):
+def notify_source(self, archive_id, step_id, input_data=None, credentials=None):
     archive = Archive.objects.get(pk=archive_id)
     step = Step.objects.get(pk=step_id)
     step.set_status(Status.IN_PROGRESS)
@@ -1408,13 +1534,14 @@ def notify_source(self, archive_id, step_id, input_data=None, api_key=None):
 
     try:
         get_source(archive.source).notify_source(
-            archive, source.notification_endpoint, api_key
+            archive, source.notification_endpoint, ApiKey.resolve(credentials)
         )
         return {
             "status": 0,
             "errormsg": None,
         }
     except RetryableException as e:
+        record_retry(self.name, archive.source)
         self.retry(exc=e, countdown=60)
     except Exception as e:
         return {
@@ -1439,10 +1566,8 @@ def periodic_harvest(self, source_name, username, pipeline):
         logger.error(f"User with name {username} does not exist.")
         return
 
-    api_key = None
-    try:
-        api_key = ApiKey.objects.get(source=source, user=user).key
-    except ApiKey.DoesNotExist:
+    api_key = ApiKey.get_user_key(user.id, source.name)
+    if api_key is None:
         logger.warning(
             f"User with name {username} does not have API key set for the given source, only public records will be available."
         )
@@ -1507,7 +1632,14 @@ def periodic_harvest(self, source_name, username, pipeline):
             name=f"{new_harvest.title}, batch {i + 1} to {batch_upper_limit}",
             task="batch_harvest",
             args=json.dumps(
-                [batch, user.id, source_name, pipeline, new_harvest.id, api_key]
+                [
+                    batch,
+                    user.id,
+                    source_name,
+                    pipeline,
+                    new_harvest.id,
+                    ApiKey.get_reference(user.id, source_name),
+                ]
             ),
             start_time=timezone.now()
             + timedelta(minutes=iteration * AUTOMATIC_HARVEST_BATCH_DELAY),
@@ -1523,9 +1655,17 @@ def periodic_harvest(self, source_name, username, pipeline):
 
 @shared_task(name="batch_harvest", bind=True, ignore_result=True)
 def batch_harvest(
-    self, records_to_harvest, user_id, source_name, pipeline, collection_id, api_key
+    self,
+    records_to_harvest,
+    user_id,
+    source_name,
+    pipeline,
+    collection_id,
+    credentials=None,
 ):
     harvest_tag = Collection.objects.get(id=collection_id)
+    archive_ids = []
+    results = []
     for record in records_to_harvest:
         try:
             archive = Archive.objects.create(
@@ -1536,7 +1676,7 @@ def batch_harvest(
                 requester_id=user_id,
                 approver_id=user_id,
             )
-            harvest_tag.add_archive(archive.id)
+            archive_ids.append(archive.id)
 
             if (
                 "file_size" in record
@@ -1548,9 +1688,10 @@ def batch_harvest(
                 )
                 failed_harvest = Step.objects.create(
                     name=Steps.HARVEST,
-                    status=Status.FAILED,
+                    status=Status.NOT_RUN,
                     archive=archive,
                 )
+                failed_harvest.set_status(Status.FAILED)
                 failed_harvest.set_output_data(
                     {
                         "status": 1,
@@ -1558,13 +1699,33 @@ def batch_harvest(
                     }
                 )
                 archive.set_last_step(failed_harvest)
+                results.append(
+                    BatchItemResult.failed(
+                        harvest_tag,
+                        record["recid"],
+                        "Record is too large to be harvested.",
+                        archive=archive,
+                    )
+                )
             else:
                 for step in pipeline:
                     archive.add_step_to_pipeline(step)
 
-                execute_pipeline(archive.id, api_key)
+                execute_pipeline(archive.id, credentials)
+                results.append(
+                    BatchItemResult.succeeded(harvest_tag, record["recid"], archive)
+                )
         except Exception as e:
             logger.error(
                 f"Error while processing {record['recid']} from {source_name}: {str(e)}"
             )
+            results.append(
+                BatchItemResult.failed(
+                    harvest_tag, record["recid"], str(e), type(e).__name__
+                )
+            )
+        if len(results) >= BATCH_FLUSH_SIZE:
+            _flush_batch(harvest_tag, archive_ids, results)
+            archive_ids, results = [], []
+    _flush_batch(harvest_tag, archive_ids, results)
     logger.info(f"A batch of automatic harvests has been started for {source_name}.")
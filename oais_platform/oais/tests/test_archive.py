@@ -2,12 +2,22 @@ from unittest.mock import patch
 
 from django.contrib.auth.models import Permission, User
 from django.db import IntegrityError
+from django.test import override_settings
 from django.urls import reverse
 from parameterized import parameterized
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from oais_platform.oais.models import Archive, ArchiveState, Collection, Resource, Step
+from oais_platform.oais.models import (
+    Archive,
+    ArchiveState,
+    Collection,
+    Resource,
+    Status,
+    Step,
+    Steps,
+)
+from oais_platform.oais.tasks import process, unstage_archives_task
 
 
 class ArchiveTests(APITestCase):
@@ -257,6 +267,54 @@ class ArchiveTests(APITestCase):
         self.assertEqual(response.data[0]["archives"][0]["recid"], "1")
         self.assertEqual(response.data[0]["archives"][0]["source"], "test")
 
+    def test_record_check_batch(self):
+        self.client.force_authenticate(user=self.other_user)
+        for archive in [self.private_archive] + self.public_archives:
+            Step.objects.create(archive=archive, name=5, status=4)
+        records = [
+            {"recid": "1", "source": "test"},
+            {"recid": "7234", "source": "source_1"},
+            {"recid": "3445", "source": "source_1"},
+        ]
+
+        url = reverse("archives-duplicates")
+        # Two permission lookups and a single query for all the records
+        with self.assertNumQueries(3):
+            response = self.client.post(url, {"records": records}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [[a["id"] for a in r["archives"]] for r in response.data],
+            [[self.public_archives[0].id], [self.public_archives[1].id], []],
+        )
+        self.assertNotIn("resource", response.data[0]["archives"][0])
+
+    def test_record_check_full(self):
+        self.client.force_authenticate(user=self.requester)
+        Step.objects.create(archive=self.private_archive, name=5, status=4)
+
+        url = reverse("archives-duplicates")
+        response = self.client.post(
+            f"{url}?detail=full",
+            {"records": [{"recid": "1", "source": "test"}]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data[0]["archives"]), 1)
+        self.assertEqual(
+            response.data[0]["archives"][0]["resource"]["id"],
+            self.private_archive.resource.id,
+        )
+
+    def test_record_check_invalid(self):
+        self.client.force_authenticate(user=self.requester)
+
+        url = reverse("archives-duplicates")
+        response = self.client.post(url, {"records": [{"recid": "1"}]}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_resource_created(self):
         self.assertEqual(Resource.objects.all().count(), 3)
         # This recid already exists. Therefore, the number of objects should not increase
@@ -339,7 +397,10 @@ class ArchiveTests(APITestCase):
         self.assertEqual(response.data["approver"]["id"], self.requester.id)
         self.private_archive.refresh_from_db()
         process_delay.assert_called_once_with(
-            self.private_archive.id, self.private_archive.last_step.id, None, None
+            self.private_archive.id,
+            self.private_archive.last_step.id,
+            None,
+            {"user": self.requester.id, "source": self.private_archive.source},
         )
 
     @patch("oais_platform.oais.tasks.process.delay")
@@ -352,7 +413,10 @@ class ArchiveTests(APITestCase):
         self.assertEqual(response.data["approver"]["id"], self.superuser.id)
         self.private_archive.refresh_from_db()
         process_delay.assert_called_once_with(
-            self.private_archive.id, self.private_archive.last_step.id, None, None
+            self.private_archive.id,
+            self.private_archive.last_step.id,
+            None,
+            {"user": self.superuser.id, "source": self.private_archive.source},
         )
 
     def test_archive_mlt_unstage_forbidden(self):
@@ -364,8 +428,8 @@ class ArchiveTests(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
-    @patch("oais_platform.oais.tasks.process.delay")
-    def test_archive_mlt_unstage_with_perms(self, process_delay):
+    @patch("oais_platform.oais.tasks.group")
+    def test_archive_mlt_unstage_with_perms(self, group):
         self.requester.user_permissions.add(self.approve_permission)
         self.requester.save()
         self.client.force_authenticate(user=self.requester)
@@ -387,17 +451,33 @@ class ArchiveTests(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
-        response = self.client.post(
-            url, {"archives": [{"id": self.private_archive.id}]}, format="json"
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                url, {"archives": [{"id": self.private_archive.id}]}, format="json"
+            )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.private_archive.refresh_from_db()
-        process_delay.assert_called_once_with(
-            self.private_archive.id, self.private_archive.last_step.id, None, None
+        self.assertEqual(self.private_archive.staged, False)
+        self.assertEqual(self.private_archive.approver, self.requester)
+        self.assertEqual(self.private_archive.last_step.name, Steps.HARVEST)
+        self.assertIn(
+            response.data["id"],
+            self.private_archive.get_collections().values_list("id", flat=True),
+        )
+        group.assert_called_once_with(
+            [
+                process.s(
+                    self.private_archive.id,
+                    self.private_archive.last_step.id,
+                    None,
+                    {"user": self.requester.id, "source": self.private_archive.source},
+                )
+            ]
         )
+        group.return_value.apply_async.assert_called_once()
 
-    @patch("oais_platform.oais.tasks.process.delay")
-    def test_archive_mlt_unstage_superuser(self, process_delay):
+    @patch("oais_platform.oais.tasks.group")
+    def test_archive_mlt_unstage_superuser(self, group):
         self.client.force_authenticate(user=self.superuser)
 
         other_archive = Archive.objects.create(
@@ -409,14 +489,60 @@ class ArchiveTests(APITestCase):
             staged=True,
         )
 
+        url = reverse("archives-mlt-unstage")
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(11):
+                response = self.client.post(
+                    url,
+                    {
+                        "archives": [
+                            {"id": self.private_archive.id},
+                            {"id": other_archive.id},
+                        ]
+                    },
+                    format="json",
+                )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(group.call_args.args[0]), 2)
+        group.return_value.apply_async.assert_called_once()
+
+    @override_settings(UNSTAGE_SYNC_LIMIT=1)
+    @patch("oais_platform.oais.tasks.unstage_archives_task.delay")
+    def test_archive_mlt_unstage_background(self, unstage_delay):
+        self.client.force_authenticate(user=self.superuser)
+
+        archive_ids = [archive.id for archive in self.public_archives]
         url = reverse("archives-mlt-unstage")
         response = self.client.post(
-            url,
-            {"archives": [{"id": self.private_archive.id}, {"id": other_archive.id}]},
+            url, {"archives": [{"id": id} for id in archive_ids]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        unstage_delay.assert_called_once_with(
+            archive_ids, self.superuser.id, response.data["id"]
+        )
+
+    @override_settings(UNSTAGE_SYNC_LIMIT=1)
+    @patch("oais_platform.oais.tasks.group")
+    @patch("oais_platform.oais.tasks.unstage_archives_task.delay")
+    def test_archive_mlt_unstage_background_tag(self, unstage_delay, group):
+        self.client.force_authenticate(user=self.superuser)
+
+        archive_ids = [archive.id for archive in self.public_archives]
+        response = self.client.post(
+            reverse("archives-mlt-unstage"),
+            {"archives": [{"id": id} for id in archive_ids]},
             format="json",
         )
+        url = reverse("tags-detail", args=[response.data["id"]])
+        response = self.client.get(url)
+        self.assertEqual(response.data["archives_count"], 0)
+
+        unstage_archives_task(*unstage_delay.call_args.args)
+
+        # The job Tag is modified, polling it shows the unstaged Archives
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(process_delay.mock_calls), 2)
+        self.assertEqual(response.data["archives_count"], len(archive_ids))
 
     def test_archive_delete_staged_other_user(self):
         self.client.force_authenticate(user=self.other_user)
@@ -540,3 +666,54 @@ class ArchiveTests(APITestCase):
         self.assertEqual(response.data["state_intersection"], True)
         self.assertEqual(response.data["all_last_step_failed"], False)
         self.assertEqual(response.data["can_continue"], False)
+
+    def test_archive_actions_missing(self):
+        self.client.force_authenticate(user=self.superuser)
+
+        url = reverse("archives-actions")
+        response = self.client.post(
+            url,
+            {"archives": [{"id": self.private_archive.id}, {"id": 999999}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data["detail"], "Archives not found: 999999")
+
+        response = self.client.post(url, {"archives": [{"id": "first"}]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_archive_actions_next_steps(self):
+        self.client.force_authenticate(user=self.superuser)
+
+        aip_archive = self.public_archives[1]
+        for archive, step_names in {
+            self.private_archive: [Steps.CHECKSUM],
+            aip_archive: [Steps.CHECKSUM, Steps.ARCHIVE],
+        }.items():
+            for step_name in step_names:
+                step = Step.objects.create(
+                    archive=archive, name=step_name, status=Status.COMPLETED
+                )
+                archive.set_last_step(step.id)
+        self.private_archive.add_step_to_pipeline(Steps.ARCHIVE)
+
+        url = reverse("archives-actions")
+        archives = [{"id": self.private_archive.id}, {"id": aip_archive.id}]
+        with self.assertNumQueries(1):
+            response = self.client.post(url, {"archives": archives}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["state_intersection"], False)
+        self.assertEqual(
+            response.data["next_steps_intersection"],
+            [Steps.ARCHIVE, Steps.INVENIO_RDM_PUSH, Steps.PUSH_TO_CTA],
+        )
+        for archive in (self.private_archive, aip_archive):
+            archive.refresh_from_db()
+            self.assertEqual(
+                sorted(archive.get_next_steps()),
+                sorted(
+                    Archive.get_next_steps_in_bulk([archive.id])[archive.id][
+                        "next_steps"
+                    ]
+                ),
+            )
@@ -11,7 +11,12 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from oais_platform.oais.models import Archive, Collection
+from oais_platform.oais.models import (
+    Archive,
+    BatchItemResult,
+    BatchItemStatus,
+    Collection,
+)
 from oais_platform.oais.tasks import batch_announce_task
 
 
@@ -22,7 +27,7 @@ class BatchAnnounceTests(APITestCase):
 
         self.tag = Collection.objects.create(
             title="celery_test",
-            description="Batch Announce processing...",
+            description="",
             creator=self.user,
             internal=False,
         )
@@ -246,10 +251,10 @@ class BatchAnnounceTests(APITestCase):
         self.tag.refresh_from_db()
         self.assertEqual(Archive.objects.count(), 1)
         self.assertEqual(Collection.objects.count(), 1)
-        self.assertEqual(
-            self.tag.description,
-            " ERRORS: The given path is not a valid SIP:" + path_to_sip + ".",
-        )
+        self.assertEqual(self.tag.description, "Batch Announce completed with 1 error")
+        result = BatchItemResult.objects.get(status=BatchItemStatus.FAILED)
+        self.assertEqual(result.item, path_to_sip)
+        self.assertEqual(result.message, "The given path is not a valid SIP")
         self.assertEqual(len(copy_delay.mock_calls), 1)
 
     @patch("oais_platform.oais.tasks.copy_sip.delay")
@@ -292,15 +297,94 @@ class BatchAnnounceTests(APITestCase):
             batch_announce_task(batch_announce_folder, self.tag.id, self.user.id)
 
         self.tag.refresh_from_db()
-        self.assertIn("ERRORS:", self.tag.description)
-        self.assertIn(
-            "The given path is not a valid SIP:" + path_to_sip,
-            self.tag.description,
-        )
-        self.assertIn(
-            "Error while reading sip.json:" + path_to_sip2,
-            self.tag.description,
+        self.assertEqual(self.tag.description, "Batch Announce completed with 2 errors")
+        errors = dict(
+            BatchItemResult.objects.filter(collection=self.tag).values_list(
+                "item", "message"
+            )
         )
+        self.assertEqual(errors[path_to_sip], "The given path is not a valid SIP")
+        self.assertIn("Error while reading sip.json", errors[path_to_sip2])
         self.assertEqual(Archive.objects.count(), 0)
         self.assertEqual(Collection.objects.count(), 1)
         self.assertEqual(len(copy_delay.mock_calls), 0)
+
+    @patch("oais_platform.oais.tasks.announce_sip")
+    def test_batch_announce_task_results(self, announce_sip):
+        archive = Archive.objects.create(recid="1", source="test", requester=self.user)
+        errors = {
+            "invalid_1": {"status": 1, "errormsg": "The given path is not a valid SIP"},
+            "invalid_2": {"status": 1, "errormsg": "The given path is not a valid SIP"},
+            "broken": ValueError("Broken"),
+            "valid": {"status": 0, "archive": archive},
+        }
+
+        def announce(path, user, return_archive):
+            result = errors[os.path.basename(path)]
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        announce_sip.side_effect = announce
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in errors:
+                os.mkdir(os.path.join(tmpdir, name))
+            batch_announce_task(tmpdir, self.tag.id, self.user.id)
+
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.description, "Batch Announce completed with 3 errors")
+        self.assertEqual(list(self.tag.archives.all()), [archive])
+
+        response = self.client.get(reverse("tags-errors", args=[self.tag.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [
+                (error["error_class"], error["message"], error["count"])
+                for error in response.data["results"]
+            ],
+            [
+                (None, "The given path is not a valid SIP", 2),
+                ("ValueError", "Broken", 1),
+            ],
+        )
+
+        response = self.client.get(
+            reverse("tags-results", args=[self.tag.id]), {"status": "succeeded"}
+        )
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(response.data["results"][0]["archive"], archive.id)
+
+        response = self.client.get(
+            reverse("tags-results", args=[self.tag.id]), {"status": "unknown"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch("oais_platform.oais.tasks.BATCH_FLUSH_SIZE", 2)
+    @patch("oais_platform.oais.tasks.announce_sip")
+    def test_batch_announce_task_interrupted(self, announce_sip):
+        archives = [
+            Archive.objects.create(recid=str(i), source="test", requester=self.user)
+            for i in range(3)
+        ]
+        responses = iter(archives)
+
+        def announce(path, user, return_archive):
+            try:
+                return {"status": 0, "archive": next(responses)}
+            except StopIteration:
+                # The worker is stopped in the middle of the batch
+                raise KeyboardInterrupt
+
+        announce_sip.side_effect = announce
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(5):
+                os.mkdir(os.path.join(tmpdir, str(i)))
+            with self.assertRaises(KeyboardInterrupt):
+                batch_announce_task(tmpdir, self.tag.id, self.user.id)
+
+        self.assertEqual(self.tag.archives.count(), 2)
+        self.assertEqual(self.tag.batch_results.count(), 2)
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.description, "Batch Announce processing...")
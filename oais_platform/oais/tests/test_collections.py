@@ -1,4 +1,6 @@
 from django.contrib.auth.models import Permission, User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -294,6 +296,93 @@ class CollectionTests(APITestCase):
         self.assertEqual(results2.data["count"], 1)
         self.assertEqual(data[0]["archives_count"], 0)
 
+    def test_add_remove_archives(self):
+        archives = Archive.objects.bulk_create(
+            [
+                Archive(recid=str(i), source="test", requester=self.requester)
+                for i in range(100)
+            ]
+        )
+        modification_date = self.collection.last_modification_date
+
+        # One insert and one timestamp update, however many Archives
+        with self.assertNumQueries(2):
+            self.collection.add_archives(archives[:50] + [self.archive1])
+        with self.assertNumQueries(2):
+            self.collection.add_archives(
+                [archive.id for archive in archives] + [{"id": self.archive1.id}]
+            )
+        self.assertEqual(self.collection.archives.count(), 101)
+        self.assertGreater(self.collection.last_modification_date, modification_date)
+
+        with self.assertNumQueries(2):
+            self.collection.remove_archives(archives)
+        self.assertEqual(list(self.collection.archives.all()), [self.archive1])
+
+    def test_archive_add_bulk(self):
+        archives = Archive.objects.bulk_create(
+            [
+                Archive(recid=str(i), source="test", requester=self.requester)
+                for i in range(100)
+            ]
+        )
+        self.client.force_authenticate(user=self.superuser)
+        url = reverse("tags-add-arch", args=[self.job.id])
+
+        with CaptureQueriesContext(connection) as single:
+            self.client.post(url, {"archives": [archives[0].id]}, format="json")
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.post(
+                url, {"archives": [archive.id for archive in archives]}, format="json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(many), len(single))
+        self.assertEqual(self.job.archives.count(), 100)
+
+    def test_collection_list_queries(self):
+        self.client.force_authenticate(user=self.superuser)
+        url = reverse("tags-list")
+
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+
+        archives = Archive.objects.bulk_create(
+            [
+                Archive(recid=str(i), source="test", requester=self.requester)
+                for i in range(5)
+            ]
+        )
+        for i in range(20):
+            tag = Collection.objects.create(title=str(i), creator=self.superuser)
+            tag.add_archives(archives[: i % 6])
+
+        # Archives and creators are read in the listing query, not once per Tag
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url, {"internal": "false"})
+        self.assertEqual(len(many), len(few))
+
+        counts = {
+            tag["title"]: tag["archives_count"] for tag in response.data["results"]
+        }
+        self.assertEqual(counts["12"], 0)
+        self.assertEqual(counts["13"], 1)
+        self.assertEqual(counts["16"], 4)
+
+    def test_archive_tags_count(self):
+        # The Archive filter does not restrict the Archives counted
+        other = Archive.objects.create(
+            recid="2", source="test", requester=self.requester
+        )
+        self.collection.add_archives([other])
+        self.client.force_authenticate(user=self.superuser)
+
+        response = self.client.get(reverse("archives-tags", args=[self.archive1.id]))
+        self.assertEqual(response.data["results"][0]["archives_count"], 2)
+
+        response = self.client.get(reverse("users-me-tags"))
+        self.assertEqual(response.data[0]["archives_count"], 2)
+
     def test_check_duplicate_create(self):
         """
         Creates one tag and then creates another one with the same name.
@@ -0,0 +1,146 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from guardian.shortcuts import assign_perm, remove_perm
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from oais_platform.oais.models import Archive, Collection, Status, Step, Steps
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("user", password="pw")
+        self.client.force_authenticate(user=self.user)
+
+        self.archive = Archive.objects.create(
+            recid="1", source="test", requester=self.user
+        )
+        self.tag = Collection.objects.create(title="Tag", creator=self.user)
+
+    def assertRevalidated(self, url, modify):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        # Unchanged, answered from a single aggregate query
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+        modify()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_archive_detail(self):
+        self.assertRevalidated(
+            reverse("archives-detail", args=[self.archive.id]),
+            lambda: self.archive.set_title("New title"),
+        )
+
+    def test_archive_list(self):
+        self.assertRevalidated(
+            reverse("archives-list"),
+            lambda: Archive.objects.create(
+                recid="2", source="test", requester=self.user
+            ),
+        )
+
+    def test_archive_steps(self):
+        self.assertRevalidated(
+            reverse("archives-steps", args=[self.archive.id]),
+            lambda: Step.objects.create(
+                archive=self.archive, name=Steps.HARVEST, status=Status.NOT_RUN
+            ),
+        )
+
+    def test_tag_detail(self):
+        self.assertRevalidated(
+            reverse("tags-detail", args=[self.tag.id]),
+            lambda: self.tag.add_archive(self.archive),
+        )
+
+    def test_tag_list(self):
+        self.assertRevalidated(
+            reverse("tags-list"),
+            lambda: self.tag.set_modification_timestamp(),
+        )
+
+    def test_query_parameters(self):
+        url = reverse("archives-list")
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, {"fields": "id"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_archive_list_visibility(self):
+        other = User.objects.create_user("other", password="pw")
+        self.client.force_authenticate(user=other)
+        hidden, shown = [
+            Archive.objects.create(
+                recid=recid, source="test", requester=self.user, restricted=True
+            )
+            for recid in ["3", "4"]
+        ]
+        assign_perm("oais.view_archive", other, hidden)
+        # Latest modification of the list, left unchanged below
+        Archive.objects.create(recid="5", source="test", requester=other)
+
+        def swap_visibility():
+            remove_perm("oais.view_archive", other, hidden)
+            assign_perm("oais.view_archive", other, shown)
+
+        self.assertRevalidated(reverse("archives-list"), swap_visibility)
+
+    def test_if_modified_since(self):
+        url = reverse("archives-detail", args=[self.archive.id])
+        last_modified = self.client.get(url)["Last-Modified"]
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_not_visible(self):
+        other = User.objects.create_user("other", password="pw")
+        self.client.force_authenticate(user=other)
+        restricted = Archive.objects.create(
+            recid="3", source="test", requester=self.user, restricted=True
+        )
+
+        response = self.client.get(
+            reverse("archives-detail", args=[restricted.id]), HTTP_IF_NONE_MATCH="*"
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tag_not_allowed(self):
+        other = User.objects.create_user("other", password="pw")
+        self.client.force_authenticate(user=other)
+        restricted = Archive.objects.create(
+            recid="3", source="test", requester=self.user, restricted=True
+        )
+        # Visible in the Tags of the user, but holding an Archive they cannot view
+        tag = Collection.objects.create(title="Other tag", creator=other)
+        tag.add_archive(restricted)
+
+        response = self.client.get(
+            reverse("tags-detail", args=[tag.id]), HTTP_IF_NONE_MATCH="*"
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+
+    def test_archive_list_page_all(self):
+        url = reverse("archives-list")
+        etag = self.client.get(url, {"page": "all"})["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"page": "all"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # The page size and the validators are aggregated, no row is fetched
+        self.assertEqual(len(queries), 2)
+        for query in queries:
+            self.assertIn("COUNT(", query["sql"])
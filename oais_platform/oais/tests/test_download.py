@@ -0,0 +1,198 @@
+import io
+import json
+import os
+import tempfile
+import zipfile
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from parameterized import parameterized
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from oais_platform.oais.models import Archive, Status, Step, Steps
+from oais_platform.oais.streaming import ZipStream
+
+
+class DownloadArtifactTests(APITestCase):
+    def setUp(self):
+        self.superuser = User.objects.create_superuser("superuser", password="pw")
+        self.client.force_authenticate(user=self.superuser)
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.sip_path = os.path.join(self.tmp_dir.name, "sip")
+        self.files = {
+            "data/meta/sip.json": b'{"audit": []}',
+            "data/content/file.txt": b"content " * 1000,
+            "data/content/café.txt": b"",
+        }
+        for name, content in self.files.items():
+            path = os.path.join(self.sip_path, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+        os.makedirs(os.path.join(self.sip_path, "data", "empty"))
+
+        archive = Archive.objects.create(recid="1", source="test")
+        self.step = Step.objects.create(
+            archive=archive,
+            name=Steps.HARVEST,
+            status=Status.COMPLETED,
+            output_data=json.dumps(
+                {
+                    "artifact": {
+                        "artifact_name": "SIP",
+                        "artifact_localpath": self.sip_path,
+                    }
+                }
+            ),
+        )
+        self.url = reverse("steps-download-artifact", args=[self.step.id])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def assertZipContent(self, content):
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            for name, data in self.files.items():
+                self.assertEqual(archive.read(name), data)
+            self.assertIn("data/empty/", archive.namelist())
+
+    def test_download_sip_stored(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        content = b"".join(response.streaming_content)
+        self.assertEqual(int(response["Content-Length"]), len(content))
+        self.assertZipContent(content)
+        # Nothing is written next to the SIP
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["sip"])
+
+    def test_download_sip_deflated(self):
+        response = self.client.get(self.url, {"compression": "deflated"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header("Content-Length"))
+        content = b"".join(response.streaming_content)
+        self.assertLess(len(content), len(self.files["data/content/file.txt"]))
+        self.assertZipContent(content)
+
+    def test_download_sip_invalid_compression(self):
+        response = self.client.get(self.url, {"compression": "bzip2"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch("zipfile.ZIP64_LIMIT", 4000)
+    def test_zip_stream_size_zip64(self):
+        # Lowering the limit makes zipfile use the ZIP64 records for this SIP
+        stream = ZipStream(self.sip_path)
+        content = b"".join(stream)
+
+        self.assertEqual(stream.size(), len(content))
+        self.assertZipContent(content)
+
+
+class DownloadAIPTests(APITestCase):
+    def setUp(self):
+        self.superuser = User.objects.create_superuser("superuser", password="pw")
+        self.client.force_authenticate(user=self.superuser)
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.aip_path = os.path.join(self.tmp_dir.name, "aip", "package.7z")
+        os.makedirs(os.path.dirname(self.aip_path))
+        self.content = bytes(range(256)) * 40
+        with open(self.aip_path, "wb") as f:
+            f.write(self.content)
+
+        archive = Archive.objects.create(recid="1", source="test")
+        step = Step.objects.create(
+            archive=archive,
+            name=Steps.ARCHIVE,
+            status=Status.COMPLETED,
+            output_data=json.dumps(
+                {
+                    "artifact": {
+                        "artifact_name": "AIP",
+                        "artifact_localpath": self.aip_path,
+                        "artifact_path": self.aip_path,
+                    }
+                }
+            ),
+        )
+        self.url = reverse("steps-download-artifact", args=[step.id])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_download_aip_x_accel(self):
+        with override_settings(X_ACCEL_ROOT=self.tmp_dir.name):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-files/aip/package.7z"
+        )
+        self.assertEqual(response["Content-Type"], "application/x-7z-compressed")
+        self.assertIn("attachment", response["Content-Disposition"])
+        self.assertEqual(response.content, b"")
+
+    def test_download_aip_x_accel_outside_root(self):
+        with override_settings(X_ACCEL_ROOT=os.path.join(self.tmp_dir.name, "sip")):
+            response = self.client.get(self.url)
+
+        self.assertFalse(response.has_header("X-Accel-Redirect"))
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+
+    @override_settings(X_ACCEL_ROOT=None)
+    def test_download_aip_full(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(int(response["Content-Length"]), len(self.content))
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+
+    @parameterized.expand(
+        [
+            ("bytes=100-199", 100, 199),
+            ("bytes=10000-", 10000, 10239),
+            ("bytes=-40", 10200, 10239),
+            ("bytes=10000-99999", 10000, 10239),
+        ]
+    )
+    @override_settings(X_ACCEL_ROOT=None)
+    def test_download_aip_range(self, header, start, end):
+        response = self.client.get(self.url, HTTP_RANGE=header)
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response["Content-Range"], f"bytes {start}-{end}/10240")
+        self.assertEqual(int(response["Content-Length"]), end - start + 1)
+        self.assertEqual(
+            b"".join(response.streaming_content), self.content[start : end + 1]
+        )
+
+    @override_settings(X_ACCEL_ROOT=None)
+    def test_download_aip_if_range(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+
+        # The file changed since, the whole file is sent again
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"outdated"'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+
+    @override_settings(X_ACCEL_ROOT=None)
+    def test_download_aip_range_not_satisfiable(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=20000-")
+
+        self.assertEqual(
+            response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        self.assertEqual(response["Content-Range"], "bytes */10240")
@@ -0,0 +1,135 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from oais_platform.oais import events
+from oais_platform.oais.exceptions import ServiceUnavailable
+from oais_platform.oais.models import Archive, Collection, Status, Step, Steps
+
+
+@override_settings(STEP_EVENTS_REDIS_URL="", STEP_EVENTS_STREAM_DURATION=5)
+class StepEventsTest(APITestCase):
+    def setUp(self):
+        self.url = reverse("step-events")
+        self.requester = User.objects.create_user("requester", password="pw")
+        self.other_user = User.objects.create_user("other", password="pw")
+
+        self.archive = Archive.objects.create(
+            recid="1", source="test", requester=self.requester, restricted=True
+        )
+        self.other_archive = Archive.objects.create(
+            recid="2", source="test", requester=self.other_user, restricted=False
+        )
+        self.step = Step.objects.create(archive=self.archive, name=Steps.HARVEST)
+        self.other_step = Step.objects.create(
+            archive=self.other_archive, name=Steps.HARVEST
+        )
+
+    def tearDown(self):
+        # Drop the in-memory channel along with its subscriptions
+        events._brokers.clear()
+        events.stream_slots = events.StreamSlots()
+
+    def open_stream(self, user, **filters):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.url, filters, HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = iter(response.streaming_content)
+        self.assertTrue(next(stream).startswith(b"retry:"))
+        return stream
+
+    def transition(self, step, new_status):
+        with self.captureOnCommitCallbacks(execute=True):
+            step.set_status(new_status)
+
+    def read_event(self, stream):
+        frame = next(stream).decode()
+        self.assertTrue(frame.startswith("event: step\ndata: "))
+        return json.loads(frame.split("data: ", 1)[1])
+
+    def test_step_events(self):
+        stream = self.open_stream(self.requester)
+
+        self.transition(self.step, Status.IN_PROGRESS)
+
+        event = self.read_event(stream)
+        self.assertEqual(event["step"], self.step.id)
+        self.assertEqual(event["archive"], self.archive.id)
+        self.assertEqual(event["status"], Status.IN_PROGRESS)
+
+    def test_step_events_filter_archive(self):
+        stream = self.open_stream(self.requester, archive=self.archive.id)
+
+        self.transition(self.other_step, Status.IN_PROGRESS)
+        self.transition(self.step, Status.COMPLETED)
+
+        event = self.read_event(stream)
+        self.assertEqual(event["step"], self.step.id)
+        self.assertEqual(event["status"], Status.COMPLETED)
+
+    def test_step_events_filter_collection(self):
+        collection = Collection.objects.create(creator=self.requester)
+        collection.add_archive(self.other_archive)
+        stream = self.open_stream(self.requester, collection=collection.id)
+
+        self.transition(self.step, Status.IN_PROGRESS)
+        self.transition(self.other_step, Status.IN_PROGRESS)
+
+        self.assertEqual(self.read_event(stream)["step"], self.other_step.id)
+
+    @override_settings(STEP_EVENTS_HEARTBEAT=0)
+    def test_step_events_collection_changed(self):
+        collection = Collection.objects.create(creator=self.requester)
+        stream = self.open_stream(self.requester, collection=collection.id)
+
+        self.transition(self.step, Status.IN_PROGRESS)
+        collection.add_archive(self.other_archive)
+        self.transition(self.other_step, Status.IN_PROGRESS)
+
+        self.assertEqual(self.read_event(stream)["step"], self.other_step.id)
+
+    @override_settings(STEP_EVENTS_MAX_STREAMS=1)
+    def test_step_events_max_streams(self):
+        self.open_stream(self.requester)
+
+        response = self.client.get(self.url, HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_step_events_stream_slots(self):
+        stream = events.StepEventStream(bool, heartbeat=1, duration=1, max_streams=1)
+        with self.assertRaises(ServiceUnavailable):
+            events.StepEventStream(bool, heartbeat=1, duration=1, max_streams=1)
+
+        # Closing a stream frees its slot, once
+        stream.close()
+        stream.close()
+        events.StepEventStream(bool, heartbeat=1, duration=1, max_streams=1).close()
+        self.assertEqual(events.stream_slots.count, 0)
+
+    def test_step_events_filter_requester(self):
+        stream = self.open_stream(self.requester, requester=self.other_user.id)
+
+        self.transition(self.step, Status.IN_PROGRESS)
+        self.transition(self.other_step, Status.IN_PROGRESS)
+
+        self.assertEqual(self.read_event(stream)["step"], self.other_step.id)
+
+    def test_step_events_restricted(self):
+        stream = self.open_stream(self.other_user)
+
+        self.transition(self.step, Status.IN_PROGRESS)
+        self.transition(self.other_step, Status.IN_PROGRESS)
+
+        self.assertEqual(self.read_event(stream)["step"], self.other_step.id)
+
+    def test_step_events_invalid_filter(self):
+        self.client.force_authenticate(user=self.requester)
+        response = self.client.get(
+            self.url, {"archive": "abc"}, HTTP_ACCEPT="text/event-stream"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,177 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+from django.apps import apps
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from oais_platform.oais.exceptions import DelegationError
+from oais_platform.oais.fts import FTS
+
+
+class FTSClientTests(APITestCase):
+    def setUp(self):
+        self.app_config = apps.get_app_config("oais")
+        self.app_config.fts = None
+
+    def tearDown(self):
+        self.app_config.fts = None
+
+    @patch("oais_platform.oais.fts.FTS")
+    def test_lazy_client(self, fts_class):
+        fts_class.assert_not_called()
+
+        self.assertIs(self.app_config.fts, fts_class.return_value)
+        self.assertIs(self.app_config.fts, fts_class.return_value)
+        fts_class.assert_called_once()
+
+    @patch("oais_platform.oais.fts.FTS")
+    def test_lazy_client_retry(self, fts_class):
+        fts_class.side_effect = [Exception("Certificate not found!"), MagicMock()]
+
+        with self.assertRaises(Exception):
+            self.app_config.fts
+        self.assertIsNotNone(self.app_config.fts)
+        self.assertEqual(fts_class.call_count, 2)
+
+    @patch("oais_platform.oais.fts.FTS")
+    def test_lazy_client_threads(self, fts_class):
+        barrier = threading.Barrier(8)
+        clients = []
+
+        def get_client():
+            barrier.wait()
+            clients.append(self.app_config.fts)
+
+        threads = [threading.Thread(target=get_client) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        fts_class.assert_called_once()
+        self.assertEqual(len(clients), 8)
+
+    def test_health(self):
+        self.app_config.fts = MagicMock(min_lifetime=timedelta(hours=1))
+        self.app_config.fts.get_proxy_lifetime.return_value = timedelta(hours=5)
+
+        response = self.client.get(reverse("health-fts"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], 0)
+        self.assertEqual(response.data["proxy_lifetime"], 5 * 3600)
+
+        self.app_config.fts.get_proxy_lifetime.return_value = None
+        response = self.client.get(reverse("health-fts"))
+        self.assertEqual(response.status_code, 503)
+        self.assertIsNone(response.data["proxy_lifetime"])
+
+    @patch("oais_platform.oais.fts.FTS")
+    def test_health_unavailable(self, fts_class):
+        fts_class.side_effect = Exception("Certificate not found!")
+
+        response = self.client.get(reverse("health-fts"))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data["status"], 1)
+
+
+def termination_time(hours):
+    expiry = datetime.now(timezone.utc) + timedelta(hours=hours)
+    return {"termination_time": expiry.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+@patch("oais_platform.oais.fts.Delegator")
+@patch("oais_platform.oais.fts.fts3")
+class FTSDelegationTests(APITestCase):
+    def make_client(self):
+        fts = FTS("https://fts.test:8446", "usercert.pem", "private.key")
+        fts.renewal_window = timedelta(hours=3)
+        fts.min_lifetime = timedelta(hours=1)
+        return fts
+
+    def test_delegate_outside_window(self, fts3, delegator):
+        delegator.return_value.get_info.return_value = termination_time(10)
+        fts = self.make_client()
+
+        self.assertFalse(fts.delegate())
+        self.assertFalse(fts.delegate())
+        fts3.delegate.assert_not_called()
+        # The expiry is read from FTS once
+        delegator.return_value.get_info.assert_called_once()
+
+    def test_delegate_inside_window(self, fts3, delegator):
+        delegator.return_value.get_info.side_effect = [
+            termination_time(2),
+            termination_time(2),
+            termination_time(12),
+        ]
+        fts = self.make_client()
+
+        self.assertTrue(fts.delegate())
+        fts3.delegate.assert_called_once_with(
+            fts.context, lifetime=fts.delegation_lifetime, force=True
+        )
+        self.assertGreater(fts.get_proxy_lifetime(), timedelta(hours=11))
+
+    def test_delegate_by_other_process(self, fts3, delegator):
+        delegator.return_value.get_info.side_effect = [
+            termination_time(2),
+            termination_time(12),
+        ]
+        fts = self.make_client()
+
+        self.assertFalse(fts.delegate())
+        fts3.delegate.assert_not_called()
+
+    def test_push_blocked(self, fts3, delegator):
+        delegator.return_value.get_info.return_value = None
+        fts3.delegate.side_effect = Exception("Delegation failed")
+        fts = self.make_client()
+
+        with self.assertRaises(DelegationError):
+            fts.push_to_cta("source", "dest")
+        fts3.submit.assert_not_called()
+
+    def test_push_renews(self, fts3, delegator):
+        delegator.return_value.get_info.side_effect = [
+            termination_time(0.5),
+            termination_time(0.5),
+            termination_time(12),
+        ]
+        fts3.submit.return_value = "job_id"
+        fts = self.make_client()
+
+        self.assertEqual(fts.push_to_cta("source", "dest"), "job_id")
+        fts3.delegate.assert_called_once()
+
+    def test_proxy_renewed_by_other_process(self, fts3, delegator):
+        # Expiry of the proxy on the FTS server, shared by the processes
+        server = {"hours": 0.5}
+        delegator.return_value.get_info.side_effect = lambda: termination_time(
+            server["hours"]
+        )
+
+        def delegate(context, lifetime, force):
+            server["hours"] = 12
+
+        fts3.delegate.side_effect = delegate
+        web, worker = self.make_client(), self.make_client()
+        self.assertLess(web.get_proxy_lifetime(), web.min_lifetime)
+
+        self.assertTrue(worker.delegate())
+        self.assertGreater(web.get_proxy_lifetime(), timedelta(hours=11))
+
+    def test_proxy_expiry_ttl(self, fts3, delegator):
+        server = {"hours": 5}
+        delegator.return_value.get_info.side_effect = lambda: termination_time(
+            server["hours"]
+        )
+        fts = self.make_client()
+        self.assertLess(fts.get_proxy_lifetime(), timedelta(hours=5))
+
+        server["hours"] = 12
+        self.assertLess(fts.get_proxy_lifetime(), timedelta(hours=5))
+        fts.proxy_read -= fts.expiry_ttl
+        self.assertGreater(fts.get_proxy_lifetime(), timedelta(hours=11))
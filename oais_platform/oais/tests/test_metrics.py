@@ -0,0 +1,208 @@
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django_celery_beat.models import IntervalSchedule, PeriodicTask
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from oais_platform.oais.exceptions import RetryableException
+from oais_platform.oais.models import (
+    ApiKey,
+    Archive,
+    ArchiveState,
+    Collection,
+    Source,
+    Status,
+    Step,
+    Steps,
+)
+from oais_platform.oais.sources.invenio import Invenio
+from oais_platform.oais.tasks import batch_harvest, notify_source
+
+
+def sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        self.testuser = User.objects.create_user("testuser", password="pw")
+        self.source = Source.objects.create(
+            name="test",
+            longname="Test",
+            api_url="test.test/api",
+            classname="Local",
+            notification_endpoint="test.test/api/notify",
+            notification_enabled=True,
+        )
+        self.archive = Archive.objects.create(
+            recid="1",
+            source=self.source.name,
+            source_url="",
+            requester=self.testuser,
+            title="",
+            state=ArchiveState.SIP,
+        )
+
+    def test_metrics_endpoint(self):
+        Archive.objects.create(
+            recid="2",
+            source=self.source.name,
+            source_url="",
+            requester=self.testuser,
+            title="",
+            staged=True,
+        )
+        Step.objects.create(
+            archive=self.archive, name=Steps.ARCHIVE, status=Status.WAITING
+        )
+        schedule = IntervalSchedule.objects.create(
+            every=1, period=IntervalSchedule.MINUTES
+        )
+        PeriodicTask.objects.create(
+            name="Archivematica status: 1", task="check_am_status", interval=schedule
+        )
+
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get(
+                reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = response.content.decode()
+        self.assertIn("oais_am_packages_in_flight 1.0", content)
+        self.assertIn("oais_fts_jobs_outstanding 0.0", content)
+        self.assertIn("oais_steps_waiting 1.0", content)
+        self.assertIn("oais_archives_staged 1.0", content)
+        self.assertIn("oais_step_duration_seconds", content)
+
+    def test_metrics_refused(self):
+        # Without a token set, only the superusers are allowed
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get(reverse("metrics"))
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+            response = self.client.get(
+                reverse("metrics"), HTTP_AUTHORIZATION="Bearer wrong"
+            )
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+            self.client.force_authenticate(user=self.testuser)
+            response = self.client.get(reverse("metrics"))
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_metrics_superuser(self):
+        superuser = User.objects.create_superuser("admin", password="pw")
+        self.client.force_authenticate(user=superuser)
+
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_step_metrics(self):
+        completed = {"step": "harvest", "status": "completed"}
+        failed = {"step": "archive", "status": "failed"}
+        failures = {"source": "test", "step": "archive"}
+        completed_count = sample("oais_step_duration_seconds_count", completed)
+        completed_sum = sample("oais_step_duration_seconds_sum", completed)
+        failed_count = sample("oais_step_duration_seconds_count", failed)
+        failures_count = sample("oais_step_failures_total", failures)
+
+        step = Step.objects.create(
+            archive=self.archive,
+            name=Steps.HARVEST,
+            start_date=timezone.now() - timedelta(minutes=5),
+        )
+        step.set_status(Status.COMPLETED)
+        # Only the transition to a final status is recorded
+        step.set_status(Status.COMPLETED)
+        Step.objects.create(archive=self.archive, name=Steps.ARCHIVE).set_status(
+            Status.FAILED
+        )
+
+        self.assertEqual(
+            sample("oais_step_duration_seconds_count", completed), completed_count + 1
+        )
+        self.assertGreaterEqual(
+            sample("oais_step_duration_seconds_sum", completed), completed_sum + 300
+        )
+        # Steps which never started have no duration
+        self.assertEqual(
+            sample("oais_step_duration_seconds_count", failed), failed_count
+        )
+        self.assertEqual(
+            sample("oais_step_failures_total", failures), failures_count + 1
+        )
+
+    def test_step_metrics_queries(self):
+        step_id = Step.objects.create(archive=self.archive, name=Steps.HARVEST).id
+        step = Step.objects.get(pk=step_id)
+
+        with CaptureQueriesContext(connection) as queries:
+            step.set_status(Status.FAILED)
+
+        # The Archive loaded for the event gives the source of the metric
+        self.assertEqual(
+            len([query for query in queries if 'FROM "oais_archive"' in query["sql"]]),
+            1,
+        )
+
+    @patch("oais_platform.oais.tasks.AUTOMATIC_HARVEST_MAX_FILE_SIZE", 10)
+    def test_batch_harvest_too_large(self):
+        failures = {"source": "test", "step": "harvest"}
+        failures_count = sample("oais_step_failures_total", failures)
+        record = {"recid": "2", "title": "", "source_url": "", "file_size": 11}
+
+        tag = Collection.objects.create(internal=True, creator=self.testuser)
+
+        batch_harvest([record], self.testuser.id, "test", [], tag.id)
+
+        archive = Archive.objects.get(recid="2")
+        self.assertEqual(archive.last_step.status, Status.FAILED)
+        self.assertEqual(
+            sample("oais_step_failures_total", failures), failures_count + 1
+        )
+
+    @patch("oais_platform.oais.sources.invenio.requests.get")
+    def test_upstream_request_duration(self, get):
+        get.return_value = MagicMock(ok=True, text='{"hits": {"hits": [], "total": 0}}')
+        labels = {"source": "zenodo", "operation": "search"}
+        count = sample("oais_upstream_request_duration_seconds_count", labels)
+
+        Invenio("zenodo", "https://zenodo.org/api").search("query")
+
+        self.assertEqual(
+            sample("oais_upstream_request_duration_seconds_count", labels), count + 1
+        )
+
+    @patch("oais_platform.oais.sources.local.Local.notify_source")
+    def test_task_retries(self, notify):
+        notify.side_effect = RetryableException("Source unavailable")
+        labels = {"source": "test", "task": "notify_source"}
+        retries = sample("oais_task_retries_total", labels)
+
+        ApiKey.objects.create(user=self.testuser, source=self.source, key="abcd1234")
+        Step.objects.create(
+            archive=self.archive, name=Steps.ARCHIVE, status=Status.COMPLETED
+        )
+        self.archive.set_aip_path("aip/test/path")
+        step = Step.objects.create(archive=self.archive, name=Steps.NOTIFY_SOURCE)
+
+        with self.assertRaises(RetryableException):
+            notify_source(
+                self.archive.id,
+                step.id,
+                credentials=ApiKey.get_reference(self.testuser.id, self.source.name),
+            )
+
+        self.assertEqual(sample("oais_task_retries_total", labels), retries + 1)
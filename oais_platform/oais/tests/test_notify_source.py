@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 from django.contrib.auth.models import User
 from rest_framework.test import APITestCase
 
@@ -28,6 +30,7 @@ class NotifySourceTests(APITestCase):
         self.testuser_api_key = ApiKey.objects.create(
             user=self.testuser, source=self.source, key="abcd1234"
         )
+        self.credentials = ApiKey.get_reference(self.testuser.id, self.source.name)
 
         self.archive = Archive.objects.create(
             recid="1",
@@ -52,7 +55,7 @@ class NotifySourceTests(APITestCase):
 
     def test_notify_source_not_aip(self):
         result = notify_source(
-            self.archive.id, self.step.id, api_key=self.testuser_api_key.key
+            self.archive.id, self.step.id, credentials=self.credentials
         )
 
         self.assertEqual(result["status"], 1)
@@ -66,7 +69,7 @@ class NotifySourceTests(APITestCase):
         self.archive.save()
 
         result = notify_source(
-            self.archive.id, self.step.id, api_key=self.testuser_api_key.key
+            self.archive.id, self.step.id, credentials=self.credentials
         )
 
         self.assertEqual(result["status"], 1)
@@ -81,7 +84,7 @@ class NotifySourceTests(APITestCase):
         self.source.save()
 
         result = notify_source(
-            self.archive.id, self.step.id, api_key=self.testuser_api_key.key
+            self.archive.id, self.step.id, credentials=self.credentials
         )
 
         self.assertEqual(result["status"], 1)
@@ -96,7 +99,7 @@ class NotifySourceTests(APITestCase):
         self.source.save()
 
         result = notify_source(
-            self.archive.id, self.step.id, api_key=self.testuser_api_key.key
+            self.archive.id, self.step.id, credentials=self.credentials
         )
 
         self.assertEqual(result["status"], 1)
@@ -111,7 +114,7 @@ class NotifySourceTests(APITestCase):
         self.source.save()
 
         result = notify_source(
-            self.archive.id, self.step.id, api_key=self.testuser_api_key.key
+            self.archive.id, self.step.id, credentials=self.credentials
         )
 
         self.assertEqual(result["status"], 1)
@@ -123,8 +126,17 @@ class NotifySourceTests(APITestCase):
         self.setup_aip()
 
         result = notify_source(
-            self.archive.id, self.step.id, api_key=self.testuser_api_key.key
+            self.archive.id, self.step.id, credentials=self.credentials
         )
 
         self.assertEqual(result["status"], 0)
         self.assertEqual(result["errormsg"], None)
+
+    @patch("oais_platform.oais.sources.local.Local.notify_source")
+    def test_notify_source_api_key(self, notify):
+        self.setup_aip()
+
+        notify_source(self.archive.id, self.step.id, credentials=self.credentials)
+
+        notify.assert_called_once()
+        self.assertEqual(notify.call_args.args[2], "abcd1234")
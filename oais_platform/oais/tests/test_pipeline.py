@@ -153,7 +153,10 @@ class PipelineTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.archive.refresh_from_db()
         validate_delay.assert_called_once_with(
-            self.archive.id, self.archive.last_step.id, None, None
+            self.archive.id,
+            self.archive.last_step.id,
+            None,
+            {"user": self.other_user.id, "source": self.source.name},
         )
 
     @parameterized.expand(
@@ -256,6 +259,8 @@ class PipelineTests(APITestCase):
             )
 
             latest_step = Step.objects.latest("id")
+            # Tasks get a reference to the API key, never the key itself
+            credentials = {"user": self.testuser.id, "source": self.source.name}
 
             self.assertEqual(response.status_code, status_code)
             self.assertEqual(
@@ -272,25 +277,25 @@ class PipelineTests(APITestCase):
                         self.archive.id,
                         latest_step.id,
                         latest_step.output_data,
-                        self.testuser_api_key.key,
+                        credentials,
                     )
                 case Steps.EXTRACT_TITLE:
                     task.assert_called_once_with(
-                        self.archive.id, latest_step.id, None, self.testuser_api_key.key
+                        self.archive.id, latest_step.id, None, credentials
                     )
                 case Steps.NOTIFY_SOURCE:
                     task.assert_called_once_with(
                         self.archive.id,
                         latest_step.id,
                         latest_step.output_data,
-                        self.testuser_api_key.key,
+                        credentials,
                     )
                 case _:
                     task.assert_called_once_with(
                         self.archive.id,
                         latest_step.id,
                         latest_step.output_data,
-                        self.testuser_api_key.key,
+                        credentials,
                     )
 
     def test_edit_manifests(self):
@@ -0,0 +1,144 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from oais_platform.oais.middleware import (
+    QueryProfile,
+    QueryProfilingMiddleware,
+    get_fingerprint,
+)
+from oais_platform.oais.models import Archive
+
+
+class QueryProfilingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("user", "", "pw")
+        self.client.force_authenticate(user=self.user)
+        for i in range(5):
+            Archive.objects.create(recid=str(i), source="test", title="Archive")
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = os.path.join(directory.name, "profiles.jsonl")
+
+    def read_profiles(self):
+        with open(self.log) as log:
+            return [json.loads(line) for line in log]
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            get_fingerprint(
+                'SELECT * FROM "oais_archive" WHERE "id" IN (%s, %s, %s)\n  LIMIT 21'
+            ),
+            'SELECT * FROM "oais_archive" WHERE "id" IN (...) LIMIT ?',
+        )
+        self.assertEqual(
+            get_fingerprint("SELECT * FROM t2 WHERE name = 'it''s' AND id = 12"),
+            "SELECT * FROM t2 WHERE name = ? AND id = ?",
+        )
+
+    def test_query_profile_duplicates(self):
+        profile = QueryProfile()
+        with connection.execute_wrapper(profile):
+            for archive in Archive.objects.all():
+                Archive.objects.get(id=archive.id)
+
+        self.assertEqual(len(profile.queries), 6)
+        self.assertEqual(len(profile.get_slowest(2)), 2)
+        ((fingerprint, runs),) = profile.get_duplicates()
+        self.assertIn('"oais_archive"."id" = %s', fingerprint)
+        self.assertEqual(runs, 5)
+
+    def test_profiling(self):
+        with override_settings(
+            QUERY_PROFILING_SAMPLE_RATE=1, QUERY_PROFILING_LOG=self.log, DEBUG=True
+        ):
+            response = self.client.get(reverse("archives-list"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(int(response["X-DB-Query-Count"]), 0)
+        self.assertTrue(response["X-DB-Time"].endswith("ms"))
+        self.assertIn("X-DB-Duplicate-Queries", response)
+
+        (profile,) = self.read_profiles()
+        self.assertEqual(profile["method"], "GET")
+        self.assertEqual(profile["endpoint"], "archives-list")
+        self.assertEqual(profile["status"], 200)
+        self.assertEqual(profile["queries"], int(response["X-DB-Query-Count"]))
+        self.assertLessEqual(len(profile["slowest"]), 5)
+
+    def test_profiling_headers_debug_only(self):
+        with override_settings(
+            QUERY_PROFILING_SAMPLE_RATE=1, QUERY_PROFILING_LOG=self.log
+        ):
+            response = self.client.get(reverse("archives-list"))
+
+        self.assertNotIn("X-DB-Query-Count", response)
+        self.assertEqual(len(self.read_profiles()), 1)
+
+    def test_profiling_disabled(self):
+        with override_settings(
+            QUERY_PROFILING_SAMPLE_RATE=0, QUERY_PROFILING_LOG=self.log, DEBUG=True
+        ):
+            response = self.client.get(reverse("archives-list"))
+
+        self.assertNotIn("X-DB-Query-Count", response)
+        self.assertFalse(os.path.exists(self.log))
+
+    def test_profiling_streaming(self):
+        def listing():
+            for archive in Archive.objects.all():
+                yield str(Archive.objects.get(id=archive.id).id)
+
+        with override_settings(
+            QUERY_PROFILING_SAMPLE_RATE=1, QUERY_PROFILING_LOG=self.log, DEBUG=True
+        ):
+            middleware = QueryProfilingMiddleware(
+                lambda request: StreamingHttpResponse(listing())
+            )
+            response = middleware(RequestFactory().get("/stream"))
+            self.assertFalse(os.path.exists(self.log))
+            self.assertNotIn("X-DB-Query-Count", response)
+
+            b"".join(response)
+
+        (profile,) = self.read_profiles()
+        self.assertTrue(profile["streaming"])
+        self.assertEqual(profile["queries"], 6)
+        self.assertEqual(profile["duplicates"][0]["count"], 5)
+
+    def test_query_report(self):
+        with override_settings(
+            QUERY_PROFILING_SAMPLE_RATE=1, QUERY_PROFILING_LOG=self.log
+        ):
+            self.client.get(reverse("archives-list"))
+            self.client.get(reverse("archives-list"))
+            self.client.get(
+                reverse("archives-detail", args=[Archive.objects.first().id])
+            )
+
+        output = StringIO()
+        call_command("query_report", "--log", self.log, "--json", stdout=output)
+        report = json.loads(output.getvalue())
+
+        self.assertEqual(
+            {(endpoint["endpoint"], endpoint["requests"]) for endpoint in report},
+            {("archives-list", 2), ("archives-detail", 1)},
+        )
+
+        output = StringIO()
+        call_command(
+            "query_report", "--log", self.log, "--sort", "requests", stdout=output
+        )
+        self.assertIn("3 profiled requests, 2 endpoints reported", output.getvalue())
+        self.assertIn("GET archives-list\n  requests: 2", output.getvalue())
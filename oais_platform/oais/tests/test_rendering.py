@@ -0,0 +1,103 @@
+import gzip
+import json
+import uuid
+
+import brotli
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from oais_platform.oais.middleware import get_accepted_encoding
+from oais_platform.oais.models import Archive
+from oais_platform.oais.renderers import ORJSONRenderer
+
+
+class RenderingTests(SimpleTestCase):
+    def test_orjson_renderer(self):
+        now = timezone.now()
+        data = {"title": "Ünïcode", "date": now, "lazy": gettext_lazy("Archive"), 1: []}
+
+        rendered = ORJSONRenderer().render(data)
+
+        self.assertEqual(
+            json.loads(rendered),
+            {
+                "title": "Ünïcode",
+                "date": now.isoformat().replace("+00:00", "Z"),
+                "lazy": "Archive",
+                "1": [],
+            },
+        )
+
+    def test_orjson_renderer_same_output(self):
+        data = {
+            "date": timezone.now(),
+            "day": timezone.now().date(),
+            "uuid": uuid.uuid4(),
+            "title": "Line\u2028Paragraph\u2029Ünïcode",
+            "lazy": gettext_lazy("Archive"),
+            "results": [{"id": 1, "size": 1.5, "staged": None}],
+        }
+
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_orjson_renderer_indent(self):
+        rendered = ORJSONRenderer().render({"a": 1}, "application/json; indent=2")
+        self.assertEqual(rendered, b'{\n  "a": 1\n}')
+
+    def test_accepted_encoding(self):
+        self.assertEqual(get_accepted_encoding("gzip, deflate, br"), "br")
+        self.assertEqual(get_accepted_encoding("gzip;q=1.0, br;q=0.5"), "gzip")
+        self.assertEqual(get_accepted_encoding("br;q=0, gzip"), "gzip")
+        self.assertEqual(get_accepted_encoding("*"), "br")
+        self.assertEqual(get_accepted_encoding("identity"), None)
+        self.assertEqual(get_accepted_encoding(""), None)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=1024)
+class CompressionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("user", "", "pw")
+        self.client.force_authenticate(user=self.user)
+        for i in range(20):
+            Archive.objects.create(recid=str(i), source="test", title="Archive " * 10)
+        self.url = reverse("archives-list")
+
+    def test_compression_gzip(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content))
+
+    def test_compression_brotli(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, br")
+
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+    def test_compression_small_response(self):
+        response = self.client.get(
+            reverse("archives-detail", args=[Archive.objects.first().id]),
+            HTTP_ACCEPT_ENCODING="gzip, br",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_orjson_parser_invalid(self):
+        response = self.client.post(
+            reverse("archives-duplicates"),
+            "{invalid",
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
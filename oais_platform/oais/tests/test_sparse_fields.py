@@ -0,0 +1,94 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from oais_platform.oais.models import Archive, Step, Steps
+
+
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        self.requester = User.objects.create_user("requester", password="pw")
+        self.client.force_authenticate(user=self.requester)
+
+        self.archive = Archive.objects.create(
+            recid="1",
+            source="test",
+            title="Title",
+            requester=self.requester,
+            restricted=True,
+            manifest={"audit": [{"tool": "test"}]},
+        )
+        self.step = Step.objects.create(
+            archive=self.archive,
+            name=Steps.HARVEST,
+            input_data='{"input": 1}',
+            output_data='{"output": 2}',
+        )
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sql = " ".join(query["sql"] for query in queries.captured_queries)
+        return response.data, sql
+
+    def test_archive_list_fields(self):
+        data, sql = self.get(reverse("archives-list"), {"fields": "id,title,state"})
+
+        self.assertEqual(
+            data["results"],
+            [{"id": self.archive.id, "title": "Title", "state": self.archive.state}],
+        )
+        self.assertNotIn('"manifest"', sql)
+
+    def test_archive_list_exclude(self):
+        data, sql = self.get(reverse("archives-list"), {"exclude": "manifest,resource"})
+
+        archive = data["results"][0]
+        self.assertNotIn("manifest", archive)
+        self.assertNotIn("resource", archive)
+        self.assertEqual(archive["title"], "Title")
+        self.assertNotIn('"manifest"', sql)
+
+    def test_archive_detail_fields(self):
+        # The restricted archive is only visible to its requester, which
+        # the permission check reads even though it is not requested
+        data, sql = self.get(
+            reverse("archives-detail", args=[self.archive.id]), {"fields": "id,title"}
+        )
+
+        self.assertEqual(data, {"id": self.archive.id, "title": "Title"})
+        self.assertNotIn('"manifest"', sql)
+
+    def test_archive_full(self):
+        data, sql = self.get(reverse("archives-detail", args=[self.archive.id]), {})
+
+        self.assertEqual(data["manifest"], {"audit": [{"tool": "test"}]})
+        self.assertIn("resource", data)
+
+    def test_archive_unknown_field(self):
+        response = self.client.get(reverse("archives-list"), {"fields": "id,secret"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_step_detail_exclude(self):
+        data, sql = self.get(
+            reverse("steps-detail", args=[self.step.id]),
+            {"exclude": "input_data,output_data"},
+        )
+
+        self.assertEqual(data["id"], self.step.id)
+        self.assertEqual(data["archive"], self.archive.id)
+        self.assertNotIn("input_data", data)
+        self.assertNotIn("output_data", data)
+        self.assertNotIn('"output_data"', sql)
+
+    def test_archive_steps_fields(self):
+        data, sql = self.get(
+            reverse("archives-steps", args=[self.archive.id]), {"fields": "id,status"}
+        )
+
+        self.assertEqual(data, [{"id": self.step.id, "status": self.step.status}])
+        self.assertNotIn('"output_data"', sql)
@@ -1,17 +1,25 @@
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from oais_platform.oais.models import Archive, Status, Step, Steps
+from oais_platform.oais.models import (
+    Archive,
+    Statistics,
+    StatisticsScope,
+    Status,
+    Step,
+    Steps,
+)
 
 
 class StatisticsEndpointTest(APITestCase):
     def setUp(self):
         self.url = reverse("statistics")
 
-        self.harvested_archive = Archive.objects.create()
-        self.preserved_archive = Archive.objects.create()
-        self.pushed_archive = Archive.objects.create()
+        self.harvested_archive = Archive.objects.create(source="cds")
+        self.preserved_archive = Archive.objects.create(source="cds")
+        self.pushed_archive = Archive.objects.create(source="indico")
         step_data = {
             self.harvested_archive: [Steps.CHECKSUM],
             self.preserved_archive: [Steps.CHECKSUM, Steps.ARCHIVE],
@@ -48,3 +56,50 @@ class StatisticsEndpointTest(APITestCase):
         self.assertEqual(response.data["preserved_count"], 2)
         self.assertEqual(response.data["pushed_to_tape_count"], 1)
         self.assertEqual(response.data["pushed_to_registry_count"], 1)
+
+    def test_statistics_incremental(self):
+        # First read initializes the counters, later changes update them
+        self.client.get(self.url, format="json")
+
+        archive = Archive.objects.create(source="cds")
+        for step in (Steps.CHECKSUM, Steps.ARCHIVE, Steps.PUSH_TO_CTA):
+            Step.objects.create(name=step, status=Status.COMPLETED, archive=archive)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["harvested_count"], 4)
+        self.assertEqual(response.data["preserved_count"], 3)
+        self.assertEqual(response.data["pushed_to_tape_count"], 2)
+        self.assertEqual(response.data["pushed_to_registry_count"], 1)
+
+    def test_statistics_breakdown(self):
+        response = self.client.get(self.url, {"breakdown": "source"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        breakdown = {row["key"]: row for row in response.data}
+        self.assertEqual(breakdown["cds"]["harvested_count"], 2)
+        self.assertEqual(breakdown["cds"]["preserved_count"], 1)
+        self.assertEqual(breakdown["cds"]["pushed_to_tape_count"], 0)
+        self.assertEqual(breakdown["indico"]["harvested_count"], 1)
+        self.assertEqual(breakdown["indico"]["pushed_to_registry_count"], 1)
+
+        response = self.client.get(self.url, {"breakdown": "day"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["key"], timezone.localdate().isoformat())
+        self.assertEqual(response.data[0]["harvested_count"], 3)
+
+        response = self.client.get(self.url, {"breakdown": "user"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_statistics_reconcile(self):
+        Statistics.reconcile()
+        Statistics.objects.filter(scope=StatisticsScope.TOTAL).update(
+            harvested_count=42, pushed_to_tape_count=0
+        )
+
+        Statistics.reconcile()
+
+        totals = Statistics.objects.get(scope=StatisticsScope.TOTAL)
+        self.assertEqual(totals.harvested_count, 3)
+        self.assertEqual(totals.pushed_to_tape_count, 1)
@@ -1,17 +1,31 @@
+import base64
+import hashlib
+import io
+import json
 import os
+import shutil
 import tempfile
 import zipfile
 from unittest.mock import patch
 
 from bagit_create import main as bic
 from django.contrib.auth.models import User
-from django.core.files.uploadedfile import TemporaryUploadedFile
-from django.test import override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import SimpleTestCase, override_settings
 from django.urls import reverse
+from parameterized import parameterized
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from oais_platform.oais.models import Archive, Step
+from oais_platform.oais.exceptions import ExtractionError
+from oais_platform.oais.models import (
+    Archive,
+    Step,
+    UploadJob,
+    UploadJobChunk,
+    UploadJobFile,
+)
+from oais_platform.oais.streaming import extract_sip
 
 
 class UploadTests(APITestCase):
@@ -114,3 +128,308 @@ class UploadTests(APITestCase):
                     latest_step.output_data,
                     None,
                 )
+
+    def test_upload_sip_tampered_entry(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zipf:
+            zipf.writestr("sip/a.txt", b"original content")
+        content = buffer.getvalue().replace(b"original", b"tampered")
+
+        with tempfile.TemporaryDirectory() as base_path:
+            with override_settings(BIC_UPLOAD_PATH=base_path):
+                response = self.client.post(
+                    reverse("upload-sip"),
+                    {"file": SimpleUploadedFile("sip.zip", content)},
+                )
+            self.assertEqual(os.listdir(base_path), [])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["msg"], "sip/a.txt is corrupted")
+
+
+class ChunkedUploadTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("user", "", "pw")
+        self.client.force_authenticate(user=self.user)
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.files = {
+            "sip/data/meta/sip.json": b'{"source": "local"}',
+            "sip/data/content/file.txt": os.urandom(5000),
+        }
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zipf:
+            for name, content in self.files.items():
+                zipf.writestr(name, content)
+        self.zip = buffer.getvalue()
+
+        response = self.client.post(reverse("upload-create-job"))
+        self.upload_job = UploadJob.objects.get(pk=response.data["uploadJobId"])
+
+    def tearDown(self):
+        shutil.rmtree(self.upload_job.tmp_dir, ignore_errors=True)
+        self.upload_job.delete_chunks()
+        self.tmp_dir.cleanup()
+
+    def upload_chunk(self, offset, data, checksum=None):
+        if checksum is None:
+            checksum = base64.b64encode(hashlib.sha256(data).digest()).decode()
+        return self.client.put(
+            reverse("upload-chunk", args=[self.upload_job.id]),
+            data,
+            content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+            HTTP_UPLOAD_CHECKSUM=f"sha256 {checksum}",
+        )
+
+    def test_chunked_upload(self):
+        offsets = [0, 2000, 4000, len(self.zip)]
+        # Chunks may arrive in any order
+        for start, end in [(2000, 4000), (0, 2000)]:
+            response = self.upload_chunk(start, self.zip[start:end])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data, {"offset": start, "size": end - start})
+
+        response = self.client.get(reverse("upload-chunks", args=[self.upload_job.id]))
+        self.assertEqual(response.data["offset"], 4000)
+        self.assertEqual(len(response.data["chunks"]), 2)
+
+        self.upload_chunk(offsets[2], self.zip[offsets[2] :])
+        with override_settings(BIC_UPLOAD_PATH=self.tmp_dir.name):
+            response = self.client.post(
+                reverse("upload-chunks-complete", args=[self.upload_job.id]),
+                HTTP_UPLOAD_LENGTH=str(len(self.zip)),
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.upload_job.refresh_from_db()
+        self.assertEqual(
+            self.upload_job.sip_dir, os.path.join(self.tmp_dir.name, "sip")
+        )
+        for name, content in self.files.items():
+            with open(os.path.join(self.tmp_dir.name, name), "rb") as f:
+                self.assertEqual(f.read(), content)
+        self.assertFalse(UploadJobChunk.objects.exists())
+        self.assertEqual(os.listdir(self.upload_job.tmp_dir), [])
+        self.assertFalse(
+            os.path.exists(UploadJobChunk.get_dir(self.upload_job.tmp_dir))
+        )
+
+    def test_chunked_upload_outside_tmp_dir(self):
+        self.upload_chunk(0, self.zip[:2000])
+
+        # The chunks never end up among the files packaged in the SIP
+        self.assertEqual(os.listdir(self.upload_job.tmp_dir), [])
+        self.assertEqual(
+            os.listdir(UploadJobChunk.get_dir(self.upload_job.tmp_dir)),
+            [f"{0:020d}"],
+        )
+
+    def test_chunked_upload_invalid_zip(self):
+        self.upload_chunk(0, b"not a zip")
+
+        response = self.client.post(
+            reverse("upload-chunks-complete", args=[self.upload_job.id]),
+            HTTP_UPLOAD_LENGTH="9",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(UploadJobChunk.objects.exists())
+        self.assertFalse(
+            os.path.exists(UploadJobChunk.get_dir(self.upload_job.tmp_dir))
+        )
+
+    def test_chunked_upload_checksum_mismatch(self):
+        response = self.upload_chunk(0, self.zip[:2000], checksum="AAAA")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(UploadJobChunk.objects.exists())
+        self.assertEqual(
+            os.listdir(UploadJobChunk.get_dir(self.upload_job.tmp_dir)), []
+        )
+
+    def test_chunked_upload_incomplete(self):
+        self.upload_chunk(0, self.zip[:2000])
+        self.upload_chunk(4000, self.zip[4000:])
+
+        response = self.client.post(
+            reverse("upload-chunks-complete", args=[self.upload_job.id]),
+            HTTP_UPLOAD_LENGTH=str(len(self.zip)),
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(UploadJobChunk.objects.count(), 2)
+
+
+class UploadJobFilesTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("user", "", "pw")
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.post(reverse("upload-create-job"))
+        self.upload_job = UploadJob.objects.get(pk=response.data["uploadJobId"])
+        self.files = {"folder/a.txt": b"first file", "folder/sub/b.txt": b"second"}
+
+    def tearDown(self):
+        shutil.rmtree(self.upload_job.tmp_dir, ignore_errors=True)
+
+    def add_files(self, files):
+        return self.client.post(
+            reverse("upload-add-file", args=[self.upload_job.id]),
+            {
+                path: SimpleUploadedFile(os.path.basename(path), content)
+                for path, content in files.items()
+            },
+        )
+
+    def test_add_files(self):
+        with self.assertNumQueries(2):
+            response = self.add_files(self.files)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Uploading a file again replaces its entry
+        self.add_files({"folder/a.txt": b"new content"})
+
+        response = self.client.get(reverse("upload-files", args=[self.upload_job.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        listing = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(
+            listing,
+            [
+                {
+                    "path": "folder/a.txt",
+                    "size": 11,
+                    "checksum": hashlib.sha256(b"new content").hexdigest(),
+                },
+                {
+                    "path": "folder/sub/b.txt",
+                    "size": 6,
+                    "checksum": hashlib.sha256(b"second").hexdigest(),
+                },
+            ],
+        )
+        with open(os.path.join(self.upload_job.tmp_dir, "folder/sub/b.txt"), "rb") as f:
+            self.assertEqual(f.read(), b"second")
+
+    def test_add_files_outside_tmp_dir(self):
+        response = self.add_files({"../escaped.txt": b"content"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(UploadJobFile.objects.exists())
+
+    @patch("oais_platform.oais.views.bic.process")
+    def test_create_sip(self, process):
+        process.return_value = {"status": 0, "foldername": "sip"}
+        self.add_files(self.files)
+        # Left over by an abandoned chunked upload
+        chunk_path = UploadJobChunk.get_path(self.upload_job.tmp_dir, 0)
+        os.makedirs(os.path.dirname(chunk_path))
+        open(chunk_path, "wb").close()
+        UploadJobChunk.objects.create(
+            upload_job=self.upload_job, offset=0, size=0, checksum=""
+        )
+
+        with override_settings(BIC_UPLOAD_PATH="/sips"):
+            response = self.client.post(
+                reverse("upload-sip", args=[self.upload_job.id])
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.upload_job.refresh_from_db()
+        self.assertEqual(self.upload_job.sip_dir, "/sips/sip")
+        self.assertFalse(self.upload_job.chunks.exists())
+        self.assertFalse(os.path.exists(os.path.dirname(chunk_path)))
+
+    @patch("oais_platform.oais.views.bic.process")
+    def test_create_sip_missing_file(self, process):
+        self.add_files(self.files)
+        os.remove(os.path.join(self.upload_job.tmp_dir, "folder/a.txt"))
+
+        response = self.client.post(reverse("upload-sip", args=[self.upload_job.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        process.assert_not_called()
+
+
+class ExtractSIPTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.base_path = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_zip(self, files):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
+            for name, content in files.items():
+                zipf.writestr(name, content)
+        buffer.seek(0)
+        return buffer
+
+    def assertNothingExtracted(self):
+        self.assertEqual(os.listdir(self.base_path), [])
+
+    def test_extract_sip(self):
+        files = {f"sip/data/content/{i}.txt": os.urandom(i) for i in range(200)}
+        files["sip/data/meta/sip.json"] = b"{}"
+
+        location = extract_sip(self.make_zip(files), self.base_path)
+
+        self.assertEqual(location, os.path.join(self.base_path, "sip"))
+        self.assertEqual(os.listdir(self.base_path), ["sip"])
+        for name, content in files.items():
+            with open(os.path.join(self.base_path, name), "rb") as f:
+                self.assertEqual(f.read(), content)
+
+    @parameterized.expand(
+        [
+            ({"sip/../escaped.txt": b"x"},),
+            ({"/sip/absolute.txt": b"x"},),
+            ({"sip/a.txt": b"x", "other/b.txt": b"x"},),
+            ({"file.txt": b"x"},),
+        ]
+    )
+    def test_extract_sip_invalid_paths(self, files):
+        with self.assertRaises(ExtractionError):
+            extract_sip(self.make_zip(files), self.base_path)
+        self.assertNothingExtracted()
+
+    def test_extract_sip_budgets(self):
+        files = {f"sip/{i}.txt": b"x" * 100 for i in range(10)}
+
+        with self.assertRaises(ExtractionError):
+            extract_sip(self.make_zip(files), self.base_path, max_entries=9)
+        with self.assertRaises(ExtractionError):
+            extract_sip(self.make_zip(files), self.base_path, max_bytes=999)
+        self.assertNothingExtracted()
+
+        extract_sip(self.make_zip(files), self.base_path, max_bytes=1000)
+        self.assertEqual(len(os.listdir(os.path.join(self.base_path, "sip"))), 10)
+
+    def test_extract_sip_existing(self):
+        os.makedirs(os.path.join(self.base_path, "sip"))
+
+        with self.assertRaises(ExtractionError):
+            extract_sip(self.make_zip({"sip/a.txt": b"x"}), self.base_path)
+        self.assertEqual(os.listdir(self.base_path), ["sip"])
+
+    def test_extract_sip_wrong_declared_size(self):
+        content = self.make_zip({"sip/a.txt": b"x" * 1000}).getvalue()
+        # Declare 10 bytes instead of 1000 in both the local and central headers
+        declared = (1000).to_bytes(4, "little") + (9).to_bytes(2, "little")
+        content = content.replace(declared, (10).to_bytes(4, "little") + declared[4:])
+
+        with self.assertRaises(ExtractionError):
+            extract_sip(io.BytesIO(content), self.base_path)
+        self.assertNothingExtracted()
+
+    def test_extract_sip_tampered_entry(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zipf:
+            zipf.writestr("sip/a.txt", b"original content")
+        content = buffer.getvalue().replace(b"original", b"tampered")
+
+        with self.assertRaisesRegex(ExtractionError, "sip/a.txt is corrupted"):
+            extract_sip(io.BytesIO(content), self.base_path)
+        self.assertNothingExtracted()
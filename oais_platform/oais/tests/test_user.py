@@ -1,5 +1,15 @@
+import json
+from importlib import import_module
+from io import StringIO
+
+from cryptography.fernet import Fernet
+from django.apps import apps
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
+from django_celery_beat.models import IntervalSchedule, PeriodicTask
 from parameterized import parameterized
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -343,3 +353,156 @@ class UserTests(APITestCase):
             self.assertEqual(
                 result["id"] in [self.test_archive.id, self.super_archive.id], True
             )
+
+
+class ApiKeyTests(APITestCase):
+    """
+    Test cases for the resolution and caching of the API keys.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user("user", password="pw")
+        self.sources = [
+            Source.objects.create(
+                name=f"source{i}",
+                longname=f"Source {i}",
+                api_url=f"source{i}.test/api",
+                classname="Local",
+                has_restricted_records=True,
+            )
+            for i in range(5)
+        ]
+        for source in self.sources[:3]:
+            ApiKey.objects.create(user=self.user, source=source, key=source.name)
+
+    def test_get_user_keys(self):
+        with self.assertNumQueries(1):
+            keys = ApiKey.get_user_keys(self.user.id)
+        self.assertEqual(keys, {f"source{i}": f"source{i}" for i in range(3)})
+
+        # Cached until the user's keys change
+        with self.assertNumQueries(0):
+            self.assertEqual(ApiKey.get_user_key(self.user.id, "source0"), "source0")
+            self.assertIsNone(ApiKey.get_user_key(self.user.id, "source4"))
+
+        api_key = ApiKey.objects.get(user=self.user, source=self.sources[0])
+        api_key.key = "new"
+        api_key.save()
+        self.assertEqual(ApiKey.get_user_key(self.user.id, "source0"), "new")
+
+        api_key.delete()
+        self.assertIsNone(ApiKey.get_user_key(self.user.id, "source0"))
+
+    def test_resolve(self):
+        credentials = ApiKey.get_reference(self.user.id, "source1")
+        self.assertEqual(credentials, {"user": self.user.id, "source": "source1"})
+        self.assertEqual(ApiKey.resolve(credentials), "source1")
+        self.assertIsNone(ApiKey.resolve(ApiKey.get_reference(self.user.id, "source4")))
+        self.assertIsNone(ApiKey.resolve(ApiKey.get_reference(None, "source1")))
+
+        # Keys passed by tasks queued before references were used
+        self.assertEqual(ApiKey.resolve("legacy"), "legacy")
+        self.assertIsNone(ApiKey.resolve(None))
+
+    def test_periodic_task_migration(self):
+        migration = import_module(
+            "oais_platform.oais.migrations.0025_periodic_task_credentials"
+        )
+        schedule = IntervalSchedule.objects.create(
+            every=1, period=IntervalSchedule.HOURS
+        )
+        archive = Archive.objects.create(
+            recid="1", source="source2", requester=self.user
+        )
+        tasks = {
+            name: PeriodicTask.objects.create(
+                interval=schedule, name=name, task=name, args=json.dumps(args)
+            )
+            for name, args in [
+                ("check_fts_job_status", [archive.id, 1, "job", "source2"]),
+                ("check_am_status", [{"id": 1}, 1, archive.id, "unknown"]),
+                ("batch_harvest", [[], self.user.id, "source0", [], 1, "source0"]),
+            ]
+        }
+
+        migration.replace_api_keys(apps, None)
+
+        args = {
+            name: json.loads(PeriodicTask.objects.get(pk=task.pk).args)
+            for name, task in tasks.items()
+        }
+        self.assertEqual(
+            args["check_fts_job_status"][3], {"user": self.user.id, "source": "source2"}
+        )
+        # Keys not matching any of the users are dropped
+        self.assertIsNone(args["check_am_status"][3])
+        self.assertEqual(
+            args["batch_harvest"][5], {"user": self.user.id, "source": "source0"}
+        )
+
+        migration.restore_api_keys(apps, None)
+        task = PeriodicTask.objects.get(pk=tasks["batch_harvest"].pk)
+        self.assertEqual(json.loads(task.args)[5], "source0")
+
+    @override_settings(API_KEY_CACHE_TTL=0)
+    def test_get_user_keys_expired(self):
+        ApiKey.get_user_keys(self.user.id)
+        with self.assertNumQueries(1):
+            ApiKey.get_user_keys(self.user.id)
+
+    @override_settings(API_KEY_CACHE_TTL=0)
+    def test_key_rotation(self):
+        old_key, new_key = (
+            Fernet.generate_key().decode(),
+            Fernet.generate_key().decode(),
+        )
+        with override_settings(ENCRYPT_KEY=old_key):
+            api_key = ApiKey.objects.create(
+                user=self.user, source=self.sources[3], key="secret"
+            )
+
+        # Keys encrypted with a previous key stay readable while it is a fallback
+        with override_settings(ENCRYPT_KEY=new_key, ENCRYPT_KEY_FALLBACKS=[old_key]):
+            self.assertEqual(ApiKey.get_user_key(self.user.id, "source3"), "secret")
+            api_key.refresh_from_db()
+            api_key.key = api_key.key
+            api_key.save()
+
+        with override_settings(ENCRYPT_KEY=new_key):
+            self.assertEqual(ApiKey.get_user_key(self.user.id, "source3"), "secret")
+        with override_settings(ENCRYPT_KEY=old_key):
+            self.assertIsNone(ApiKey.get_user_key(self.user.id, "source3"))
+
+    @override_settings(API_KEY_CACHE_TTL=0)
+    def test_rotate_api_keys(self):
+        old_key, new_key, lost_key = (Fernet.generate_key().decode() for _ in range(3))
+        with override_settings(ENCRYPT_KEY=old_key):
+            ApiKey.objects.create(user=self.user, source=self.sources[3], key="secret")
+        with override_settings(ENCRYPT_KEY=lost_key):
+            ApiKey.objects.create(user=self.user, source=self.sources[4], key="lost")
+
+        output, errors = StringIO(), StringIO()
+        # The keys of setUp were encrypted with the default key
+        fallbacks = [old_key, settings.ENCRYPT_KEY]
+        with override_settings(ENCRYPT_KEY=new_key, ENCRYPT_KEY_FALLBACKS=fallbacks):
+            call_command("rotate_api_keys", stdout=output, stderr=errors)
+        self.assertEqual(output.getvalue(), "4 API Keys re-encrypted\n")
+        self.assertIn("1 API Keys cannot be decrypted", errors.getvalue())
+
+        # The previous key is no longer needed
+        with override_settings(ENCRYPT_KEY=new_key):
+            self.assertEqual(ApiKey.get_user_key(self.user.id, "source3"), "secret")
+        with override_settings(ENCRYPT_KEY=lost_key):
+            self.assertEqual(ApiKey.get_user_key(self.user.id, "source4"), "lost")
+
+    def test_users_me_api_keys(self):
+        self.client.force_authenticate(user=self.user)
+        ApiKey.get_user_keys(self.user.id)
+
+        response = self.client.get(reverse("users-me"))
+        keys = {entry["source"]: entry["key"] for entry in response.data["api_key"]}
+        self.assertEqual(keys["Source 0"], "source0")
+        self.assertIsNone(keys["Source 4"])
+
+        response = self.client.get(reverse("users-me-sources"))
+        self.assertEqual(response.data["source0"]["status"], 1)
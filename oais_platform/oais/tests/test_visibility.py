@@ -0,0 +1,158 @@
+from django.contrib.auth.models import Group, User
+from django.test import TestCase
+from django.urls import reverse
+from guardian.shortcuts import assign_perm, remove_perm
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from oais_platform.oais.models import Archive, ArchiveGrant, Collection, GrantReason
+from oais_platform.oais.permissions import (
+    can_view_all_archives,
+    can_view_archives,
+    filter_archives,
+)
+
+
+class ArchiveGrantTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user", password="pw")
+        self.other_user = User.objects.create_user("other", password="pw")
+        self.archive = Archive.objects.create(
+            recid="1", source="test", requester=self.other_user, restricted=True
+        )
+        self.public_archive = Archive.objects.create(
+            recid="2", source="test", requester=self.other_user, restricted=False
+        )
+
+    def visible(self, user):
+        return set(filter_archives(Archive.objects.all(), user))
+
+    def assertGrantsRebuilt(self):
+        # Incremental updates give the same grants as a full rebuild
+        grants = set(ArchiveGrant.objects.values_list("archive", "user", "reason"))
+        ArchiveGrant.rebuild()
+        self.assertEqual(
+            grants, set(ArchiveGrant.objects.values_list("archive", "user", "reason"))
+        )
+
+    def test_owner_grants(self):
+        self.assertEqual(self.visible(self.user), {self.public_archive})
+
+        self.archive.approver = self.user
+        self.archive.save()
+        self.assertEqual(self.visible(self.user), {self.archive, self.public_archive})
+
+        self.archive.approver = None
+        self.archive.save()
+        self.assertEqual(self.visible(self.user), {self.public_archive})
+
+        self.archive.requester = self.user
+        self.archive.save()
+        self.assertEqual(self.visible(self.user), {self.archive, self.public_archive})
+        self.assertFalse(
+            ArchiveGrant.objects.filter(
+                archive=self.archive, user=self.other_user
+            ).exists()
+        )
+        self.assertGrantsRebuilt()
+
+    def test_owner_grants_deferred(self):
+        # Saving an Archive loaded without its owners leaves the grants alone
+        archive = Archive.objects.only("id", "title").get(pk=self.archive.pk)
+        archive.set_title("Title")
+
+        self.assertTrue(
+            ArchiveGrant.objects.filter(
+                archive=self.archive, user=self.other_user, reason=GrantReason.REQUESTER
+            ).exists()
+        )
+
+    def test_user_permission_grants(self):
+        assign_perm("oais.view_archive", self.user, self.archive)
+        self.assertEqual(self.visible(self.user), {self.archive, self.public_archive})
+        self.assertGrantsRebuilt()
+
+        remove_perm("oais.view_archive", self.user, self.archive)
+        self.assertEqual(self.visible(self.user), {self.public_archive})
+
+    def test_group_permission_grants(self):
+        group = Group.objects.create(name="group")
+        assign_perm("oais.view_archive", group, self.archive)
+        self.assertEqual(self.visible(self.user), {self.public_archive})
+
+        self.user.groups.add(group)
+        self.assertEqual(self.visible(self.user), {self.archive, self.public_archive})
+        self.assertGrantsRebuilt()
+
+        group.user_set.clear()
+        self.assertEqual(self.visible(self.user), {self.public_archive})
+
+        self.user.groups.add(group)
+        group.delete()
+        self.assertEqual(self.visible(self.user), {self.public_archive})
+
+    def test_group_permission_grants_other_group(self):
+        # Losing one of two groups granting the same Archive keeps it visible
+        first, second = Group.objects.create(name="1"), Group.objects.create(name="2")
+        for group in [first, second]:
+            assign_perm("oais.view_archive", group, self.archive)
+            self.user.groups.add(group)
+
+        self.user.groups.remove(first)
+        self.assertEqual(self.visible(self.user), {self.archive, self.public_archive})
+
+
+class CanViewArchivesTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user", password="pw")
+        self.other_user = User.objects.create_user("other", password="pw")
+        self.owned = [
+            Archive.objects.create(recid=str(i), source="test", requester=self.user)
+            for i in range(5)
+        ]
+        self.public = Archive.objects.create(
+            recid="5", source="test", requester=self.other_user, restricted=False
+        )
+        self.hidden = Archive.objects.create(
+            recid="6", source="test", requester=self.other_user, restricted=True
+        )
+        # Load the global permissions of the user once
+        can_view_all_archives(self.user)
+
+    def test_can_view_archives(self):
+        ids = [archive.id for archive in self.owned] + [self.public.id]
+
+        with self.assertNumQueries(1):
+            self.assertTrue(can_view_archives(self.user, ids))
+        with self.assertNumQueries(1):
+            self.assertFalse(can_view_archives(self.user, ids + [self.hidden.id]))
+
+        self.assertTrue(can_view_archives(self.user, [{"id": id} for id in ids]))
+        self.assertTrue(can_view_archives(self.user, self.owned))
+        self.assertFalse(can_view_archives(self.user, [self.hidden]))
+        self.assertTrue(can_view_archives(self.user, []))
+        # Missing Archives cannot be viewed
+        self.assertFalse(can_view_archives(self.user, [self.hidden.id + 1]))
+
+    def test_can_view_archives_queryset(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(
+                can_view_archives(self.user, Archive.objects.exclude(pk=self.hidden.pk))
+            )
+        self.assertFalse(can_view_archives(self.user, Archive.objects.all()))
+
+        assign_perm("oais.view_archive", self.user, self.hidden)
+        self.assertTrue(can_view_archives(self.user, Archive.objects.all()))
+
+    def test_tag_detail(self):
+        tag = Collection.objects.create(title="Tag", creator=self.user)
+        tag.archives.set(self.owned + [self.public])
+        self.client.force_authenticate(user=self.user)
+        url = reverse("tags-detail", args=[tag.id])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        tag.archives.add(self.hidden)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
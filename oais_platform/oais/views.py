@@ -1,62 +1,108 @@
+import base64
+import hashlib
 import json
+import logging
 import os
 import shutil
 import tempfile
+import time
 import zipfile
 from pathlib import PurePosixPath
-from shutil import make_archive
 from urllib.parse import unquote, urlparse
-from wsgiref.util import FileWrapper
 
 from bagit_create import main as bic
+from django.apps import apps
 from django.conf import settings
 from django.contrib import auth
 from django.contrib.auth.models import User
 from django.db import transaction
 from django.db.models import Q
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect
 from drf_spectacular.utils import extend_schema, extend_schema_view
 from oais_utils.validate import get_manifest
+from prometheus_client import CONTENT_TYPE_LATEST
 from rest_framework import permissions, viewsets
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import (
+    action,
+    api_view,
+    authentication_classes,
+    permission_classes,
+    renderer_classes,
+)
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from oais_platform.oais.exceptions import BadRequest
-from oais_platform.oais.mixins import PaginationMixin
+from oais_platform.oais.events import StepEventStream
+from oais_platform.oais.exceptions import BadRequest, DoesNotExist, ExtractionError
+from oais_platform.oais.metrics import generate_metrics
+from oais_platform.oais.mixins import (
+    ConditionalGetMixin,
+    PaginationMixin,
+    SparseFieldsMixin,
+    conditional_get,
+    only_selected_fields,
+)
 from oais_platform.oais.models import (
     ApiKey,
     Archive,
+    ArchiveGrant,
     ArchiveState,
+    BatchItemResult,
+    BatchItemStatus,
     Collection,
+    Resource,
     Source,
+    Statistics,
+    StatisticsScope,
     Status,
     Step,
     Steps,
     UploadJob,
+    UploadJobChunk,
+    UploadJobFile,
 )
 from oais_platform.oais.permissions import (
     ArchivePermission,
+    MetricsPermission,
     StepPermission,
     SuperUserPermission,
     TagPermission,
     UserPermission,
+    can_view_all_archives,
     filter_archives,
     filter_collections,
 )
+from oais_platform.oais.renderers import (
+    EventStreamRenderer,
+    ORJSONRenderer,
+    PrometheusRenderer,
+)
 from oais_platform.oais.serializers import (
+    ArchiveDuplicateSerializer,
     ArchiveSerializer,
     ArchiveWithDuplicatesSerializer,
+    BatchErrorSummarySerializer,
+    BatchItemResultSerializer,
     CollectionNameSerializer,
     CollectionSerializer,
     LoginSerializer,
+    StatisticsBreakdownSerializer,
+    StatisticsSerializer,
     StepSerializer,
     UploadJobSerializer,
     UserSerializer,
 )
 from oais_platform.oais.sources.utils import InvalidSource, get_source
+from oais_platform.oais.streaming import (
+    CHUNK_SIZE,
+    ChunkedFile,
+    ZipStream,
+    extract_sip,
+    serve_file,
+)
 
 from ..settings import ALLOW_LOCAL_LOGIN, PIPELINE_SIZE_LIMIT
 from . import pipeline
@@ -66,10 +112,12 @@ from .tasks import (
     create_retry_step,
     execute_pipeline,
     run_step,
+    unstage_archives,
+    unstage_archives_task,
 )
 
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
+class UserViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet, PaginationMixin):
     """
     API endpoint that allows Users to be viewed or edited
     """
@@ -136,19 +184,16 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
                 pass
 
             sources = Source.objects.filter(enabled=True, has_restricted_records=True)
-            user_data["api_key"] = []
-            for source in sources:
-                entry = {
+            api_keys = ApiKey.get_user_keys(user.id)
+            user_data["api_key"] = [
+                {
                     "source_id": source.id,
                     "source": source.longname,
                     "how_to": source.how_to_get_key,
+                    "key": api_keys.get(source.name),
                 }
-                try:
-                    api_key = ApiKey.objects.get(user=user, source=source)
-                    entry["key"] = api_key.key
-                except ApiKey.DoesNotExist:
-                    entry["key"] = None
-                user_data["api_key"].append(entry)
+                for source in sources
+            ]
 
             return Response(user_data)
 
@@ -159,8 +204,10 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
         """
         user = request.user
 
-        tags = filter_collections(Collection.objects.all(), user, internal=False)
-        serializer = CollectionSerializer(tags, many=True)
+        tags = Collection.with_archives_count(
+            filter_collections(Collection.objects.all(), user, internal=False)
+        ).select_related("creator")
+        serializer = CollectionSerializer(tags, many=True, context={"request": request})
         return Response(serializer.data)
 
     @action(
@@ -184,7 +231,9 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
         if pagination == "false":
             return Response(
                 ArchiveWithDuplicatesSerializer(
-                    staged_archives, many=True, context={"duplicates": duplicates}
+                    staged_archives,
+                    many=True,
+                    context={"request": request, "duplicates": duplicates},
                 ).data
             )
         else:
@@ -235,7 +284,11 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
         if name:
             step_filter |= Q(name=name)
         filtered_steps = Step.objects.filter(step_filter).order_by("-start_date")
-        serializer = StepSerializer(filtered_steps, many=True)
+        context = {"request": request}
+        filtered_steps = only_selected_fields(
+            filtered_steps, StepSerializer(context=context)
+        )
+        serializer = StepSerializer(filtered_steps, many=True, context=context)
         return Response(serializer.data)
 
     @action(detail=False, url_path="me/sources", url_name="me-sources")
@@ -256,10 +309,9 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
 
         data = {}
         sources = Source.objects.filter(enabled=True)
+        api_keys = ApiKey.get_user_keys(request.user.id)
         for source in sources:
-            has_api_key = ApiKey.objects.filter(
-                user=request.user, source=source
-            ).exists()
+            has_api_key = source.name in api_keys
             status = READY
             if source.has_restricted_records and not has_api_key:
                 if source.has_public_records:
@@ -279,7 +331,12 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
         return Response(data)
 
 
-class ArchiveViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
+class ArchiveViewSet(
+    ConditionalGetMixin,
+    SparseFieldsMixin,
+    viewsets.ReadOnlyModelViewSet,
+    PaginationMixin,
+):
     """
     API endpoint that allows Archives to be viewed or edited
     """
@@ -287,6 +344,8 @@ class ArchiveViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
     queryset = Archive.objects.all()
     serializer_class = ArchiveSerializer
     permission_classes = [ArchivePermission]
+    required_fields = ["requester", "approver", "restricted"]
+    modification_field = "last_modification_timestamp"
     default_page_size = 10
     filters_map = {
         "state": ["state"],
@@ -317,7 +376,8 @@ class ArchiveViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
             if not self.request.GET._mutable:
                 self.request.GET._mutable = True
             self.request.GET["page"] = 1
-            self.pagination_class.page_size = len(result)
+            # Counted without fetching the rows, which are paginated later
+            self.pagination_class.page_size = result.count()
         else:
             self.pagination_class.page_size = size
 
@@ -369,28 +429,50 @@ class ArchiveViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
     def check_archived_records(self, request):
         """
         Gets a list of records and searches the database for similar archives (same recid + source)
-        Then returns the list of records with an archive list field which containes the similar archives
+        Then returns the list of records with an archive list field which containes the similar archives.
+        The archives are summarized unless `?detail=full` is given.
         """
-        records = request.data["records"]
+        records = request.data.get("records")
 
         if records is None:
             return Response(None)
 
+        match request.GET.get("detail", "summary"):
+            case "summary":
+                serializer_class = ArchiveDuplicateSerializer
+            case "full":
+                serializer_class = ArchiveSerializer
+            case _:
+                raise BadRequest("Invalid detail value")
+
+        try:
+            pairs = {
+                (str(record["source"]), str(record["recid"])) for record in records
+            }
+        except (KeyError, TypeError):
+            raise BadRequest("Each record needs a source and a recid")
+
+        query = Q(pk__in=[])
+        for source, recid in pairs:
+            query |= Q(source=source, recid=recid)
+
+        # Filter by permissions first, as the granted archives are OR-ed in
+        duplicates = (
+            filter_archives(Archive.objects.all(), request.user)
+            .filter(resource__in=Resource.objects.filter(query))
+            .exclude(state=ArchiveState.NONE)
+        )
+        if serializer_class is ArchiveSerializer:
+            duplicates = duplicates.select_related(
+                "approver", "requester", "resource", "last_step"
+            )
+
+        archives = {pair: [] for pair in pairs}
+        for archive in serializer_class(duplicates, many=True).data:
+            archives[(archive["source"], archive["recid"])].append(archive)
+
         for record in records:
-            try:
-                duplicates = Archive.objects.filter(
-                    recid=record["recid"], source=record["source"]
-                ).exclude(state=ArchiveState.NONE)
-                serializer = ArchiveSerializer(
-                    filter_archives(
-                        duplicates,
-                        request.user,
-                    ),
-                    many=True,
-                )
-                record["archives"] = serializer.data
-            except Archive.DoesNotExist:
-                record["archives"] = None
+            record["archives"] = archives[(str(record["source"]), str(record["recid"]))]
 
         return Response(records)
 
@@ -409,6 +491,7 @@ class ArchiveViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
         return Response(sources)
 
     @action(detail=True, url_path="steps", url_name="steps")
+    @conditional_get
     def archive_steps(self, request, pk=None):
         """
         Returns all Steps of an identified Archive
@@ -416,7 +499,9 @@ class ArchiveViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
         archive = self.get_object()
         steps = archive.steps.all().order_by("start_date", "create_date")
 
-        serializer = StepSerializer(steps, many=True)
+        context = {"request": request}
+        steps = only_selected_fields(steps, StepSerializer(context=context))
+        serializer = StepSerializer(steps, many=True, context=context)
 
         return Response(serializer.data)
 
@@ -436,7 +521,9 @@ class ArchiveViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
         Returns the Tag(s) the Archive has
         """
         archive = self.get_object()
-        collections = filter_collections(archive.get_collections(), request.user)
+        collections = Collection.with_archives_count(
+            filter_collections(archive.get_collections(), request.user)
+        ).select_related("creator")
         return self.make_paginated_response(collections, CollectionSerializer)
 
     @action(
@@ -488,14 +575,11 @@ class ArchiveViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
             archive=archive, name=Steps.HARVEST, status=Status.NOT_RUN
         )
 
-        try:
-            api_key = ApiKey.objects.get(
-                source__name=archive.source, user=request.user
-            ).key
-        except Exception:
-            api_key = None
-
-        run_step(step, archive.id, api_key=api_key)
+        run_step(
+            step,
+            archive.id,
+            credentials=ApiKey.get_reference(request.user.id, archive.source),
+        )
 
         serializer = ArchiveSerializer(
             archive,
@@ -510,35 +594,25 @@ class ArchiveViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
         Unstages the passed Archives, setting them to the Harvest stage
         Archives are also grouped under the same job tag
         """
-        archives = request.data["archives"]
+        archive_ids = [archive["id"] for archive in request.data["archives"]]
 
         job_tag = Collection.objects.create(
             internal=True,
             creator=request.user,
             title="Internal Job",
         )
-
-        for archive in archives:
-            archive = Archive.objects.get(id=archive["id"])
-            archive.set_unstaged(approver=request.user)
-            job_tag.add_archive(archive)
-
-            step = Step.objects.create(
-                archive=archive, name=Steps.HARVEST, status=Status.NOT_RUN
-            )
-            # Step is auto-approved and harvest step runs
-            try:
-                api_key = ApiKey.objects.get(
-                    source__name=archive.source, user=request.user
-                ).key
-            except Exception:
-                api_key = None
-            run_step(step, archive.id, api_key=api_key)
-
         serializer = CollectionSerializer(
             job_tag,
             many=False,
         )
+
+        # Large selections are processed in the background, the job tag
+        # is returned right away so it can be followed
+        if len(archive_ids) > settings.UNSTAGE_SYNC_LIMIT:
+            unstage_archives_task.delay(archive_ids, request.user.id, job_tag.id)
+            return Response(serializer.data, status=202)
+
+        unstage_archives(archive_ids, request.user, job_tag)
         return Response(serializer.data)
 
     @action(
@@ -567,12 +641,9 @@ class ArchiveViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
         steps = request.data.get("pipeline_steps")
         archive_id = request.data["archive"]["id"]
 
-        try:
-            api_key = ApiKey.objects.get(
-                source__name=request.data["archive"]["source"], user=request.user
-            ).key
-        except Exception:
-            api_key = None
+        credentials = ApiKey.get_reference(
+            request.user.id, request.data["archive"]["source"]
+        )
 
         with transaction.atomic():
             archive = Archive.objects.select_for_update().get(pk=archive_id)
@@ -621,7 +692,7 @@ class ArchiveViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
                     )
 
         step = execute_pipeline(
-            archive_id, api_key=api_key, force_continue=force_continue
+            archive_id, credentials=credentials, force_continue=force_continue
         )
         serializer = StepSerializer(step, many=False)
         return Response(serializer.data)
@@ -634,50 +705,42 @@ class ArchiveViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
         archives = request.data["archives"]
         result = {}
         if len(archives) > 0:
-            first_state = Archive.objects.get(pk=archives[0]["id"]).state
-            state_intersection = True
-            next_steps_intersection = None
-            all_last_step_failed = True
-            can_continue = True
-
-            with transaction.atomic():
-                for archive in archives:
-                    archive = Archive.objects.select_for_update().get(pk=archive["id"])
-
-                    if state_intersection and archive.state != first_state:
-                        state_intersection = False
-
-                    if (
-                        not archive.last_step
-                        or archive.last_step.status != Status.FAILED
-                    ):
-                        all_last_step_failed = False
+            try:
+                archive_ids = [int(archive["id"]) for archive in archives]
+            except (KeyError, TypeError, ValueError):
+                raise BadRequest("Each archive needs a valid id")
+            # Read-only: resolved in bulk, without locking the Archives
+            archives_info = Archive.get_next_steps_in_bulk(archive_ids)
+            missing_ids = [id for id in archive_ids if id not in archives_info]
+            if missing_ids:
+                raise DoesNotExist(
+                    f"Archives not found: {', '.join(map(str, missing_ids))}"
+                )
+            archives_info = [archives_info[id] for id in archive_ids]
 
-                    if len(archive.pipeline_steps) == 0:
-                        can_continue = False
+            first_state = archives_info[0]["state"]
+            state_intersection = all(
+                info["state"] == first_state for info in archives_info
+            )
+            all_last_step_failed = all(
+                info["last_step_status"] == Status.FAILED for info in archives_info
+            )
+            can_continue = all(
+                len(info["pipeline_steps"]) > 0 for info in archives_info
+            )
+            next_steps_intersection = set(archives_info[0]["next_steps"]).intersection(
+                *(info["next_steps"] for info in archives_info[1:])
+            )
 
-                    next_step = archive.get_next_steps()
-                    if not next_steps_intersection:
-                        next_steps_intersection = next_step
-                    else:
-                        next_steps_intersection = set(
-                            next_steps_intersection
-                        ).intersection(next_step)
-                        if (
-                            len(next_steps_intersection) == 0
-                            and not state_intersection
-                            and not all_last_step_failed
-                        ):
-                            break
-                result["state_intersection"] = state_intersection
-                result["next_steps_intersection"] = sorted(next_steps_intersection)
-                result["all_last_step_failed"] = all_last_step_failed
-                result["can_continue"] = all_last_step_failed and can_continue
+            result["state_intersection"] = state_intersection
+            result["next_steps_intersection"] = sorted(next_steps_intersection)
+            result["all_last_step_failed"] = all_last_step_failed
+            result["can_continue"] = all_last_step_failed and can_continue
 
         return Response(result)
 
 
-class StepViewSet(viewsets.ReadOnlyModelViewSet):
+class StepViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows Steps to be viewed, approved and rejected
     """
@@ -685,6 +748,7 @@ class StepViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Step.objects.all().order_by("-start_date")
     serializer_class = StepSerializer
     permission_classes = [StepPermission]
+    required_fields = ["archive"]
 
     def get_queryset(self):
         user_archives = filter_archives(Archive.objects.all(), self.request.user, "all")
@@ -704,11 +768,20 @@ class StepViewSet(viewsets.ReadOnlyModelViewSet):
                     # FIXME: Workaround, until the artifact creation/schema is decided
                     files_path = output_data["artifact"]["artifact_localpath"]
                     file_name = f"{pk}-sip.zip"
-                    path_to_zip = make_archive(files_path, "zip", files_path)
-                    response = HttpResponse(
-                        FileWrapper(open(path_to_zip, "rb")),
-                        content_type="application/zip",
+                    match request.GET.get("compression", "stored"):
+                        case "stored":
+                            compression = zipfile.ZIP_STORED
+                        case "deflated":
+                            compression = zipfile.ZIP_DEFLATED
+                        case _:
+                            raise BadRequest("Invalid compression")
+                    # The zip is generated while it is sent, nothing is written to disk
+                    stream = ZipStream(files_path, compression)
+                    response = StreamingHttpResponse(
+                        stream, content_type="application/zip"
                     )
+                    if (size := stream.size()) is not None:
+                        response["Content-Length"] = size
                     response["Content-Disposition"] = (
                         'attachment; filename="{filename}"'.format(filename=file_name)
                     )
@@ -717,14 +790,12 @@ class StepViewSet(viewsets.ReadOnlyModelViewSet):
                     # FIXME: Workaround, until the artifact creation/schema is decided
                     files_path = output_data["artifact"]["artifact_path"]
                     file_name = f"{pk}-aip.7z"
-                    response = HttpResponse(
-                        FileWrapper(open(files_path, "rb")),
+                    return serve_file(
+                        request,
+                        files_path,
                         content_type="application/x-7z-compressed",
+                        filename=file_name,
                     )
-                    response["Content-Disposition"] = (
-                        'attachment; filename="{filename}"'.format(filename=file_name)
-                    )
-                    return response
         return HttpResponse(status=404)
 
     @action(
@@ -737,7 +808,12 @@ class StepViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(pipeline.get_next_steps_constraints())
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
+class TagViewSet(
+    ConditionalGetMixin,
+    SparseFieldsMixin,
+    viewsets.ReadOnlyModelViewSet,
+    PaginationMixin,
+):
     """
     API endpoint that allows Tags to be viewed or edited
     """
@@ -745,26 +821,31 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
     queryset = Collection.objects.all()
     serializer_class = CollectionSerializer
     permission_classes = [TagPermission]
+    required_fields = ["creator"]
+    modification_field = "last_modification_date"
 
     def get_queryset(self):
         page_size = self.request.GET.get("size", None)
         if page_size is not None:
             self.pagination_class.page_size = page_size
+        queryset = super().get_queryset()
+        # The other actions change the Archives of the Tag they return
+        if self.action in ["list", "retrieve"]:
+            queryset = Collection.with_archives_count(queryset).select_related(
+                "creator"
+            )
         internal = self.request.GET.get("internal")
         if internal == "only":
-            return filter_collections(
-                super().get_queryset(), self.request.user, internal=True
-            )
+            return filter_collections(queryset, self.request.user, internal=True)
         elif internal == "false":
-            return filter_collections(
-                super().get_queryset(), self.request.user, internal=False
-            )
+            return filter_collections(queryset, self.request.user, internal=False)
         else:
-            return filter_collections(super().get_queryset(), self.request.user)
+            return filter_collections(queryset, self.request.user)
 
+    @conditional_get
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        serializer = CollectionSerializer(instance)
+        serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
     @action(detail=False, methods=["POST"], url_path="create", url_name="create")
@@ -788,7 +869,7 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
                 internal=False,
             )
             if archives:
-                tag.archives.set(archives)
+                tag.add_archives(archives)
 
             serializer = CollectionSerializer(tag, many=False)
             return Response(serializer.data)
@@ -843,28 +924,41 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
         with transaction.atomic():
             tag = self.get_object()
 
+            if not isinstance(archives, list):
+                raise BadRequest("Field 'archives' must be a list.")
             if add:
-                if isinstance(archives, list):
-                    for archive in archives:
-                        tag.add_archive(archive)
-                else:
-                    raise BadRequest("Field 'archives' must be a list.")
-
+                tag.add_archives(archives)
             else:
-                if isinstance(archives, list):
-                    for archive in archives:
-                        if type(archive) is int:
-                            tag.remove_archive(archive)
-                        else:
-                            tag.remove_archive(archive["id"])
-                else:
-                    raise BadRequest("Field 'archives' must be a list.")
-
-            tag.set_modification_timestamp()
-            tag.save()
+                tag.remove_archives(archives)
         serializer = self.get_serializer(tag)
         return Response(serializer.data)
 
+    @action(detail=True, url_path="errors", url_name="errors")
+    def get_batch_errors(self, request, pk=None):
+        """
+        Returns the failures of the batch operation of the Tag, grouped by
+        error class and message
+        """
+        tag = self.get_object()
+        errors = BatchItemResult.get_error_summary(tag.id)
+        return self.make_paginated_response(errors, BatchErrorSummarySerializer)
+
+    @action(detail=True, url_path="results", url_name="results")
+    def get_batch_results(self, request, pk=None):
+        """
+        Returns the result of each item of the batch operation of the Tag,
+        optionally only those with the given status
+        """
+        tag = self.get_object()
+        results = tag.batch_results.all()
+        item_status = request.GET.get("status")
+        if item_status is not None:
+            try:
+                results = results.filter(status=BatchItemStatus[item_status.upper()])
+            except KeyError:
+                raise BadRequest(f"Invalid status: {item_status}")
+        return self.make_paginated_response(results, BatchItemResultSerializer)
+
     @action(detail=True, methods=["POST"], url_path="add")
     def add_arch(self, request, pk=None):
         """
@@ -889,7 +983,7 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet, PaginationMixin):
         return Response({"result": serializer.data})
 
 
-class UploadJobViewSet(viewsets.ReadOnlyModelViewSet):
+class UploadJobViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows to create UploadJobs, add files, and submit
     """
@@ -907,36 +1001,184 @@ class UploadJobViewSet(viewsets.ReadOnlyModelViewSet):
         # (the tmp dir handled by Django gets deleted at context exit)
         tmp_dir = tempfile.mkdtemp()
 
-        uj = UploadJob.objects.create(
-            creator=request.user, tmp_dir=tmp_dir, files=json.dumps({})
-        )
-        uj.save()
+        uj = UploadJob.objects.create(creator=request.user, tmp_dir=tmp_dir)
 
         return Response({"uploadJobId": uj.id})
 
     @action(detail=True, methods=["POST"], url_path="add/file", url_name="add-file")
     def add_file(self, request, pk=None):
         """
-        Adds the given file to the specified UploadJob. \n
-        Reconstructs the original relative path in the UploadJob's corresponding temporary directory.
+        Adds the given files to the specified UploadJob, each keyed by its relative path. \n
+        Reconstructs the original relative paths in the UploadJob's corresponding temporary directory.
         """
-        # prepare directories preserving the original structure
         uj = self.get_object()
-        tmp_dir = uj.tmp_dir
-        relative_path, file = request.FILES.items().__iter__().__next__()
+        tmp_dir = os.path.realpath(uj.tmp_dir)
 
-        local_path = os.path.join(tmp_dir, os.path.dirname(relative_path))
-        if not os.path.exists(local_path):
-            os.makedirs(local_path)
+        files = []
+        for relative_path, file in request.FILES.items():
+            local_path = os.path.realpath(os.path.join(tmp_dir, relative_path))
+            if os.path.commonpath([tmp_dir, local_path]) != tmp_dir:
+                raise BadRequest(f"Invalid path {relative_path}")
 
-        # move newly added file to our own tmp dir
-        shutil.move(file.temporary_file_path(), os.path.join(tmp_dir, relative_path))
+            # prepare directories preserving the original structure
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
 
-        uj = self.get_object()
-        uj.add_file(os.path.join(tmp_dir, relative_path), relative_path)
+            checksum = hashlib.sha256()
+            for chunk in file.chunks():
+                checksum.update(chunk)
+
+            # move newly added file to our own tmp dir
+            if hasattr(file, "temporary_file_path"):
+                shutil.move(file.temporary_file_path(), local_path)
+            else:
+                with open(local_path, "wb") as destination:
+                    for chunk in file.chunks():
+                        destination.write(chunk)
+
+            files.append(
+                UploadJobFile(
+                    path=os.path.relpath(local_path, tmp_dir),
+                    size=file.size,
+                    checksum=checksum.hexdigest(),
+                )
+            )
+
+        if not files:
+            raise BadRequest("No file given")
+        uj.add_files(files)
 
         return Response()
 
+    @action(detail=True, methods=["GET"], url_path="files", url_name="files")
+    def get_files(self, request, pk=None):
+        """
+        Returns the files uploaded to the specified UploadJob,
+        streamed as they are read from the database.
+        """
+        uj = self.get_object()
+        files = uj.files.values("path", "size", "checksum").iterator(chunk_size=1000)
+
+        def listing():
+            yield "["
+            for i, file in enumerate(files):
+                yield ("," if i else "") + json.dumps(file)
+            yield "]"
+
+        return StreamingHttpResponse(listing(), content_type="application/json")
+
+    @action(detail=True, methods=["PUT"], url_path="chunk", url_name="chunk")
+    def upload_chunk(self, request, pk=None):
+        """
+        Stores a chunk of a zipped SIP, sent as the raw request body, at the
+        position given by the Upload-Offset header. \n
+        The Upload-Checksum header ("<algorithm> <base64 digest>", md5, sha1 or sha256)
+        is verified. Chunks can be sent in parallel and sent again after a failure.
+        """
+        uj = self.get_object()
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            algorithm, digest = request.headers["Upload-Checksum"].split(" ")
+        except (KeyError, ValueError):
+            raise BadRequest("Upload-Offset and Upload-Checksum headers are required")
+        if offset < 0 or algorithm not in ["md5", "sha1", "sha256"]:
+            raise BadRequest("Invalid Upload-Offset or Upload-Checksum")
+
+        chunk_path = UploadJobChunk.get_path(uj.tmp_dir, offset)
+        os.makedirs(UploadJobChunk.get_dir(uj.tmp_dir), exist_ok=True)
+        # Write next to the final path, so that a chunk is either complete or absent
+        fd, partial_path = tempfile.mkstemp(dir=os.path.dirname(chunk_path))
+        checksum = hashlib.new(algorithm)
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as partial:
+                while request.stream and (data := request.stream.read(CHUNK_SIZE)):
+                    partial.write(data)
+                    checksum.update(data)
+                    size += len(data)
+            if size == 0 or base64.b64encode(checksum.digest()).decode() != digest:
+                raise BadRequest("Chunk checksum mismatch")
+            os.replace(partial_path, chunk_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+        UploadJobChunk.objects.update_or_create(
+            upload_job=uj,
+            offset=offset,
+            defaults={"size": size, "checksum": f"{algorithm} {digest}"},
+        )
+
+        return Response({"offset": offset, "size": size})
+
+    @action(detail=True, methods=["GET"], url_path="chunks", url_name="chunks")
+    def get_chunks(self, request, pk=None):
+        """
+        Returns the chunks received so far and the offset up to which
+        the upload is complete, where an interrupted upload can resume.
+        """
+        uj = self.get_object()
+        chunks = list(uj.chunks.values("offset", "size"))
+
+        received = 0
+        for chunk in chunks:
+            if chunk["offset"] > received:
+                break
+            received = max(received, chunk["offset"] + chunk["size"])
+
+        return Response({"offset": received, "chunks": chunks})
+
+    @action(
+        detail=True,
+        methods=["POST"],
+        url_path="chunks/complete",
+        url_name="chunks-complete",
+    )
+    def complete_chunks(self, request, pk=None):
+        """
+        Extracts the zipped SIP made of the received chunks, whose total size is
+        given by the Upload-Length header, to BIC_UPLOAD_PATH. \n
+        The chunks are read in place, no reassembled copy of the zip is written.
+        """
+        uj = self.get_object()
+        try:
+            length = int(request.headers["Upload-Length"])
+        except (KeyError, ValueError):
+            raise BadRequest("Upload-Length header is required")
+
+        chunks = list(uj.chunks.all())
+        offset = 0
+        for chunk in chunks:
+            if chunk.offset != offset:
+                raise BadRequest(f"Missing or overlapping chunk at offset {offset}")
+            offset += chunk.size
+        if offset != length:
+            raise BadRequest(f"Upload incomplete, received {offset} of {length} bytes")
+
+        if settings.BIC_UPLOAD_PATH:
+            base_path = settings.BIC_UPLOAD_PATH
+        else:
+            base_path = os.getcwd()
+
+        try:
+            with ChunkedFile(
+                [
+                    (UploadJobChunk.get_path(uj.tmp_dir, chunk.offset), chunk.size)
+                    for chunk in chunks
+                ]
+            ) as compressed:
+                sip_location = extract_sip(compressed, base_path)
+        except zipfile.BadZipFile:
+            raise BadRequest({"status": 1, "msg": "Check the zip file for errors"})
+        except ExtractionError as e:
+            raise BadRequest({"status": 1, "msg": str(e)})
+        finally:
+            # A complete upload which cannot be extracted has to be sent again
+            uj.delete_chunks()
+
+        uj.set_sip_dir(sip_location)
+
+        return Response({"status": 0, "msg": "SIP uploaded successfully"})
+
     @action(detail=True, methods=["POST"], url_path="sip", url_name="sip")
     def create_sip(self, request, pk=None):
         """
@@ -945,6 +1187,15 @@ class UploadJobViewSet(viewsets.ReadOnlyModelViewSet):
         """
         uj = self.get_object()
 
+        # Check the recorded files against the temporary directory
+        files = list(uj.files.values_list("path", "size"))
+        if not files:
+            raise BadRequest({"status": 1, "msg": "No file was uploaded"})
+        for path, size in files:
+            local_path = os.path.join(uj.tmp_dir, path)
+            if not os.path.isfile(local_path) or os.path.getsize(local_path) != size:
+                raise BadRequest({"status": 1, "msg": f"File {path} is incomplete"})
+
         if settings.BIC_UPLOAD_PATH:
             base_path = settings.BIC_UPLOAD_PATH
         else:
@@ -972,6 +1223,7 @@ class UploadJobViewSet(viewsets.ReadOnlyModelViewSet):
         # update the db
         sip_name = result["foldername"]
         uj.set_sip_dir(os.path.join(base_path, sip_name))
+        uj.delete_chunks()
 
         return Response({"status": 0, "msg": "SIP created successfully"})
 
@@ -1032,25 +1284,100 @@ class UploadJobViewSet(viewsets.ReadOnlyModelViewSet):
 
 @api_view(["GET"])
 def statistics(request):
-    harvested_count = Archive.objects.filter(state=ArchiveState.SIP).count()
-    preserved_count = Archive.objects.filter(state=ArchiveState.AIP).count()
-    data = {
-        "harvested_count": harvested_count + preserved_count,
-        "preserved_count": preserved_count,
-        "pushed_to_tape_count": Step.objects.filter(
-            name=Steps.PUSH_TO_CTA, status=Status.COMPLETED
-        )
-        .values("archive")
-        .distinct()
-        .count(),
-        "pushed_to_registry_count": Step.objects.filter(
-            name=Steps.INVENIO_RDM_PUSH, status=Status.COMPLETED
+    """
+    Returns the precomputed archival statistics, or their breakdown
+    per source or per day if the breakdown parameter is passed
+    """
+    breakdown = request.GET.get("breakdown", None)
+
+    totals = Statistics.objects.filter(scope=StatisticsScope.TOTAL).first()
+    if totals is None:
+        # Counters are initialized by the first reconciliation
+        Statistics.reconcile()
+        totals = Statistics.objects.get(scope=StatisticsScope.TOTAL)
+
+    match breakdown:
+        case None:
+            return Response(StatisticsSerializer(totals).data)
+        case "source":
+            rows = Statistics.objects.filter(scope=StatisticsScope.SOURCE)
+        case "day":
+            rows = Statistics.objects.filter(scope=StatisticsScope.DAY)
+        case _:
+            raise BadRequest("Invalid breakdown parameter.")
+
+    return Response(StatisticsBreakdownSerializer(rows, many=True).data)
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+@renderer_classes([ORJSONRenderer, EventStreamRenderer])
+def step_events(request):
+    """
+    Streams the Step transitions visible to the user as server-sent events,
+    optionally filtered by archive, collection (tag) or requester
+    """
+    user = request.user
+    try:
+        filters = {
+            name: int(request.GET[name])
+            for name in ["archive", "collection", "requester"]
+            if name in request.GET
+        }
+    except ValueError:
+        raise BadRequest("Invalid filter")
+
+    view_all = can_view_all_archives(user)
+    # Archives of the collection and granted to the user, re-read at most
+    # every heartbeat as they may change while the stream is open
+    scope = {"expiry": 0}
+
+    def refresh_scope():
+        if time.monotonic() < scope["expiry"]:
+            return
+        if "collection" in filters:
+            scope["collection_ids"] = set(
+                Archive.objects.filter(
+                    archive_collections=filters["collection"]
+                ).values_list("id", flat=True)
+            )
+        if not view_all:
+            scope["granted_ids"] = set(
+                ArchiveGrant.objects.filter(user=user).values_list(
+                    "archive_id", flat=True
+                )
+            )
+        scope["expiry"] = time.monotonic() + settings.STEP_EVENTS_HEARTBEAT
+
+    def accept(event):
+        if "archive" in filters and event["archive"] != filters["archive"]:
+            return False
+        if "requester" in filters and event["requester"] != filters["requester"]:
+            return False
+        refresh_scope()
+        if "collection" in filters and event["archive"] not in scope["collection_ids"]:
+            return False
+        # Same visibility rules as filter_archives
+        return (
+            view_all
+            or not event["restricted"]
+            or user.id in (event["requester"], event["approver"])
+            or event["archive"] in scope["granted_ids"]
         )
-        .values("archive")
-        .distinct()
-        .count(),
-    }
-    return Response(data)
+
+    response = StreamingHttpResponse(
+        StepEventStream(
+            accept,
+            heartbeat=settings.STEP_EVENTS_HEARTBEAT,
+            duration=settings.STEP_EVENTS_STREAM_DURATION,
+            max_streams=settings.STEP_EVENTS_MAX_STREAMS,
+        ),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 @extend_schema_view(
@@ -1071,23 +1398,11 @@ def upload_sip(request):
             base_path = settings.BIC_UPLOAD_PATH
         else:
             base_path = os.getcwd()
-        # Save compressed SIP
-        compressed_path = os.path.join(base_path, f"compressed_{file.name}")
-        destination = open(compressed_path, "wb+")
-        for chunk in file.chunks():
-            destination.write(chunk)
-        destination.close()
-
-        # Extract it and get the top directory folder
-        with zipfile.ZipFile(compressed_path, "r") as compressed:
-            compressed.extractall(base_path)
-            top = [item.split("/")[0] for item in compressed.namelist()]
-        os.remove(compressed_path)
-
-        # Get the folder location and the sip_json using oais utils
-        folder_location = top[0]
-        sip_json = get_manifest(os.path.join(base_path, folder_location))
-        sip_location = os.path.join(base_path, folder_location)
+        # Extract the SIP straight from the uploaded file
+        sip_location = extract_sip(file, base_path)
+
+        # Get the sip_json using oais utils
+        sip_json = get_manifest(sip_location)
 
         source = sip_json["source"]
         recid = sip_json["recid"]
@@ -1130,13 +1445,11 @@ def upload_sip(request):
         )
     except zipfile.BadZipFile:
         raise BadRequest({"status": 1, "msg": "Check the zip file for errors"})
+    except ExtractionError as e:
+        raise BadRequest({"status": 1, "msg": str(e)})
     except TypeError:
-        if os.path.exists(compressed_path):
-            os.remove(compressed_path)
         raise BadRequest({"status": 1, "msg": "Check your SIP structure"})
     except Exception as e:
-        if os.path.exists(compressed_path):
-            os.remove(compressed_path)
         if step:
             step.set_status(Status.FAILED)
         raise BadRequest({"status": 1, "msg": e})
@@ -1160,10 +1473,7 @@ def search(request, source):
         size = request.GET["s"]
 
     try:
-        try:
-            api_key = ApiKey.objects.get(source__name=source, user=request.user).key
-        except Exception:
-            api_key = None
+        api_key = ApiKey.get_user_key(request.user.id, source)
         results = get_source(source, api_key).search(query, page, size)
     except InvalidSource:
         raise BadRequest("Invalid source")
@@ -1175,10 +1485,7 @@ def search(request, source):
 @permission_classes([permissions.IsAuthenticated])
 def search_by_id(request, source, recid):
     try:
-        try:
-            api_key = ApiKey.objects.get(source__name=source, user=request.user).key
-        except Exception:
-            api_key = None
+        api_key = ApiKey.get_user_key(request.user.id, source)
         result = get_source(source, api_key).search_by_id(recid.strip())
     except InvalidSource:
         raise BadRequest("Invalid source")
@@ -1356,6 +1663,49 @@ def sources(request):
     return Response(sources)
 
 
+@api_view(["GET"])
+@permission_classes([permissions.AllowAny])
+def fts_health(request):
+    """
+    Health probe of the FTS client, which is authenticated if not done yet,
+    and of the proxy delegated to FTS, whose lifetime is returned in seconds
+    """
+    try:
+        fts = apps.get_app_config("oais").fts
+        fts.whoami()
+        lifetime = fts.get_proxy_lifetime()
+    except Exception as e:
+        logging.warning(f"FTS health check failed: {e}")
+        return Response({"status": 1, "errormsg": "FTS is unavailable"}, status=503)
+
+    if lifetime is None or lifetime < fts.min_lifetime:
+        return Response(
+            {
+                "status": 1,
+                "errormsg": "The proxy delegated to FTS is not valid",
+                "proxy_lifetime": lifetime and lifetime.total_seconds(),
+            },
+            status=503,
+        )
+    return Response(
+        {"status": 0, "errormsg": None, "proxy_lifetime": lifetime.total_seconds()}
+    )
+
+
+@extend_schema(exclude=True)
+@api_view(["GET"])
+# The bearer token of the scrapers is not a JWT
+@authentication_classes([SessionAuthentication])
+@permission_classes([MetricsPermission])
+@renderer_classes([PrometheusRenderer])
+def metrics(request):
+    """
+    Prometheus metrics of the pipelines, for the scrapers presenting the
+    METRICS_TOKEN
+    """
+    return HttpResponse(generate_metrics(), content_type=CONTENT_TYPE_LATEST)
+
+
 def check_allowed_path(path, username):
     allowed_starting_paths = [
         f"/eos/home-{username[0]}/{username}/",
@@ -63,6 +63,19 @@ CELERY_RESULT_SERIALIZER = "json"
 CELERY_TASK_SERIALIZER = "json"
 CELERY_BROKER_TRANSPORT_OPTIONS = {"visibility_timeout": 172800}  # 48 hours
 
+## Step events
+# Redis instance used to fan out Step transitions to the event streams,
+# if empty an in-process channel is used instead
+STEP_EVENTS_REDIS_URL = environ.get("STEP_EVENTS_REDIS_URL", CELERY_BROKER_URL)
+# Seconds between keep-alive messages of an idle event stream
+STEP_EVENTS_HEARTBEAT = 15
+# Seconds after which an event stream is closed and the client reconnects
+STEP_EVENTS_STREAM_DURATION = 300
+# Event streams open at once in a web process. Each stream holds a worker (or
+# thread) of the synchronous server for up to STEP_EVENTS_STREAM_DURATION, so
+# keep it below the number of workers, further streams get a 503
+STEP_EVENTS_MAX_STREAMS = int(environ.get("STEP_EVENTS_MAX_STREAMS", 4))
+
 CELERY_BEAT_SCHEDULE = {
     "cds-rdm-weekly": {
         "task": "periodic_harvest",
@@ -71,11 +84,16 @@ CELERY_BEAT_SCHEDULE = {
     },
     "fts-delegate": {
         "task": "fts_delegate",
-        "schedule": crontab(hour="*/6", minute=00),
+        # Delegates again only when the proxy enters its renewal window
+        "schedule": crontab(minute="*/30"),
         "options": {
-            "expires": 21600.0,
+            "expires": 1800.0,
         },
     },
+    "reconcile-statistics": {
+        "task": "reconcile_statistics",
+        "schedule": crontab(hour=3, minute=30),
+    },
 }
 
 ## Authentication
@@ -137,6 +155,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "oais_platform.oais.middleware.QueryProfilingMiddleware",
+    "oais_platform.oais.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -239,8 +259,31 @@ REST_FRAMEWORK = {
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": [
+        "oais_platform.oais.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "oais_platform.oais.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
+# Bearer token of the Prometheus scrapers, /metrics is refused to anyone else
+# but the superusers if unset
+METRICS_TOKEN = environ.get("METRICS_TOKEN")
+
+# Responses from this size (in bytes) are compressed, if the client accepts it
+COMPRESSION_MIN_SIZE = 1024
+
+# Share of the requests whose SQL queries are profiled (0 disables the profiling)
+QUERY_PROFILING_SAMPLE_RATE = float(environ.get("QUERY_PROFILING_SAMPLE_RATE", 0))
+# File the query profiles are appended to, as JSON lines
+QUERY_PROFILING_LOG = environ.get("QUERY_PROFILING_LOG", "query-profiles.jsonl")
+# Number of slowest statements and duplicated queries kept for each request
+QUERY_PROFILING_TOP = 5
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # SPECTACULAR
@@ -319,6 +362,17 @@ AIP_UPSTREAM_BASEPATH = "/oais-data/aip/"
 # Path where the SIPs will be served from
 SIP_UPSTREAM_BASEPATH = "/oais-data/sip/"
 
+# Limits on the zipped SIPs extracted on upload: total uncompressed bytes, number
+# of entries and parallel extraction threads
+SIP_EXTRACT_MAX_BYTES = int(environ.get("SIP_EXTRACT_MAX_BYTES", 100 * 1024**3))
+SIP_EXTRACT_MAX_ENTRIES = int(environ.get("SIP_EXTRACT_MAX_ENTRIES", 100000))
+SIP_EXTRACT_WORKERS = 4
+
+# Downloads of files under this path are handed off to nginx (X-Accel-Redirect),
+# which serves them from the internal X_ACCEL_LOCATION. If unset, Django serves them.
+X_ACCEL_ROOT = environ.get("X_ACCEL_ROOT")
+X_ACCEL_LOCATION = "/protected-files/"
+
 # FTS Settings
 FTS_INSTANCE = environ.get("FTS_INSTANCE", "https://fts3-public.cern.ch:8446")
 FTS_STATUS_INSTANCE = environ.get(
@@ -328,6 +382,12 @@ FTS_SOURCE_BASE_PATH = environ.get(
     "FTS_SOURCE_BASE_PATH", "https://eosproject-p.cern.ch:8444"
 )
 FTS_MAX_RETRY_COUNT = 1
+# Hours of validity requested for the proxy delegated to FTS
+FTS_DELEGATION_LIFETIME = int(environ.get("FTS_DELEGATION_LIFETIME", 12))
+# Hours before the proxy expires from which it is delegated again
+FTS_DELEGATION_RENEWAL_WINDOW = int(environ.get("FTS_DELEGATION_RENEWAL_WINDOW", 3))
+# Hours of validity the proxy must have left for transfers to be submitted
+FTS_DELEGATION_MIN_LIFETIME = int(environ.get("FTS_DELEGATION_MIN_LIFETIME", 1))
 
 # GRID Certificate used to authenticate
 # Public part
@@ -343,6 +403,9 @@ CTA_BASE_PATH = environ.get(
 
 # Batch announce number of subfolders limit
 BATCH_ANNOUNCE_LIMIT = 20
+# Number of items processed by a batch after which its created Archives are
+# added to its Tag and the item results are recorded
+BATCH_FLUSH_SIZE = 500
 
 # Max waiting time in AM queue for upload (mins)
 AM_WAITING_TIME_LIMIT = 5
@@ -351,6 +414,10 @@ AM_CONCURRENCY_LIMT = 100
 # Pipeline creation step limit
 PIPELINE_SIZE_LIMIT = 10
 
+# Max number of Archives unstaged within the request, larger selections
+# are unstaged in the background
+UNSTAGE_SYNC_LIMIT = 100
+
 # Automatic harvest batch size
 AUTOMATIC_HARVEST_BATCH_SIZE = 100
 # Automatic harvest delay time between batches in minutes
@@ -360,6 +427,15 @@ AUTOMATIC_HARVEST_MAX_FILE_SIZE = 2 * 1024 * 1024 * 1024
 
 # Encryption key for storing the API Keys in the DB
 ENCRYPT_KEY = environ.get("ENCRYPT_KEY", "uIUcp1Yoh4e3H7vbCVwMTUflNPwmEb6DsntxeVhfvow=")
+# Previous encryption keys (comma separated), still accepted for decryption until
+# the stored API Keys are re-encrypted with ENCRYPT_KEY by `manage.py rotate_api_keys`
+ENCRYPT_KEY_FALLBACKS = [
+    key for key in environ.get("ENCRYPT_KEY_FALLBACKS", "").split(",") if key
+]
+# Seconds the decrypted API Keys of a user are cached in each process. Changes
+# only clear the cache of the process making them, the other web and Celery
+# processes may use the previous key for up to this delay
+API_KEY_CACHE_TTL = int(environ.get("API_KEY_CACHE_TTL", 60))
 
 # Import local settings (overriding defaults and environment variables)
 # this line MUST be kept at the end of the file
@@ -32,6 +32,8 @@ router.register(r"upload/jobs", views.UploadJobViewSet, basename="upload")
 urlpatterns = [
     # Serve the Django Admin panel
     path("admin/", admin.site.urls),
+    # Prometheus metrics
+    path("metrics", views.metrics, name="metrics"),
     path(
         # Set base path
         r"api/",
@@ -93,7 +95,10 @@ urlpatterns = [
                     name="batch-announce",
                 ),
                 path("stats/", views.statistics, name="statistics"),
+                # Stream of Step transitions (server-sent events)
+                path("events/steps/", views.step_events, name="step-events"),
                 path("sources/", views.sources, name="sources"),
+                path("health/fts/", views.fts_health, name="health-fts"),
                 path("token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
                 path(
                     "token/refresh/", TokenRefreshView.as_view(), name="token_refresh"